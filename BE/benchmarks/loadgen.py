@@ -0,0 +1,275 @@
+"""
+Load generator - drive a running API and report tail latency per endpoint
+
+    python benchmarks/loadgen.py --qps 200 --duration 30                 # open loop, synthetic patients
+    python benchmarks/loadgen.py --mode closed --concurrency 32          # closed loop
+    python benchmarks/loadgen.py --sweep 100,200,400,800 --duration 10   # find the saturation point
+    python benchmarks/loadgen.py --replay traffic.jsonl --qps 100        # replay a request log
+
+Traffic:
+- synthetic (default): raw patients from benchmarks/patients.py spread over
+  the single-row endpoints in --endpoints
+- --replay FILE: one JSON request per line, {"method": "POST", "path":
+  "/api/v1/knn/predict/systolic", "body": {...}}; "ts" (seconds) keeps the
+  recorded spacing with --speed, otherwise lines are sent at --qps.
+  Lines without a path are skipped.
+
+Modes:
+- open: requests are started on a fixed schedule (--qps) whether or not
+  earlier ones finished. Latency is measured from the scheduled start, so
+  a saturated server shows up as growing latency instead of a silently
+  lower request rate (no coordinated omission).
+- closed: --concurrency users send their next request as soon as the
+  previous one answered; throughput is what the server sustains.
+
+Per endpoint the report has p50 / p95 / p99 / p99.9 latency, throughput
+and error rate (non-2xx or connection errors).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from patients import synthetic_rows  # noqa: E402
+
+API_PREFIX = "/api/v1"
+SYNTHETIC_ENDPOINTS = {
+    "random_forest": "/random-forest/predict",
+    "knn_systolic": "/knn/predict/systolic",
+    "knn_diastolic": "/knn/predict/diastolic",
+    "knn_joint": "/knn/predict/joint",
+}
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+@dataclass
+class RequestSpec:
+    method: str
+    path: str
+    body: Optional[Any] = None
+    offset: Optional[float] = None  # seconds from the start of a replayed log
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, latency: float, status: str) -> None:
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not status.startswith("2"):
+            self.errors += 1
+
+
+def synthetic_traffic(endpoints: List[str], seed: int = 0, pool_size: int = 1000) -> Iterator[RequestSpec]:
+    """Endless round-robin over the endpoints with varying synthetic patients"""
+    pools = {name: synthetic_rows(name, pool_size, seed) for name in endpoints}
+    for i in itertools.count():
+        name = endpoints[i % len(endpoints)]
+        yield RequestSpec("POST", API_PREFIX + SYNTHETIC_ENDPOINTS[name], pools[name][(i // len(endpoints)) % pool_size])
+
+
+def load_replay(path: str) -> List[RequestSpec]:
+    """Requests of a JSONL log; lines that are not requests are skipped"""
+    specs, skipped = [], 0
+    first_ts = None
+    for line in Path(path).read_text().splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict) or "path" not in record:
+            skipped += 1
+            continue
+        ts = record.get("ts")
+        if ts is not None:
+            first_ts = ts if first_ts is None else first_ts
+        specs.append(RequestSpec(
+            record.get("method", "POST").upper(),
+            record["path"],
+            record.get("body"),
+            None if ts is None else float(ts) - float(first_ts)
+        ))
+    if skipped:
+        print(f"Skipped {skipped} line(s) without a request path in {path}", file=sys.stderr)
+    if not specs:
+        raise ValueError(f"No requests in {path}")
+    return specs
+
+
+async def _send(client, spec: RequestSpec, scheduled: float, stats: Dict[str, EndpointStats]) -> None:
+    try:
+        response = await client.request(spec.method, spec.path, json=spec.body)
+        status = str(response.status_code)
+    except Exception as e:
+        status = type(e).__name__
+    stats.setdefault(spec.path, EndpointStats()).record(time.perf_counter() - scheduled, status)
+
+
+async def run_open_loop(client, traffic: Iterator[RequestSpec], qps: float, duration: float, speed: float = 1.0):
+    """Start requests on a fixed schedule; returns (stats, elapsed seconds)"""
+    stats: Dict[str, EndpointStats] = {}
+    tasks = []
+    start = time.perf_counter()
+    for i, spec in enumerate(traffic):
+        offset = spec.offset / speed if spec.offset is not None else i / qps
+        if offset >= duration:
+            break
+        scheduled = start + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(_send(client, spec, scheduled, stats)))
+    await asyncio.gather(*tasks)
+    return stats, time.perf_counter() - start
+
+
+async def run_closed_loop(client, traffic: Iterator[RequestSpec], concurrency: int, duration: float):
+    """`concurrency` users back to back; returns (stats, elapsed seconds)"""
+    stats: Dict[str, EndpointStats] = {}
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def user():
+        for spec in traffic:
+            if time.perf_counter() >= deadline:
+                return
+            await _send(client, spec, time.perf_counter(), stats)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return stats, time.perf_counter() - start
+
+
+def summarize(stats: Dict[str, EndpointStats], elapsed: float) -> Dict[str, Dict[str, Any]]:
+    """Per endpoint (and "total"): count, throughput, error rate, latency percentiles (ms)"""
+    summary = {}
+    everything = EndpointStats()
+    for path, endpoint in sorted(stats.items()):
+        summary[path] = _summarize_one(endpoint, elapsed)
+        everything.latencies.extend(endpoint.latencies)
+        everything.errors += endpoint.errors
+        for status, count in endpoint.statuses.items():
+            everything.statuses[status] = everything.statuses.get(status, 0) + count
+    summary["total"] = _summarize_one(everything, elapsed)
+    return summary
+
+
+def _summarize_one(endpoint: EndpointStats, elapsed: float) -> Dict[str, Any]:
+    count = len(endpoint.latencies)
+    result = {
+        "requests": count,
+        "throughput_rps": count / elapsed if elapsed > 0 else 0.0,
+        "error_rate": endpoint.errors / count if count else 0.0,
+        "statuses": dict(sorted(endpoint.statuses.items())),
+    }
+    latencies = np.asarray(endpoint.latencies) * 1000
+    for p in PERCENTILES:
+        result[f"p{p:g}_ms"] = float(np.percentile(latencies, p)) if count else None
+    return result
+
+
+def print_summary(title: str, summary: Dict[str, Dict[str, Any]]) -> None:
+    print(title)
+    print(f"  {'endpoint':<36} {'requests':>8} {'rps':>8} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'p99.9':>8}")
+    for path, s in summary.items():
+        percentiles = " ".join(
+            f"{s[f'p{p:g}_ms']:8.2f}" if s[f"p{p:g}_ms"] is not None else f"{'-':>8}" for p in PERCENTILES
+        )
+        print(f"  {path:<36} {s['requests']:>8} {s['throughput_rps']:8.1f} {s['error_rate'] * 100:6.2f}% {percentiles}")
+
+
+async def run(
+    base_url: str,
+    mode: str = "open",
+    qps: float = 100.0,
+    concurrency: int = 16,
+    duration: float = 10.0,
+    endpoints: Optional[List[str]] = None,
+    replay: Optional[str] = None,
+    speed: float = 1.0,
+    client=None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    One load run
+
+    Args:
+        base_url: API root (http://host:port)
+        client: httpx.AsyncClient to use instead of a new one (tests: in-process ASGI transport)
+    """
+    import httpx
+
+    if replay:
+        specs = load_replay(replay)
+        traffic = iter(specs) if mode == "open" and specs[0].offset is not None else itertools.cycle(specs)
+    else:
+        traffic = synthetic_traffic(endpoints or list(SYNTHETIC_ENDPOINTS)[:3])
+
+    own_client = client is None
+    if own_client:
+        limits = httpx.Limits(max_connections=max(concurrency, 1000), max_keepalive_connections=max(concurrency, 100))
+        client = httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits)
+    try:
+        if mode == "open":
+            stats, elapsed = await run_open_loop(client, traffic, qps, duration, speed)
+        else:
+            stats, elapsed = await run_closed_loop(client, traffic, concurrency, duration)
+    finally:
+        if own_client:
+            await client.aclose()
+    return summarize(stats, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mode", choices=("open", "closed"), default="open")
+    parser.add_argument("--qps", type=float, default=100.0, help="Arrival rate of the open loop")
+    parser.add_argument("--concurrency", type=int, default=16, help="Users of the closed loop")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument(
+        "--endpoints", default="random_forest,knn_systolic,knn_diastolic",
+        help=f"Synthetic traffic mix, from: {', '.join(SYNTHETIC_ENDPOINTS)}"
+    )
+    parser.add_argument("--replay", help="JSONL request log to replay instead of synthetic traffic")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up of recorded timestamps")
+    parser.add_argument("--sweep", help="Comma-separated QPS values: one open-loop run each")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(endpoints) - set(SYNTHETIC_ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    options = dict(duration=args.duration, endpoints=endpoints, replay=args.replay, speed=args.speed)
+    report = {}
+    if args.sweep:
+        for qps in (float(value) for value in args.sweep.split(",")):
+            summary = asyncio.run(run(args.url, "open", qps=qps, **options))
+            report[f"open@{qps:g}"] = summary
+            print_summary(f"Open loop at {qps:g} req/s for {args.duration:g}s", summary)
+    else:
+        summary = asyncio.run(run(args.url, args.mode, qps=args.qps, concurrency=args.concurrency, **options))
+        label = f"open@{args.qps:g}" if args.mode == "open" else f"closed@{args.concurrency}"
+        report[label] = summary
+        title = (
+            f"Open loop at {args.qps:g} req/s" if args.mode == "open" else f"Closed loop with {args.concurrency} users"
+        )
+        print_summary(f"{title} for {args.duration:g}s", summary)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
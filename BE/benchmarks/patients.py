@@ -0,0 +1,86 @@
+"""
+Synthetic patients built from the example payloads of the request schemas
+
+Numeric fields are jittered around the raw example, BMI is recomputed
+from height / weight and every one-hot group gets exactly one category,
+so the rows pass validation and spread over the whole model instead of
+hitting the same leaves / neighbors again and again.
+"""
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from utils.schemas import (  # noqa: E402
+    RandomForestPredictionRequest,
+    KNNSystolicPredictionRequest,
+    KNNDiastolicPredictionRequest,
+    KNNJointPredictionRequest
+)
+
+
+SCHEMAS = {
+    "random_forest": RandomForestPredictionRequest,
+    "knn_systolic": KNNSystolicPredictionRequest,
+    "knn_diastolic": KNNDiastolicPredictionRequest,
+    "knn_joint": KNNJointPredictionRequest,
+}
+
+# (mean, std, min, max) of the raw numeric fields
+NUMERIC = {
+    "Age": (55.0, 15.0, 18, 95),
+    "Height": (160.0, 9.0, 135, 195),
+    "Weight": (62.0, 11.0, 35, 130),
+    "Systolic_BP": (128.0, 20.0, 85, 210),
+    "Diastolic_BP": (72.0, 11.0, 40, 130),
+    "Heart_Rate": (76.0, 11.0, 45, 140),
+}
+
+ONE_HOT_GROUPS = (
+    ("Diabetes_None", "Diabetes_Diabetes", "Diabetes_Type2"),
+    ("Cerebral_infarction_None", "Cerebral_infarction_infarction"),
+    ("Cerebrovascular_None", "Cerebrovascular_disease", "Cerebrovascular_insuff"),
+)
+
+
+def synthetic_rows(model: str, n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    n raw request payloads (dicts) for a model
+
+    Args:
+        model: random_forest, knn_systolic, knn_diastolic or knn_joint
+        n: Number of rows
+        seed: RNG seed (same seed -> same rows)
+    """
+    schema = SCHEMAS[model]
+    example = schema.model_config["json_schema_extra"]["example_raw"]
+    rng = np.random.default_rng(seed)
+
+    columns = {"Sex": rng.integers(0, 2, n)}
+    for field, (mean, std, low, high) in NUMERIC.items():
+        if field in example:
+            columns[field] = np.clip(rng.normal(mean, std, n), low, high).round(1)
+    if "BMI" in example:
+        columns["BMI"] = (columns["Weight"] / (columns["Height"] / 100.0) ** 2).round(2)
+    for group in ONE_HOT_GROUPS:
+        # Mostly the "None" category, like the training data
+        choice = rng.choice(len(group), n, p=[0.8] + [0.2 / (len(group) - 1)] * (len(group) - 1))
+        for i, field in enumerate(group):
+            columns[field] = (choice == i).astype(int)
+
+    rows = []
+    for i in range(n):
+        row = dict(example)
+        for field, values in columns.items():
+            row[field] = values[i].item()
+        rows.append(row)
+    return rows
+
+
+def synthetic_requests(model: str, n: int, seed: int = 0) -> List[Any]:
+    """n request objects (built without validation, like a parsed batch request)"""
+    schema = SCHEMAS[model]
+    return [schema.model_construct(**row) for row in synthetic_rows(model, n, seed)]
@@ -0,0 +1,251 @@
+"""
+Prediction benchmark - models and endpoints, compared against a stored baseline
+
+    python benchmarks/predict.py                      # full suite, compare with baseline.json
+    python benchmarks/predict.py --quick              # batch sizes 1-1000, fewer repeats
+    python benchmarks/predict.py --json after.json    # also write the results
+    python benchmarks/predict.py --update-baseline    # store this run as the new baseline
+
+- model: RandomForestModel / KNNSystolicModel / KNNDiastolicModel called
+  directly (predict for 1 row, predict_batch above) on synthetic raw rows
+- endpoint: the FastAPI app through an in-process ASGI client (no network,
+  no server process); single-row endpoints and the batch endpoints
+
+The prediction cache is off unless --cache is given: every case repeats
+the same rows, so with the cache on it would measure cache hits.
+
+Every case reports the median, p95 and min time per call over at least
+`--min-repeats` calls and `--min-time` seconds, plus rows/s. A case is a
+regression when its median is more than `--threshold` slower than the
+baseline median; the exit code is then 1. The baseline is machine
+specific: regenerate it with --update-baseline on the machine that runs
+the comparison.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from patients import synthetic_requests, synthetic_rows  # noqa: E402
+
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+MODEL_SIZES = (1, 10, 100, 1000, 10_000, 100_000)
+ENDPOINT_SIZES = (1, 10, 100, 1000, 10_000)
+QUICK_SIZES = (1, 10, 100, 1000)
+DEFAULT_THRESHOLD = 0.25
+
+# model name -> (single endpoint, batch endpoint) under API_V1_STR
+ENDPOINTS = {
+    "random_forest": ("/random-forest/predict", "/random-forest/predict/batch"),
+    "knn_systolic": ("/knn/predict/systolic", "/knn/predict/systolic/batch"),
+    "knn_diastolic": ("/knn/predict/diastolic", "/knn/predict/diastolic/batch"),
+}
+
+
+def _timings(call: Callable[[], Any], min_repeats: int, min_time: float) -> List[float]:
+    """Seconds per call; at least min_repeats calls and min_time seconds"""
+    call()  # warm-up
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_repeats or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _summary(timings: List[float], rows: int) -> Dict[str, float]:
+    median = statistics.median(timings)
+    return {
+        "rows": rows,
+        "calls": len(timings),
+        "median_ms": median * 1000,
+        "p95_ms": float(np.percentile(timings, 95)) * 1000,
+        "min_ms": min(timings) * 1000,
+        "rows_per_s": rows / median if median > 0 else float("inf"),
+    }
+
+
+def bench_models(sizes, min_repeats: int, min_time: float) -> Dict[str, Dict[str, float]]:
+    """model/<name>/<rows> cases"""
+    from api.dependencies import get_random_forest_model, get_knn_systolic_model, get_knn_diastolic_model
+
+    models = {
+        "random_forest": get_random_forest_model(),
+        "knn_systolic": get_knn_systolic_model(),
+        "knn_diastolic": get_knn_diastolic_model(),
+    }
+    results = {}
+    for name, model in models.items():
+        rows = synthetic_requests(name, max(sizes))
+        for size in sizes:
+            batch = rows[:size]
+            if size == 1:
+                call = lambda: model.predict(batch[0], is_raw=True)  # noqa: E731
+            else:
+                call = lambda: model.predict_batch(batch, is_raw=True)  # noqa: E731
+            results[f"model/{name}/{size}"] = _summary(_timings(call, min_repeats, min_time), size)
+    return results
+
+
+async def _bench_endpoints_async(sizes, min_repeats: int, min_time: float) -> Dict[str, Dict[str, float]]:
+    import httpx
+    from config import Config
+    from main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, (single, batch) in ENDPOINTS.items():
+            rows = synthetic_rows(name, max(sizes))
+            for size in sizes:
+                path = Config.API_V1_STR + (single if size == 1 else batch)
+                payload = rows[0] if size == 1 else {"items": rows[:size]}
+                body = json.dumps(payload).encode()
+                headers = {"Content-Type": "application/json"}
+
+                async def call():
+                    response = await client.post(path, content=body, headers=headers)
+                    response.raise_for_status()
+
+                await call()  # warm-up
+                timings = []
+                deadline = time.perf_counter() + min_time
+                while len(timings) < min_repeats or time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    await call()
+                    timings.append(time.perf_counter() - start)
+                results[f"endpoint/{name}/{size}"] = _summary(timings, size)
+    return results
+
+
+def bench_endpoints(sizes, min_repeats: int, min_time: float) -> Dict[str, Dict[str, float]]:
+    """endpoint/<name>/<rows> cases (single-row endpoint for 1, batch endpoint above)"""
+    return asyncio.run(_bench_endpoints_async(sizes, min_repeats, min_time))
+
+
+def run(
+    model_sizes=MODEL_SIZES,
+    endpoint_sizes=ENDPOINT_SIZES,
+    min_repeats: int = 5,
+    min_time: float = 0.5,
+    cache: bool = False
+) -> Dict[str, Any]:
+    """
+    Args:
+        cache: Keep the prediction cache on (every repeat of a case would then be a cache hit)
+    """
+    from api.dependencies import get_random_forest_model, get_knn_systolic_model, get_knn_diastolic_model
+
+    models = [get_random_forest_model(), get_knn_systolic_model(), get_knn_diastolic_model()]
+    caches = [model.cache for model in models]
+    if not cache:
+        for model in models:
+            model.cache = None
+    cases = {}
+    try:
+        if model_sizes:
+            cases.update(bench_models(model_sizes, min_repeats, min_time))
+        if endpoint_sizes:
+            cases.update(bench_endpoints(endpoint_sizes, min_repeats, min_time))
+    finally:
+        for model, model_cache in zip(models, caches):
+            model.cache = model_cache
+    return {
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": cases,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Median of every case against the baseline
+
+    Returns:
+        One entry per case: case, median_ms, baseline_ms, change (fraction), regression
+    """
+    rows = []
+    for case, result in report["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        entry = {"case": case, "median_ms": result["median_ms"], "baseline_ms": None, "change": None, "regression": False}
+        if base:
+            entry["baseline_ms"] = base["median_ms"]
+            entry["change"] = result["median_ms"] / base["median_ms"] - 1.0
+            entry["regression"] = entry["change"] > threshold
+        rows.append(entry)
+    return rows
+
+
+def print_report(report: Dict[str, Any], comparison: Optional[List[Dict[str, Any]]] = None) -> None:
+    changes = {entry["case"]: entry for entry in comparison or []}
+    print(f"Prediction benchmark (Python {report['python']}, {report['machine']})")
+    print(f"  {'case':<32} {'median ms':>10} {'p95 ms':>9} {'rows/s':>12} {'baseline':>10} {'change':>8}")
+    for case, result in report["cases"].items():
+        entry = changes.get(case, {})
+        baseline = f"{entry['baseline_ms']:10.3f}" if entry.get("baseline_ms") is not None else f"{'-':>10}"
+        change = f"{entry['change'] * 100:+7.1f}%" if entry.get("change") is not None else f"{'-':>8}"
+        flag = "  REGRESSION" if entry.get("regression") else ""
+        print(
+            f"  {case:<32} {result['median_ms']:10.3f} {result['p95_ms']:9.3f} "
+            f"{result['rows_per_s']:12,.0f} {baseline} {change}{flag}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help=f"Batch sizes {QUICK_SIZES} only, fewer repeats")
+    parser.add_argument("--models-only", action="store_true")
+    parser.add_argument("--endpoints-only", action="store_true")
+    parser.add_argument("--min-repeats", type=int, default=None)
+    parser.add_argument("--min-time", type=float, default=None, help="Seconds per case")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown (0.25 = +25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--cache", action="store_true", help="Measure with the prediction cache on (repeats hit it)")
+    args = parser.parse_args()
+
+    model_sizes = QUICK_SIZES if args.quick else MODEL_SIZES
+    endpoint_sizes = QUICK_SIZES if args.quick else ENDPOINT_SIZES
+    report = run(
+        model_sizes=() if args.endpoints_only else model_sizes,
+        endpoint_sizes=() if args.models_only else endpoint_sizes,
+        min_repeats=args.min_repeats or (3 if args.quick else 5),
+        min_time=args.min_time if args.min_time is not None else (0.2 if args.quick else 0.5),
+        cache=args.cache
+    )
+
+    baseline_path = Path(args.baseline)
+    comparison = None
+    if baseline_path.exists() and not args.update_baseline:
+        comparison = compare(report, json.loads(baseline_path.read_text()), args.threshold)
+    print_report(report, comparison)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline written to {baseline_path}")
+    elif comparison is not None:
+        regressions = [entry["case"] for entry in comparison if entry["regression"]]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above +{args.threshold * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nNo regression above +{args.threshold * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Startup benchmark - import time, time-to-first-byte and time-to-first-prediction
+
+Every measurement runs in a fresh interpreter so nothing is cached in-process:
+
+    python benchmarks/startup.py              # 5 runs, table
+    python benchmarks/startup.py --runs 10 --json startup.json
+
+- import: wall time of `import main`, plus a per-module breakdown parsed
+  from `python -X importtime` (self / cumulative microseconds)
+- ttfb: from spawning run_server.py to the first byte of GET /health
+- first_prediction: from spawning run_server.py to the first successful
+  POST /api/v1/random-forest/predict (models load lazily or via warm-up)
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BE_DIR = Path(__file__).resolve().parent.parent
+SRC_DIR = BE_DIR / "src"
+RAW_INPUT = json.loads((BE_DIR / "test_raw_input.json").read_text())
+
+# Packages expected to stay out of `import main`
+HEAVY_MODULES = ("pandas", "sklearn", "joblib", "scipy", "matplotlib")
+
+
+def _python(*args: str, **kwargs) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR), PYTHONWARNINGS="ignore")
+    return subprocess.run([sys.executable, *args], cwd=SRC_DIR, env=env, capture_output=True, text=True, **kwargs)
+
+
+def measure_import() -> float:
+    """Wall time (ms) of `import main` in a fresh interpreter"""
+    code = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+    result = _python("-c", code, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def heavy_modules_imported() -> List[str]:
+    """Heavy packages that `import main` pulls in"""
+    code = f"import sys, main; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    return [m for m in _python("-c", code, check=True).stdout.strip().split(",") if m]
+
+
+def import_breakdown(top: int = 15) -> List[Dict[str, object]]:
+    """
+    Per-module import time of `import main` (python -X importtime)
+
+    Returns:
+        The `top` modules by cumulative time: module, self_us, cumulative_us, depth
+    """
+    result = _python("-X", "importtime", "-c", "import main", check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    rows.sort(key=lambda row: row["cumulative_us"], reverse=True)
+    return rows[:top]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(url: str, payload: Optional[dict] = None) -> Optional[int]:
+    """HTTP status of one request, None if the server is not accepting yet"""
+    data = None if payload is None else json.dumps(payload).encode()
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read(1)
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def measure_server(timeout: float = 60.0) -> Dict[str, float]:
+    """Spawn run_server.py and time the first /health byte and the first prediction (ms)"""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, str(BE_DIR / "run_server.py"), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        timings = {}
+        deadline = start + timeout
+        while _request(f"{base}/health") != 200:
+            if time.perf_counter() > deadline or server.poll() is not None:
+                raise RuntimeError("server did not answer /health")
+            time.sleep(0.005)
+        timings["ttfb_ms"] = (time.perf_counter() - start) * 1000
+
+        while _request(f"{base}/api/v1/random-forest/predict", RAW_INPUT) != 200:
+            if time.perf_counter() > deadline:
+                raise RuntimeError("server did not answer a prediction")
+            time.sleep(0.005)
+        timings["first_prediction_ms"] = (time.perf_counter() - start) * 1000
+        return timings
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def run(runs: int) -> Dict[str, object]:
+    imports = [measure_import() for _ in range(runs)]
+    servers = [measure_server() for _ in range(runs)]
+    return {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "import_ms": _summary(imports),
+        "ttfb_ms": _summary([s["ttfb_ms"] for s in servers]),
+        "first_prediction_ms": _summary([s["first_prediction_ms"] for s in servers]),
+        "heavy_modules_imported": heavy_modules_imported(),
+        "import_breakdown": import_breakdown(),
+    }
+
+
+def print_report(report: Dict[str, object]) -> None:
+    print(f"Startup benchmark ({report['runs']} runs, Python {report['python']})")
+    for key in ("import_ms", "ttfb_ms", "first_prediction_ms"):
+        s = report[key]
+        print(f"  {key:<22} median {s['median']:8.1f}   min {s['min']:8.1f}   max {s['max']:8.1f}")
+    heavy = report["heavy_modules_imported"]
+    print(f"  heavy modules at import: {', '.join(heavy) if heavy else 'none'}")
+    print("\n  import breakdown (-X importtime, top by cumulative):")
+    print(f"  {'self ms':>9} {'cumul ms':>9}  module")
+    for row in report["import_breakdown"]:
+        indent = "  " * row["depth"]
+        print(f"  {row['self_us'] / 1000:>9.1f} {row['cumulative_us'] / 1000:>9.1f}  {indent}{row['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.runs)
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from config import Config
+from models.compiled_forest import CompiledForest
+from models.random_forest_model import RandomForestModel
+
+
+def export_compiled_forest(version: str = None):
+    """
+    Xuất Random Forest thành CompiledForest (normalized + raw đã gộp scaler)
+
+    Args:
+        version: Model version in models/random_forest/versions/<version>/ (mặc định: model gốc)
+    """
+
+    # 1. Load model + scaler như API
+    model_dir = os.path.dirname(Config.RANDOM_FOREST_MODEL_PATH)
+    if version and version != Config.BASE_MODEL_VERSION:
+        model_dir = os.path.join(model_dir, "versions", version)
+        compiled_dir = os.path.join(model_dir, "compiled")
+    else:
+        compiled_dir = Config.COMPILED_FOREST_DIR
+    model_path = os.path.join(model_dir, os.path.basename(Config.RANDOM_FOREST_MODEL_PATH))
+    scaler_path = os.path.join(model_dir, os.path.basename(Config.RANDOM_FOREST_SCALER_PATH))
+    # Build mới từ sklearn (không đọc bundle cũ đang được ghi đè)
+    model = RandomForestModel(model_path=model_path, scaler_path=scaler_path, backend="sklearn")
+    if model.scaler is None:
+        raise FileNotFoundError(f"Scaler not found: {scaler_path}")
+    compiled = CompiledForest.from_sklearn(model.model)
+
+    # 2. Ghi bundle: threshold z-score và threshold đơn vị gốc
+    bundles = {
+        "normalized": compiled,
+        "raw": compiled.fold_scaler(model.layout.scaled_idx, model.layout.mean, model.layout.scale),
+    }
+    for name, forest in bundles.items():
+        forest.save(os.path.join(compiled_dir, name))
+    print(f"Exported {compiled.n_trees} trees to: {compiled_dir}")
+
+    # 3. Verify: model load như server phải dùng cả hai bundle (không fold lại),
+    # và raw input qua bundle "raw" phải khớp scaler + predict_proba của sklearn
+    served = RandomForestModel(model_path=model_path, scaler_path=scaler_path, backend="compiled", compiled_dir=compiled_dir)
+    if Config.COMPILED_FOREST_MMAP_MODE and not (
+        isinstance(served.compiled.value, np.memmap) and isinstance(served.compiled_raw.value, np.memmap)
+    ):
+        raise RuntimeError(f"Exported bundles are not used by the model: {compiled_dir}")
+
+    rng = np.random.default_rng(0)
+    raw = model.layout.vectorize(np.zeros((1000, model.layout.n_features)))
+    raw[:, model.layout.scaled_idx] = (
+        model.layout.mean + rng.standard_normal((1000, len(model.layout.scaled_idx))) * model.layout.scale
+    ).round(1)
+    expected = model.model.predict_proba(model.preprocess(raw.copy(), is_raw=True))
+
+    max_diff = np.max(np.abs(served.compiled_raw.predict_proba(raw) - expected))
+    print(f"\nMax difference vs sklearn: {max_diff}")
+
+    if max_diff < 1e-9:
+        print("✅ Compiled forest matches sklearn")
+    else:
+        print("❌ Compiled forest differs from sklearn")
+
+    return bundles
+
+
+if __name__ == "__main__":
+    try:
+        export_compiled_forest(sys.argv[1] if len(sys.argv) > 1 else None)
+        print("\nSUCCESS! Compiled models exported!")
+    except Exception as e:
+        print(f"\nERROR: {e}")
+        import traceback
+
+        traceback.print_exc()
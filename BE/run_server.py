@@ -1,18 +1,153 @@
+import argparse
+import gc
+import os
+import signal
+import socket
 import sys
+import time
 from pathlib import Path
 
-# Add src to Python path
+# Add src to Python path: everything is imported as config / main / api.* (never src.*),
+# so the app, its registry and its caches exist once per process
 src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
-if __name__ == "__main__":
+
+def preload_models():
+    """Load every model in the parent so that forked workers share the pages"""
+    from api.dependencies import get_random_forest_model, get_knn_systolic_model, get_knn_diastolic_model
+
+    get_random_forest_model()
+    get_knn_systolic_model()
+    get_knn_diastolic_model()
+
+    # Move everything loaded so far out of the GC's reach: collections in the
+    # workers would otherwise touch (and un-share) these objects
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(app, sock: socket.socket, port: int) -> None:
+    """Serve on the inherited listening socket until told to stop"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, reload=False))
+    server.run(sockets=[sock])
+
+
+def serve_forked(app, host: str, port: int, workers: int, report_interval: float) -> None:
+    """
+    Pre-fork serving: load the models once, then fork `workers` processes
+
+    The workers inherit the loaded models copy-on-write (compiled forest
+    and KNN training arrays are additionally memory-mapped read-only), so
+    N workers cost one copy of the models plus their private heaps. The
+    parent prints per-worker RSS / shared pages at start-up and then every
+    `report_interval` seconds, and forks a replacement for every worker
+    that exits until it is told to stop.
+
+    The model registry watcher is disabled in this mode: a hot swap in
+    each worker would load a private copy of the new version per worker.
+    New model versions are picked up by restarting the server.
+    """
+    from config import Config
+    from utils.memory import format_memory_report
+
+    Config.MODEL_WATCH_ENABLED = False
+    preload_models()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    def spawn() -> int:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(app, sock, port)
+            finally:
+                os._exit(0)
+        return pid
+
+    alive = [spawn() for _ in range(workers)]
+    print(f"Started {workers} workers on http://{host}:{port} (pids: {alive})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in alive:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Memory report once the workers are up, then periodically
+    time.sleep(2.0)
+    next_report = time.monotonic()
+    while alive:
+        if not stopping and time.monotonic() >= next_report:
+            labels = [("parent", os.getpid())] + [(f"worker {i}", pid) for i, pid in enumerate(alive)]
+            print(format_memory_report(labels), flush=True)
+            next_report = time.monotonic() + report_interval if report_interval > 0 else float("inf")
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if not pid:
+            time.sleep(0.5)
+            continue
+        index = alive.index(pid)
+        if stopping:
+            alive.pop(index)
+            continue
+        # Keep the capacity: the replacement takes the dead worker's slot
+        alive[index] = spawn()
+        print(f"Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), started worker {alive[index]}", flush=True)
+    sock.close()
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Run the Blood Pressure Prediction API")
+    parser.add_argument("--host", default=Config.HOST)
+    parser.add_argument("--port", type=int, default=Config.PORT)
+    parser.add_argument(
+        "--workers", type=int, default=Config.WORKERS,
+        help="Worker processes; >1 loads the models once and forks workers that share them"
+    )
+    parser.add_argument(
+        "--memory-report", type=float, default=Config.WORKER_MEMORY_REPORT_S,
+        help="Seconds between per-worker RSS reports (0 = only at start-up)"
+    )
+    args = parser.parse_args()
+
+    from main import app
+
+    if args.workers > 1:
+        if not hasattr(os, "fork"):
+            parser.error("--workers > 1 needs os.fork (Linux / macOS)")
+        serve_forked(app, args.host, args.port, args.workers, args.memory_report)
+        return
+
     import uvicorn
-    from src.main import app
-    from src.config import Config
 
     uvicorn.run(
         app,
-        host=Config.HOST,
-        port=Config.PORT,
-        reload=False 
+        host=args.host,
+        port=args.port,
+        reload=False
     )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Offline batch scoring - score a large CSV / Parquet file with the serving models
+
+    python score_file.py patients.csv scored.csv --is-raw
+    python score_file.py patients.parquet scored.parquet --models random_forest --workers 8
+    python score_file.py patients.csv.gz scored.csv --results-only --chunk-size 50000
+
+The file is read in chunks; every chunk is scored by a pool of worker
+processes, each of which loads the models once (through the same model
+registry as the API, so the same versions are used). At most
+2 x workers chunks are in flight, so memory does not grow with the file,
+and the results are written in input order.
+
+Columns use the request field names (Age, Systolic_BP, Diabetes_Type2, ...)
+or the training column names. An `is_raw` column, if present, overrides
+--is-raw per row. Rows the API would reject (missing or non-numeric value,
+value out of the field's range, Sex not 0/1, invalid one-hot group) get
+empty result columns and the reason in `<model>_error`.
+
+Parquet needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+MODELS = ("random_forest", "knn_systolic", "knn_diastolic")
+
+# KNN result column suffix -> predict_batch key
+KNN_OUTPUTS = {
+    "mmHg": "predicted_value_mmHg",
+    "std_mmHg": "prediction_std_mmHg",
+    "ci_lower": "confidence_interval_lower",
+    "ci_upper": "confidence_interval_upper",
+}
+PREFIXES = {"random_forest": "rf", "knn_systolic": "systolic", "knn_diastolic": "diastolic"}
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet files need pyarrow: pip install pyarrow")
+    return pq
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator["pd.DataFrame"]:  # noqa: F821
+    """DataFrames of at most chunk_size rows (CSV may be compressed: .gz, .zip, ...)"""
+    import pandas as pd
+
+    if _is_parquet(path):
+        pq = _require_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class ResultWriter:
+    """Appends scored chunks to a CSV or Parquet file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._parquet = None
+        self._started = False
+
+    def write(self, frame) -> None:
+        if _is_parquet(self.path):
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                pq = _require_pyarrow()
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+        self._started = True
+
+    def close(self) -> None:
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def row_schemas() -> Dict[str, type]:
+    """Request schema of one row per model (fields and their constraints)"""
+    from utils.schemas import (
+        RandomForestPredictionRequest,
+        KNNSystolicPredictionRequest,
+        KNNDiastolicPredictionRequest
+    )
+
+    return {
+        "random_forest": RandomForestPredictionRequest,
+        "knn_systolic": KNNSystolicPredictionRequest,
+        "knn_diastolic": KNNDiastolicPredictionRequest,
+    }
+
+
+# Worker side
+
+_models: Dict[str, object] = {}
+
+
+def init_worker(versions: Dict[str, str]) -> None:
+    """Load the models once per worker process, at the versions chosen by the parent"""
+    from api.dependencies import get_model_registry
+
+    registry = get_model_registry()
+    for name, version in versions.items():
+        _models[name] = registry.activate(name, version).model
+
+
+def score_chunk(frame, models: List[str], default_raw: bool, results_only: bool):
+    """
+    Score one chunk with every requested model
+
+    Returns:
+        DataFrame with the input columns (unless results_only) plus the result columns, same row order
+    """
+    import pandas as pd
+    from utils.schemas import column_violations
+
+    if "is_raw" in frame.columns:
+        is_raw = frame["is_raw"].fillna(default_raw).astype(str).str.lower().isin(("true", "1", "1.0")).to_numpy()
+    else:
+        is_raw = np.full(len(frame), default_raw)
+
+    # Non-numeric cells become NaN and are reported per row instead of failing the chunk
+    text = [c for c in frame.columns if c != "is_raw" and not pd.api.types.is_numeric_dtype(frame[c])]
+    values = frame.assign(**{c: pd.to_numeric(frame[c], errors="coerce") for c in text}) if text else frame
+    not_numeric = frame[text].notna() & values[text].isna()
+
+    schemas = row_schemas()
+    out = pd.DataFrame(index=frame.index) if results_only else frame.copy()
+    for name in models:
+        model = _models[name]
+        prefix = PREFIXES[name]
+        matrix = model.layout.vectorize(values)
+
+        # Same checks as the API (columnar / binary paths); rows failing them are not scored
+        errors = np.full(len(frame), None, dtype=object)
+        missing = np.isnan(matrix).any(axis=1)
+        errors[missing] = "missing value"
+        used = [c for c in text if c in model.layout.fields or c in model.layout.columns]
+        if used:
+            errors[missing & not_numeric[used].any(axis=1).to_numpy()] = "not a number"
+        invalid = missing.copy()
+        checked = np.flatnonzero(~missing)
+        for message, bad in column_violations(matrix[checked].T, model.layout.fields, schemas[name]):
+            for i in checked[bad]:
+                errors[i] = message if errors[i] is None else f"{errors[i]}; {message}"
+            invalid[checked[bad]] = True
+        rows = np.flatnonzero(~invalid)
+
+        if name == "random_forest":
+            predictions = np.full(len(frame), np.nan)
+            probabilities = np.full(len(frame), np.nan)
+            labels = np.full(len(frame), None, dtype=object)
+            if rows.size:
+                predicted, probability = model.predict_batch(matrix[rows], is_raw=is_raw[rows])
+                predictions[rows] = predicted
+                probabilities[rows] = probability
+                labels[rows] = [model.get_prediction_label(p) for p in predicted]
+            out[f"{prefix}_prediction"] = pd.array(predictions, dtype="Int64")
+            out[f"{prefix}_label"] = labels
+            out[f"{prefix}_probability"] = probabilities
+        else:
+            result = model.predict_batch(matrix[rows], is_raw=is_raw[rows]) if rows.size else None
+            for suffix, key in KNN_OUTPUTS.items():
+                column = np.full(len(frame), np.nan)
+                if result is not None:
+                    column[rows] = result[key]
+                out[f"{prefix}_{suffix}"] = column
+
+        # Always present, so that every chunk has the same columns
+        out[f"{prefix}_error"] = errors
+    return out
+
+
+# Parent side
+
+def check_columns(path: str, models: List[str]) -> None:
+    """Fail early when the file lacks a field the API would require for a requested model"""
+    from utils.features import FIELD_ALIASES
+
+    schemas = row_schemas()
+    first = next(read_chunks(path, 1), None)
+    if first is None:
+        raise SystemExit(f"{path} is empty")
+    for name in models:
+        missing = [
+            field for field in schemas[name].model_fields
+            if field != "is_raw" and field not in first.columns and FIELD_ALIASES.get(field) not in first.columns
+        ]
+        if missing:
+            raise SystemExit(f"{path} has no column for {name} fields: {', '.join(missing)}")
+
+
+def score_file(
+    input_path: str,
+    output_path: str,
+    models: List[str],
+    workers: int = 0,
+    chunk_size: int = 20_000,
+    default_raw: bool = False,
+    results_only: bool = False,
+    progress: bool = True
+) -> Dict[str, object]:
+    """
+    Score input_path into output_path
+
+    Args:
+        workers: Worker processes (0 = score in this process)
+
+    Returns:
+        Report: rows, chunks, seconds, rows_per_s, versions
+    """
+    from api.dependencies import get_model_registry
+
+    registry = get_model_registry()
+    versions = {name: registry.initial_version(name) for name in models}
+
+    start = time.perf_counter()
+    writer = ResultWriter(output_path)
+    rows = chunks = 0
+
+    def written(frame) -> None:
+        nonlocal rows, chunks
+        writer.write(frame)
+        rows += len(frame)
+        chunks += 1
+        if progress:
+            elapsed = time.perf_counter() - start
+            print(f"\r{rows:>12,} rows  {rows / elapsed:>10,.0f} rows/s  {elapsed:8.1f}s", end="", file=sys.stderr, flush=True)
+
+    try:
+        if workers <= 0:
+            init_worker(versions)
+            for frame in read_chunks(input_path, chunk_size):
+                written(score_chunk(frame, models, default_raw, results_only))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(versions,)) as pool:
+                in_flight = deque()
+                for frame in read_chunks(input_path, chunk_size):
+                    in_flight.append(pool.submit(score_chunk, frame, models, default_raw, results_only))
+                    # Bounded read-ahead; the oldest chunk is written first to keep input order
+                    if len(in_flight) >= 2 * workers:
+                        written(in_flight.popleft().result())
+                while in_flight:
+                    written(in_flight.popleft().result())
+    finally:
+        writer.close()
+        if progress:
+            print(file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "rows_per_s": rows / elapsed if elapsed > 0 else 0.0,
+        "versions": versions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="CSV (optionally compressed) or Parquet file")
+    parser.add_argument("output", help="CSV or Parquet file (by extension)")
+    parser.add_argument("--models", default=",".join(MODELS), help=f"Comma-separated, from: {', '.join(MODELS)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=20_000, help="Rows per chunk")
+    parser.add_argument("--is-raw", action="store_true", help="Rows without an is_raw column are RAW values")
+    parser.add_argument("--results-only", action="store_true", help="Write only the result columns")
+    parser.add_argument("--quiet", action="store_true", help="No progress line")
+    args = parser.parse_args()
+
+    models = [name.strip() for name in args.models.split(",") if name.strip()]
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        parser.error(f"Unknown models: {', '.join(sorted(unknown))}")
+
+    check_columns(args.input, models)
+    report = score_file(
+        args.input, args.output, models,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        default_raw=args.is_raw,
+        results_only=args.results_only,
+        progress=not args.quiet
+    )
+    versions = ", ".join(f"{name} {version}" for name, version in report["versions"].items())
+    print(
+        f"Scored {report['rows']:,} rows in {report['seconds']:.1f}s "
+        f"({report['rows_per_s']:,.0f} rows/s, {report['chunks']} chunks; {versions}) -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Micro-batching - gom các request một dòng đồng thời thành một lần predict vectorized
+"""
+import asyncio
+import contextvars
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from config import Config
+from utils import profiling
+from utils.metrics import BATCH_SIZE_BUCKETS
+from api.executor import InferenceExecutor, InferenceOverloaded
+
+
+class MicroBatcher:
+    """
+    Async request coalescer for one model
+
+    Every caller awaits `submit(row, is_raw)`. Rows are queued and flushed
+    as one `predict_fn` call when the queue reaches `max_batch_size` or when
+    the oldest queued row has waited `max_wait_ms`, then each caller's
+    future is resolved with its own result. Under light load a row waits at
+    most `max_wait_ms`; under heavy load batches fill up and the per-call
+    overhead (scaling, tree traversal setup, neighbor search) is paid once
+    per batch instead of once per request.
+
+    With an InferenceExecutor the batch runs in its pool and the event
+    loop keeps accepting rows meanwhile. If a batch fails, its rows are
+    retried one by one so that a bad row only fails its own request; an
+    overloaded executor fails the whole batch at once.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        predict_fn: Callable[[List[Any], List[bool]], Sequence[Any]],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        executor: Optional[InferenceExecutor] = None
+    ):
+        """
+        Args:
+            name: Model name (dùng cho stats)
+            predict_fn: Hàm nhận (rows, is_raw) và trả về một kết quả cho mỗi dòng, đúng thứ tự
+            max_batch_size: Số dòng tối đa mỗi batch. Mặc định: Config.MICRO_BATCH_MAX_SIZE
+            max_wait_ms: Thời gian chờ tối đa của dòng đầu tiên. Mặc định: Config.MICRO_BATCH_MAX_WAIT_MS
+            executor: Pool chạy predict_fn (None = chạy ngay trên event loop)
+        """
+        self.name = name
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size or Config.MICRO_BATCH_MAX_SIZE
+        self.max_wait = (Config.MICRO_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        if self.max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+
+        self._pending: List[Tuple[Any, bool, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Stats
+        self.batches = 0
+        self.rows = 0
+        self.max_seen_batch_size = 0
+        self.flushes_by_size = 0
+        self.flushes_by_timeout = 0
+        self.batch_size_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.batch_size_overflow = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Số dòng đang chờ flush"""
+        return len(self._pending)
+
+    async def submit(self, row: Any, is_raw: bool = False) -> Any:
+        """
+        Queue one row and wait for its prediction
+
+        Args:
+            row: Request object / dict (một dòng)
+            is_raw: Cờ RAW của dòng
+
+        Returns:
+            Kết quả của dòng này (phần tử tương ứng trong output của predict_fn)
+        """
+        if profiling.current() is not None:
+            # Profiled request: predict alone, in the request's context, so the model call is in its profile
+            self._record(1)
+            return (await self._predict([row], [is_raw]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, is_raw, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self.flushes_by_size += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush_on_timeout)
+
+        return await future
+
+    def _flush_on_timeout(self) -> None:
+        self._timer = None
+        if self._pending:
+            self.flushes_by_timeout += 1
+            self._flush()
+
+    def _flush(self) -> None:
+        """Run one predict for everything queued (at most max_batch_size rows)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush_on_timeout)
+
+        self._record(len(batch))
+        # Fresh context: the batch serves many requests, its records carry none of their ids
+        task = asyncio.get_running_loop().create_task(self._resolve(batch), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _predict(self, rows: List[Any], is_raw: List[bool]) -> Sequence[Any]:
+        if self.executor is None:
+            return self.predict_fn(rows, is_raw)
+        return await self.executor.run(self.predict_fn, rows, is_raw)
+
+    async def _resolve(self, batch: List[Tuple[Any, bool, asyncio.Future]]) -> None:
+        rows = [row for row, _, _ in batch]
+        is_raw = [raw for _, raw, _ in batch]
+        try:
+            results = await self._predict(rows, is_raw)
+        except Exception as e:
+            if len(batch) == 1 or isinstance(e, InferenceOverloaded):
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            # Cô lập lỗi: chạy lại từng dòng
+            await asyncio.gather(*(self._resolve([item]) for item in batch))
+            return
+
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, size: int) -> None:
+        self.batches += 1
+        self.rows += size
+        self.max_seen_batch_size = max(self.max_seen_batch_size, size)
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_histogram[bucket] += 1
+                break
+        else:
+            self.batch_size_overflow += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth và thống kê kích thước batch"""
+        histogram = {f"le_{bucket}": count for bucket, count in self.batch_size_histogram.items()}
+        histogram["overflow"] = self.batch_size_overflow
+        return {
+            "queue_depth": self.queue_depth,
+            "batches_in_flight": len(self._tasks),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "max_seen_batch_size": self.max_seen_batch_size,
+            "flushes_by_size": self.flushes_by_size,
+            "flushes_by_timeout": self.flushes_by_timeout,
+            "batch_size_histogram": histogram,
+        }
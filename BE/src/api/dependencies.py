@@ -1,72 +1,238 @@
-from functools import lru_cache
+import hmac
+import os
+from functools import lru_cache, partial
+from typing import Dict, List, Optional
+from fastapi import Header, HTTPException, status
 from models.random_forest_model import RandomForestModel
 from models.knn_model import KNNSystolicModel, KNNDiastolicModel
+from models.registry import ModelRegistry, ModelSpec
 from config import Config
+from api.batching import MicroBatcher
+from api.executor import InferenceExecutor
+from api.warmup import (
+    WarmupManager,
+    default_models,
+    warm_random_forest,
+    warm_knn
+)
+from utils.schemas import KNNSystolicPredictionRequest, KNNDiastolicPredictionRequest
+from utils.cache import clear_prediction_caches
 
 
-# Singleton instances
-_random_forest_model = None
-_knn_systolic_model = None
-_knn_diastolic_model = None
+def _spec(name: str, model_path: str, scaler_path: str, factory, warm) -> ModelSpec:
+    return ModelSpec(
+        name,
+        directory=os.path.dirname(model_path),
+        model_file=os.path.basename(model_path),
+        scaler_file=os.path.basename(scaler_path),
+        factory=factory,
+        warm=warm
+    )
+
+
+def _random_forest_factory(model_path: str, scaler_path: str, version_dir: str) -> RandomForestModel:
+    # Bundle CompiledForest đã export của version (model gốc: Config.COMPILED_FOREST_DIR)
+    compiled_dir = None
+    if os.path.normpath(version_dir) != os.path.dirname(Config.RANDOM_FOREST_MODEL_PATH):
+        compiled_dir = os.path.join(version_dir, "compiled")
+    return RandomForestModel(model_path=model_path, scaler_path=scaler_path, compiled_dir=compiled_dir)
 
 
 @lru_cache()
+def get_model_registry() -> ModelRegistry:
+    """
+    Lấy singleton instance của ModelRegistry
+    
+    Returns:
+        ModelRegistry of the three served models (versions under each model dir)
+    """
+    registry = ModelRegistry({
+        "random_forest": _spec(
+            "random_forest", Config.RANDOM_FOREST_MODEL_PATH, Config.RANDOM_FOREST_SCALER_PATH,
+            _random_forest_factory, warm_random_forest
+        ),
+        "knn_systolic": _spec(
+            "knn_systolic", Config.KNN_SYSTOLIC_MODEL_PATH, Config.KNN_SYSTOLIC_SCALER_PATH,
+            lambda model_path, scaler_path, _: KNNSystolicModel(model_path=model_path, scaler_path=scaler_path),
+            warm_knn(KNNSystolicPredictionRequest)
+        ),
+        "knn_diastolic": _spec(
+            "knn_diastolic", Config.KNN_DIASTOLIC_MODEL_PATH, Config.KNN_DIASTOLIC_SCALER_PATH,
+            lambda model_path, scaler_path, _: KNNDiastolicModel(model_path=model_path, scaler_path=scaler_path),
+            warm_knn(KNNDiastolicPredictionRequest)
+        ),
+    })
+    registry.add_listener(_on_model_swap)
+    return registry
+
+
+def activate_versions(versions: Dict[str, str]) -> None:
+    """Process pool initializer after a swap: serve the same versions as the parent"""
+    registry = get_model_registry()
+    for name, version in versions.items():
+        registry.activate(name, version)
+
+
+def _on_model_swap(name: str, record) -> None:
+    # Cached outputs belong to the previous version (or to files reloaded in place)
+    clear_prediction_caches(name)
+    # Thread workers share the registry; process workers are restarted on the new versions
+    if get_inference_executor.cache_info().currsize:
+        versions = get_model_registry().active_versions()
+        get_inference_executor().restart(warm_up=(partial(activate_versions, versions),))
+
+
 def get_random_forest_model() -> RandomForestModel:
     """
-    Lấy singleton instance của Random Forest Model
+    Lấy active version của Random Forest Model
     
     Returns:
-        RandomForestModel instance
+        RandomForestModel instance (model.version = registry version)
     """
-    global _random_forest_model
-    if _random_forest_model is None:
-        _random_forest_model = RandomForestModel(
-            model_path=Config.RANDOM_FOREST_MODEL_PATH,
-            scaler_path=Config.RANDOM_FOREST_SCALER_PATH
-        )
-    return _random_forest_model
+    return get_model_registry().get("random_forest")
 
 
-@lru_cache()
 def get_knn_systolic_model() -> KNNSystolicModel:
     """
-    Get singleton instance of KNN Systolic BP Model
+    Get the active version of the KNN Systolic BP Model
     
     Returns:
-        KNNSystolicModel instance
+        KNNSystolicModel instance (model.version = registry version)
     """
-    global _knn_systolic_model
-    if _knn_systolic_model is None:
-        _knn_systolic_model = KNNSystolicModel(
-            model_path=Config.KNN_SYSTOLIC_MODEL_PATH,
-            scaler_path=Config.KNN_SYSTOLIC_SCALER_PATH
-        )
-    return _knn_systolic_model
+    return get_model_registry().get("knn_systolic")
 
 
-@lru_cache()
 def get_knn_diastolic_model() -> KNNDiastolicModel:
     """
-    Get singleton instance of KNN Diastolic BP Model
+    Get the active version of the KNN Diastolic BP Model
+    
+    Returns:
+        KNNDiastolicModel instance (model.version = registry version)
+    """
+    return get_model_registry().get("knn_diastolic")
+
+
+def _split_rows(result: Dict[str, list]) -> list:
+    """Columnar predict_batch output (dict of lists) -> one dict per row"""
+    keys = list(result)
+    return [dict(zip(keys, values)) for values in zip(*result.values())]
+
+
+# Batch predict functions of the micro-batchers. Module-level (not lambdas)
+# so that the process-pool executor can pickle them by reference.
+
+def predict_random_forest_rows(rows: list, is_raw: List[bool]) -> list:
+    """(prediction_class, probability, model_version) cho mỗi dòng"""
+    model = get_random_forest_model()
+    predictions, probabilities = model.predict_batch(rows, is_raw=is_raw)
+    return [(prediction, probability, model.version) for prediction, probability in zip(predictions, probabilities)]
+
+
+def _predict_knn_rows(model, rows: list, is_raw: List[bool]) -> list:
+    result = _split_rows(model.predict_batch(rows, is_raw=is_raw))
+    for row in result:
+        row["model_version"] = model.version
+    return result
+
+
+def predict_knn_systolic_rows(rows: list, is_raw: List[bool]) -> list:
+    """KNNSystolicModel.predict() dict (plus model_version) for each row"""
+    return _predict_knn_rows(get_knn_systolic_model(), rows, is_raw)
+
+
+def predict_knn_diastolic_rows(rows: list, is_raw: List[bool]) -> list:
+    """KNNDiastolicModel.predict() dict (plus model_version) for each row"""
+    return _predict_knn_rows(get_knn_diastolic_model(), rows, is_raw)
+
+
+@lru_cache()
+def get_inference_executor() -> InferenceExecutor:
+    """
+    Lấy singleton instance của InferenceExecutor
     
     Returns:
-        KNNDiastolicModel instance
+        InferenceExecutor (process workers load the models on start-up)
     """
-    global _knn_diastolic_model
-    if _knn_diastolic_model is None:
-        _knn_diastolic_model = KNNDiastolicModel(
-            model_path=Config.KNN_DIASTOLIC_MODEL_PATH,
-            scaler_path=Config.KNN_DIASTOLIC_SCALER_PATH
-        )
-    return _knn_diastolic_model
+    return InferenceExecutor(
+        warm_up=(get_random_forest_model, get_knn_systolic_model, get_knn_diastolic_model)
+    )
+
+
+@lru_cache()
+def get_random_forest_batcher() -> MicroBatcher:
+    """
+    Micro-batcher của Random Forest Model
+    
+    Returns:
+        MicroBatcher trả về (prediction_class, probability, model_version) cho mỗi dòng
+    """
+    return MicroBatcher("random_forest", predict_random_forest_rows, executor=get_inference_executor())
+
+
+@lru_cache()
+def get_knn_systolic_batcher() -> MicroBatcher:
+    """
+    Micro-batcher of the KNN Systolic BP Model
+    
+    Returns:
+        MicroBatcher returning one predict() dict per row
+    """
+    return MicroBatcher("knn_systolic", predict_knn_systolic_rows, executor=get_inference_executor())
+
+
+@lru_cache()
+def get_knn_diastolic_batcher() -> MicroBatcher:
+    """
+    Micro-batcher of the KNN Diastolic BP Model
+    
+    Returns:
+        MicroBatcher returning one predict() dict per row
+    """
+    return MicroBatcher("knn_diastolic", predict_knn_diastolic_rows, executor=get_inference_executor())
+
+
+@lru_cache()
+def get_warmup_manager() -> WarmupManager:
+    """
+    Lấy singleton instance của WarmupManager
+    
+    Returns:
+        WarmupManager of the three models (started by the app lifespan)
+    """
+    return WarmupManager(
+        default_models({
+            "random_forest": get_random_forest_model,
+            "knn_systolic": get_knn_systolic_model,
+            "knn_diastolic": get_knn_diastolic_model,
+        }),
+        executor=get_inference_executor(),
+        loaded=lambda name: get_model_registry().active_version(name) is not None
+    )
+
+
+def get_batching_stats() -> Dict[str, dict]:
+    """Stats of the micro-batchers created so far"""
+    getters = (get_random_forest_batcher, get_knn_systolic_batcher, get_knn_diastolic_batcher)
+    return {
+        batcher.name: batcher.stats()
+        for batcher in (getter() for getter in getters if getter.cache_info().currsize)
+    }
 
 
 def reload_models():
-    """Reload all models"""
-    global _random_forest_model, _knn_systolic_model, _knn_diastolic_model
-    _random_forest_model = None
-    _knn_systolic_model = None
-    _knn_diastolic_model = None
-    get_random_forest_model.cache_clear()
-    get_knn_systolic_model.cache_clear()
-    get_knn_diastolic_model.cache_clear()
+    """Reload the active version of every model from disk (swapped in when loaded)"""
+    registry = get_model_registry()
+    for name in registry.specs:
+        registry.reload(name)
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    X-Admin-Token phải khớp Config.ADMIN_TOKEN
+
+    Fails closed: without a configured ADMIN_TOKEN every /admin call gets 403.
+    """
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest((x_admin_token or "").encode(), Config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
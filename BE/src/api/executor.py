@@ -0,0 +1,210 @@
+"""
+Inference executor - chạy predict (CPU-bound) ngoài event loop, có giới hạn hàng đợi
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from config import Config
+from utils import profiling
+
+
+class InferenceOverloaded(HTTPException):
+    """503 + Retry-After khi hàng đợi inference đã đầy"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Inference queue is full, retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+def call_model(getter: Callable[[], Any], method: str, *args, **kwargs) -> Any:
+    """
+    Gọi một method của model singleton
+
+    The model is looked up through its getter inside the worker, so only
+    the getter reference and the arguments cross a process boundary.
+    """
+    return getattr(getter(), method)(*args, **kwargs)
+
+
+def call_versioned(getter: Callable[[], Any], method: str, *args, **kwargs) -> Tuple[Any, Optional[str]]:
+    """
+    call_model that also returns the version of the model that answered
+
+    The model is looked up once, so the result and the version always
+    belong together even if the registry swaps versions meanwhile.
+    """
+    model = getter()
+    return getattr(model, method)(*args, **kwargs), getattr(model, "version", None)
+
+
+def _warm_up_worker(getters) -> None:
+    """Process pool initializer: load models once per worker process"""
+    for getter in getters:
+        getter()
+
+
+class InferenceExecutor:
+    """
+    Bounded pool for model calls awaited by the async routes
+
+    At most `workers` calls run at once and at most `max_queue` more may
+    wait; beyond that `run` raises InferenceOverloaded (HTTP 503 with
+    Retry-After) right away instead of letting latency grow without bound.
+    The event loop itself never runs model code, so /health and other
+    connections stay responsive while a large batch is being scored.
+    """
+
+    KINDS = ("thread", "process")
+
+    def __init__(
+        self,
+        kind: Optional[str] = None,
+        workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        retry_after: Optional[int] = None,
+        warm_up=()
+    ):
+        """
+        Args:
+            kind: "thread" hoặc "process". Mặc định: Config.INFERENCE_EXECUTOR
+            workers: Số worker. Mặc định: Config.INFERENCE_WORKERS
+            max_queue: Số call được phép chờ thêm. Mặc định: Config.INFERENCE_MAX_QUEUE
+            retry_after: Giá trị header Retry-After (giây). Mặc định: Config.INFERENCE_RETRY_AFTER_S
+            warm_up: Model getters được load sẵn trong mỗi worker process
+        """
+        self.kind = kind or Config.INFERENCE_EXECUTOR
+        if self.kind not in self.KINDS:
+            raise ValueError(f"Unknown inference executor: {self.kind}")
+        self.workers = workers or Config.INFERENCE_WORKERS
+        self.max_queue = Config.INFERENCE_MAX_QUEUE if max_queue is None else max_queue
+        self.retry_after = retry_after or Config.INFERENCE_RETRY_AFTER_S
+        self._warm_up = tuple(warm_up)
+
+        self._pool: Optional[Executor] = None
+        self._pool_lock = threading.Lock()
+        self._in_flight = 0
+
+        # Stats
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def pool(self) -> Executor:
+        """Pool được tạo lần đầu khi cần (process pool khởi động khá chậm)"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    if self.kind == "process":
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            initializer=_warm_up_worker,
+                            initargs=(self._warm_up,)
+                        )
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return self._pool
+
+    def prestart(self) -> None:
+        """
+        Start every pool worker now instead of on the first calls
+
+        Executors only add a worker on submit while none is idle, so one
+        short sleep per worker is submitted at once and waited for.
+        """
+        pool = self.pool
+        for future in [pool.submit(time.sleep, 0.05) for _ in range(self.workers)]:
+            future.result()
+
+    @property
+    def capacity(self) -> int:
+        """Running + queued calls accepted before rejecting"""
+        return self.workers + self.max_queue
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls accepted but not started yet"""
+        return max(0, self._in_flight - self.workers)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) in the pool and await its result
+
+        With the process pool, fn and its arguments must be picklable
+        (use call_model with a model getter instead of a bound method).
+
+        Raises:
+            InferenceOverloaded: If `capacity` calls are already accepted
+        """
+        if self._in_flight >= self.capacity:
+            self.rejected += 1
+            raise InferenceOverloaded(self.retry_after)
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            call = partial(fn, *args, **kwargs)
+            if self.kind != "process":
+                # Thread workers see the request's context (request id of the log records)
+                session = profiling.current()
+                if session is not None:
+                    # Profiled request: the worker thread runs under its own profiler
+                    call = partial(session.run, call)
+                call = partial(contextvars.copy_context().run, call)
+            result = await loop.run_in_executor(self.pool, call)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+        self.completed += 1
+        return result
+
+    async def run_model(self, getter: Callable[[], Any], method: str, *args, **kwargs) -> Any:
+        """Shortcut for run(call_model, getter, method, ...)"""
+        return await self.run(call_model, getter, method, *args, **kwargs)
+
+    async def run_model_versioned(self, getter: Callable[[], Any], method: str, *args, **kwargs) -> Tuple[Any, Optional[str]]:
+        """Shortcut for run(call_versioned, getter, method, ...): (result, model version)"""
+        return await self.run(call_versioned, getter, method, *args, **kwargs)
+
+    def restart(self, warm_up=None) -> None:
+        """
+        Replace the pool (process workers then load the models again)
+
+        Args:
+            warm_up: New worker warm-up callables (mặc định: giữ nguyên)
+        """
+        if warm_up is not None:
+            self._warm_up = tuple(warm_up)
+        if self.kind == "process":
+            # Calls already running finish in the old pool
+            self.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Dừng pool (pool mới sẽ được tạo nếu còn call sau đó)"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Số call đang chạy / đang chờ và bộ đếm"""
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
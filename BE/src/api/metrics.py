@@ -0,0 +1,167 @@
+"""
+Request metrics - validation / handler / serialization time của mỗi route
+"""
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from config import Config
+from utils import profiling
+from utils.log import debug_sampled, get_logger
+from utils.metrics import STAGE_SECONDS, ERRORS, input_type
+
+
+logger = get_logger(__name__)
+
+
+# "model" label by path fragment (first match)
+ROUTE_MODELS = (
+    ("/assess", "assess"),
+    ("/systolic", "knn_systolic"),
+    ("/diastolic", "knn_diastolic"),
+    ("/joint", "knn_joint"),
+    ("/random-forest", "random_forest"),
+)
+
+
+class _RequestTimings:
+    __slots__ = ("start", "endpoint_start", "endpoint_end", "input_type")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.endpoint_start: Optional[float] = None
+        self.endpoint_end: Optional[float] = None
+        self.input_type = "unknown"
+
+
+_current: ContextVar[Optional[_RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def _request_input_type(kwargs: Dict[str, Any]) -> str:
+    """raw / normalized / mixed from the validated request body"""
+    for value in kwargs.values():
+        if not isinstance(value, BaseModel):
+            continue
+        if hasattr(value, "is_raw"):
+            return input_type(value.is_raw)
+        items = getattr(value, "items", None)
+        if isinstance(items, list):
+            return input_type([item.is_raw for item in items])
+    return "unknown"
+
+
+def _error_status(error: Exception) -> int:
+    if isinstance(error, HTTPException):
+        return error.status_code
+    if isinstance(error, RequestValidationError):
+        return 422
+    return 500
+
+
+def _log_request(request, model: str, status_code: int, timings: _RequestTimings, end: float) -> None:
+    """5xx and slow requests are always logged; the others are sampled DEBUG records"""
+    total_ms = (end - timings.start) * 1000
+    important = status_code >= 500 or total_ms >= Config.LOG_SLOW_REQUEST_MS
+    if not important and not logger.isEnabledFor(logging.DEBUG):
+        return
+
+    values = {
+        "path": request.scope["path"],
+        "status": status_code,
+        "model": model,
+        "input_type": timings.input_type,
+        "total_ms": round(total_ms, 3)
+    }
+    if timings.endpoint_end is not None:
+        values["validation_ms"] = round((timings.endpoint_start - timings.start) * 1000, 3)
+        values["handler_ms"] = round((timings.endpoint_end - timings.endpoint_start) * 1000, 3)
+        values["serialization_ms"] = round((end - timings.endpoint_end) * 1000, 3)
+
+    if status_code >= 500:
+        logger.warning("Request failed", extra={"fields": values})
+    elif important:
+        logger.info("Slow request", extra={"fields": values})
+    else:
+        debug_sampled(logger, "Request", **values)
+
+
+class MetricsRoute(APIRoute):
+    """
+    APIRoute recording three stages per request into bp_stage_duration_seconds
+
+    - validation: body read, JSON parsing and pydantic validation (until the endpoint starts)
+    - handler: the endpoint itself (micro-batch wait, executor queue and the model call)
+    - serialization: response_model validation and JSON encoding
+
+    Error responses are counted in bp_errors_total. The model stages
+    (vectorize, scale, predict_proba, kneighbors) are recorded by the models.
+    Failed and slow requests are logged with the three stage timings
+    (utils/log.py); other requests only as sampled DEBUG records.
+    Requests picked by utils/profiling.py run the whole handler under cProfile.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        self.model_label = next((model for fragment, model in ROUTE_MODELS if fragment in path), "other")
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = self._timed(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _timed(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        # functools.wraps keeps the signature, so FastAPI still sees the real parameters
+        @wraps(endpoint)
+        async def timed_endpoint(*args, **kwargs):
+            timings = _current.get()
+            if timings is not None:
+                timings.endpoint_start = time.perf_counter()
+                timings.input_type = _request_input_type(kwargs)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if timings is not None:
+                    timings.endpoint_end = time.perf_counter()
+        return timed_endpoint
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        model = self.model_label
+
+        async def timed_handler(request):
+            timings = _RequestTimings(time.perf_counter())
+            token = _current.set(timings)
+            session = profiling.start_request(request)
+            try:
+                if session is None:
+                    response = await handler(request)
+                else:
+                    with session:
+                        response = await handler(request)
+            except Exception as e:
+                status_code = _error_status(e)
+                ERRORS.inc(model, str(status_code))
+                _log_request(request, model, status_code, timings, time.perf_counter())
+                if session is not None:
+                    profiling.finish_request(session, status_code)
+                raise
+            finally:
+                _current.reset(token)
+            end = time.perf_counter()
+            if session is not None:
+                profiling.finish_request(session, response.status_code)
+
+            if timings.endpoint_end is not None:
+                STAGE_SECONDS.observe(timings.endpoint_start - timings.start, "validation", model, timings.input_type)
+                STAGE_SECONDS.observe(timings.endpoint_end - timings.endpoint_start, "handler", model, timings.input_type)
+                STAGE_SECONDS.observe(end - timings.endpoint_end, "serialization", model, timings.input_type)
+            if response.status_code >= 400:
+                ERRORS.inc(model, str(response.status_code))
+            _log_request(request, model, response.status_code, timings, end)
+            return response
+
+        return timed_handler
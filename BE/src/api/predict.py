@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
+from functools import lru_cache
 from pydantic import BaseModel
-import pandas as pd
 from src.models.model import load_model, make_prediction
 
 router = APIRouter()
@@ -23,12 +23,17 @@ class InputData(BaseModel):
     Cerebrovascular_disease: int
     Cerebrovascular_insuff: int
 
-model = load_model()
+@lru_cache()
+def get_model():
+    # Load lần đầu khi có request, không load lúc import
+    return load_model()
 
 @router.post("/predict")
 def predict(input_data: InputData):
+    import pandas as pd
+
     input_df = pd.DataFrame([input_data.dict()])
-    prediction, probability = make_prediction(model, input_df)
+    prediction, probability = make_prediction(get_model(), input_df)
     
     label_map = {
         0: "Bình thường (Normal)",
@@ -0,0 +1,100 @@
+"""
+Fast responses - pre-encoded JSON for the prediction endpoints (Config.FAST_RESPONSES)
+
+FastAPI validates a returned object against `response_model` and then
+encodes it with jsonable_encoder + json.dumps. The handlers already build
+plain dicts of ints / floats / strings in the schema's shape, so with
+FAST_RESPONSES they are encoded once (orjson when installed) and returned
+as a Response, which FastAPI passes through untouched. `response_model`
+stays on the route, so the OpenAPI schema is unchanged.
+"""
+import json
+from typing import Any, Dict, List, Optional, Type, Union
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from config import Config
+
+try:
+    import orjson
+except ImportError:  # optional dependency: fall back to the standard encoder
+    orjson = None
+
+
+# Fields of BPPredictionResponse filled from the KNN predict_batch(), in schema order
+BP_FIELDS = (
+    "predicted_normalized",
+    "prediction_std_normalized",
+    "predicted_value_mmHg",
+    "prediction_std_mmHg",
+    "confidence_interval_lower",
+    "confidence_interval_upper"
+)
+
+# Same output as Starlette's JSONResponse (compact separators, UTF-8, NaN rejected)
+_encode = json.JSONEncoder(ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode
+
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes of plain Python / NumPy content"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return _encode(content).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by dumps()"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def respond(content: Dict[str, Any], model: Type[BaseModel]) -> Union[BaseModel, FastJSONResponse]:
+    """
+    Response of a prediction endpoint
+
+    Args:
+        content: Response body as plain values, in the shape of `model`
+        model: Response schema of the route
+
+    Returns:
+        FastJSONResponse when Config.FAST_RESPONSES is on (no validation),
+        otherwise the validated `model` for FastAPI to serialize
+    """
+    if Config.FAST_RESPONSES:
+        return FastJSONResponse(content)
+    return model(**content)
+
+
+def bp_rows(
+    result: Dict[str, List[float]],
+    is_raw: List[bool],
+    model_type: str,
+    model_version: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Turn the columnar output of a KNN predict_batch into one BPPredictionResponse body per row"""
+    columns = [result[field] for field in BP_FIELDS]
+    return [
+        {
+            **dict(zip(BP_FIELDS, values)),
+            "input_type": "raw" if raw else "normalized",
+            "model_type": model_type,
+            "model_version": model_version
+        }
+        for raw, *values in zip(is_raw, *columns)
+    ]
+
+
+def bp_columns(
+    result: Dict[str, List[float]],
+    is_raw: List[bool],
+    model_type: str,
+    model_version: Optional[str] = None
+) -> Dict[str, Any]:
+    """ColumnarBPBatchPredictionResponse body of a KNN predict_batch output"""
+    return {
+        **{field: result[field] for field in BP_FIELDS},
+        "input_type": ["raw" if raw else "normalized" for raw in is_raw],
+        "model_type": model_type,
+        "model_version": model_version,
+        "count": len(is_raw)
+    }
@@ -1,7 +1,25 @@
 """
 API Routes initialization
+
+Routers are imported on first access, so importing one router module
+does not pull in the others.
 """
-from .random_forest import router as random_forest_router
-from .knn import router as knn_router
+from importlib import import_module
+
+_ROUTERS = {
+    'random_forest_router': '.random_forest',
+    'knn_router': '.knn',
+    'bulk_router': '.bulk',
+    'binary_router': '.binary',
+    'assess_router': '.assess',
+    'profiling_router': '.profiling',
+    'admin_router': '.admin',
+}
+
+__all__ = list(_ROUTERS)
+
 
-__all__ = ['random_forest_router', 'knn_router']
+def __getattr__(name):
+    if name in _ROUTERS:
+        return import_module(_ROUTERS[name], __name__).router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,76 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, status
+from api.dependencies import get_model_registry, require_admin_token
+
+
+router = APIRouter(
+    prefix="/admin/models",
+    tags=["Model Registry"],
+    dependencies=[Depends(require_admin_token)]
+)
+
+
+async def _run_blocking(fn, *args):
+    """Load / warm-up chạy ngoài event loop; các request khác vẫn được phục vụ bởi version cũ"""
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+def _check_model(registry, name: str) -> None:
+    if name not in registry.specs:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown model: {name}")
+
+
+@router.get("")
+async def model_status(registry = Depends(get_model_registry)):
+    """
+    Active version, rollback candidates and per-version load metrics of every model
+
+    Returns:
+        {model: {active_version, rollback_versions, available_versions, versions: {version: metrics}}}
+    """
+    return registry.status()
+
+
+@router.post("/{name}/activate/{version}")
+async def activate_version(name: str, version: str, registry = Depends(get_model_registry)):
+    """
+    Load + warm up a version in the background and swap it in
+
+    In-flight requests finish on the previous version, which stays loaded for rollback.
+    """
+    _check_model(registry, name)
+    if version not in registry.specs[name].discover():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown version of {name}: {version}")
+    try:
+        record = await _run_blocking(registry.activate, name, version)
+        return record.status()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to activate {name} {version}: {str(e)}"
+        )
+
+
+@router.post("/{name}/rollback")
+async def rollback_version(name: str, registry = Depends(get_model_registry)):
+    """Switch back to the previously active version"""
+    _check_model(registry, name)
+    try:
+        record = await _run_blocking(registry.rollback, name)
+        return record.status()
+    except ValueError as ve:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(ve)
+        )
+
+
+@router.post("/poll")
+async def poll_versions(registry = Depends(get_model_registry)):
+    """
+    Look for new versions on disk now instead of waiting for the watcher
+
+    Returns:
+        {model: version} of the versions that were activated
+    """
+    return {"activated": await _run_blocking(registry.poll)}
@@ -0,0 +1,191 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, status
+from utils.features import FeatureLayout
+from utils.schemas import (
+    AssessmentRequest,
+    AssessmentBatchRequest,
+    AssessmentResponse,
+    AssessmentBatchResponse,
+    ColumnarAssessmentBatchResponse
+)
+from config import Config
+from api.dependencies import (
+    get_random_forest_model,
+    get_knn_systolic_model,
+    get_knn_diastolic_model,
+    get_inference_executor
+)
+from api.metrics import MetricsRoute
+from api.responses import bp_columns, bp_rows, respond
+
+
+router = APIRouter(
+    prefix="/assess",
+    tags=["Assessment"],
+    route_class=MetricsRoute
+)
+
+
+# Layout của AssessmentRequest: request được vectorize một lần, mỗi model lấy các cột của nó
+ASSESS_LAYOUT = FeatureLayout([field for field in AssessmentRequest.model_fields if field != "is_raw"], [])
+
+# Models evaluated by /assess, in response order
+ASSESS_MODELS: Tuple[Callable, ...] = (get_random_forest_model, get_knn_systolic_model, get_knn_diastolic_model)
+
+
+def _predict_columns(getter: Callable, matrix: np.ndarray, is_raw: np.ndarray) -> Tuple[Any, Optional[str]]:
+    """
+    predict_batch của một model trên các cột của nó trong ma trận chung
+
+    Module-level (picklable) so it can run in a process executor too.
+
+    Returns:
+        (predict_batch result, model version)
+    """
+    model = getter()
+    columns = [ASSESS_LAYOUT.index[field] for field in model.layout.fields]
+    if columns != list(range(ASSESS_LAYOUT.n_features)):
+        matrix = matrix[:, columns]
+    return model.predict_batch(matrix, is_raw=is_raw), getattr(model, "version", None)
+
+
+def _vectorize(items: Sequence[AssessmentRequest]) -> np.ndarray:
+    """Shared (n_rows, n_features) matrix of the request rows, in AssessmentRequest order"""
+    return ASSESS_LAYOUT.vectorize(items)
+
+
+def _predict_all(items: Sequence[AssessmentRequest], is_raw: np.ndarray) -> List[Tuple[Any, Optional[str]]]:
+    """Vectorize, then the three models one after another, in a single worker call"""
+    matrix = _vectorize(items)
+    return [_predict_columns(getter, matrix, is_raw) for getter in ASSESS_MODELS]
+
+
+async def _run_assessment(items: Sequence[AssessmentRequest]) -> Dict[str, Any]:
+    """
+    Vectorize the rows once and evaluate the three models on the shared matrix
+
+    Returns:
+        Dict: hypertension (ColumnarBatchPredictionResponse body without count),
+        systolic / diastolic (KNN predict_batch outputs), versions, is_raw
+    """
+    is_raw = np.fromiter((item.is_raw for item in items), dtype=bool, count=len(items))
+
+    executor = get_inference_executor()
+    if Config.ASSESS_CONCURRENT:
+        matrix = await executor.run(_vectorize, items)
+        outputs = await asyncio.gather(*(
+            executor.run(_predict_columns, getter, matrix, is_raw) for getter in ASSESS_MODELS
+        ))
+    else:
+        outputs = await executor.run(_predict_all, items, is_raw)
+
+    (predictions, probabilities), rf_version = outputs[0]
+    model = get_random_forest_model()
+    return {
+        "hypertension": {
+            "prediction": predictions,
+            "label": [model.get_prediction_label(prediction) for prediction in predictions],
+            "probability": probabilities,
+            "model_type": "Random Forest",
+            "model_version": rf_version
+        },
+        "systolic": outputs[1][0],
+        "diastolic": outputs[2][0],
+        "versions": {"systolic": outputs[1][1], "diastolic": outputs[2][1]},
+        "is_raw": is_raw.tolist()
+    }
+
+
+def _assessment_rows(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One AssessmentResponse body per row"""
+    hypertension, is_raw, versions = result["hypertension"], result["is_raw"], result["versions"]
+    systolic = bp_rows(result["systolic"], is_raw, "knn_systolic", versions["systolic"])
+    diastolic = bp_rows(result["diastolic"], is_raw, "knn_diastolic", versions["diastolic"])
+    return [
+        {
+            "hypertension": {
+                "prediction": prediction,
+                "label": label,
+                "probability": probability,
+                "model_type": hypertension["model_type"],
+                "model_version": hypertension["model_version"]
+            },
+            "systolic": systolic_row,
+            "diastolic": diastolic_row
+        }
+        for prediction, label, probability, systolic_row, diastolic_row in zip(
+            hypertension["prediction"], hypertension["label"], hypertension["probability"], systolic, diastolic
+        )
+    ]
+
+
+@router.post("", response_model=AssessmentResponse)
+async def assess_patient(request: AssessmentRequest):
+    """
+    Hypertension class, Systolic BP and Diastolic BP for one patient in one call.
+
+    Request được vectorize một lần; Random Forest, KNN Systolic (từ Diastolic_BP) và
+    KNN Diastolic (từ Systolic_BP) dùng chung ma trận đó, mỗi model chỉ chạy scaler của nó.
+    Với Config.ASSESS_CONCURRENT ba model chạy song song trong inference executor.
+    """
+    try:
+        result = await _run_assessment([request])
+        return respond(_assessment_rows(result)[0], AssessmentResponse)
+
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(ve)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Assessment error: {str(e)}"
+        )
+
+
+@router.post("/batch", response_model=Union[AssessmentBatchResponse, ColumnarAssessmentBatchResponse])
+async def assess_patients_batch(
+    request: AssessmentBatchRequest,
+    columnar: bool = Query(False, description="Một mảng cho mỗi field thay vì một object cho mỗi dòng")
+):
+    """
+    Hypertension class, Systolic BP and Diastolic BP for many patients.
+
+    Một ma trận chung cho cả batch, mỗi model một lần predict_batch; kết quả theo thứ tự
+    của `items`. Với columnar=true: ColumnarAssessmentBatchResponse.
+    """
+    try:
+        result = await _run_assessment(request.items)
+
+        if columnar:
+            is_raw, versions = result["is_raw"], result["versions"]
+            return respond(
+                {
+                    "hypertension": {**result["hypertension"], "count": len(is_raw)},
+                    "systolic": bp_columns(result["systolic"], is_raw, "knn_systolic", versions["systolic"]),
+                    "diastolic": bp_columns(result["diastolic"], is_raw, "knn_diastolic", versions["diastolic"]),
+                    "count": len(is_raw)
+                },
+                ColumnarAssessmentBatchResponse
+            )
+
+        predictions = _assessment_rows(result)
+        return respond({"predictions": predictions, "count": len(predictions)}, AssessmentBatchResponse)
+
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(ve)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Assessment error: {str(e)}"
+        )
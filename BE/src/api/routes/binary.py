@@ -0,0 +1,113 @@
+from typing import Callable, Dict, Tuple, Type
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from pydantic import BaseModel
+from config import Config
+from utils.schemas import (
+    RandomForestPredictionRequest,
+    KNNSystolicPredictionRequest,
+    KNNDiastolicPredictionRequest
+)
+from utils.wire import MEDIA_TYPE, WireValueError, decode_request, encode_response
+from api.dependencies import (
+    get_random_forest_model,
+    get_knn_systolic_model,
+    get_knn_diastolic_model,
+    get_inference_executor
+)
+from api.metrics import MetricsRoute
+from models.knn_model import KNNBloodPressureModel
+
+
+router = APIRouter(
+    prefix="/binary",
+    tags=["Binary"],
+    route_class=MetricsRoute
+)
+
+
+def _random_forest_outputs(result) -> np.ndarray:
+    predictions, probabilities = result
+    return np.column_stack([predictions, probabilities])
+
+
+def _knn_outputs(result) -> np.ndarray:
+    return np.column_stack([result[key] for key in KNNBloodPressureModel.OUTPUT_KEYS])
+
+
+# name -> (path, model getter, output columns, predict_batch result -> matrix, JSON schema of one row)
+BINARY_MODELS: Dict[str, Tuple[str, Callable, Tuple[str, ...], Callable, Type[BaseModel]]] = {
+    "random_forest": (
+        "/random-forest/predict", get_random_forest_model, ("prediction", "probability"), _random_forest_outputs,
+        RandomForestPredictionRequest
+    ),
+    "knn_systolic": (
+        "/knn/predict/systolic", get_knn_systolic_model, KNNBloodPressureModel.OUTPUT_KEYS, _knn_outputs,
+        KNNSystolicPredictionRequest
+    ),
+    "knn_diastolic": (
+        "/knn/predict/diastolic", get_knn_diastolic_model, KNNBloodPressureModel.OUTPUT_KEYS, _knn_outputs,
+        KNNDiastolicPredictionRequest
+    ),
+}
+
+
+def _binary_endpoint(getter: Callable, columns: Tuple[str, ...], to_matrix: Callable, row_schema: Type[BaseModel]):
+    async def predict(request: Request) -> Response:
+        try:
+            model = getter()
+            matrix, is_raw = decode_request(await request.body(), model.layout, Config.MAX_BATCH_SIZE, row_schema)
+
+            # Ma trận đi thẳng vào predict_batch (ndarray theo thứ tự layout, không tạo object từng dòng)
+            result, version = await get_inference_executor().run_model_versioned(
+                getter, "predict_batch", matrix, is_raw=is_raw
+            )
+
+            headers = {"X-Columns": ",".join(columns)}
+            if version is not None:
+                headers["X-Model-Version"] = str(version)
+            return Response(encode_response(to_matrix(result)), media_type=MEDIA_TYPE, headers=headers)
+
+        except HTTPException:
+            raise
+        except WireValueError as we:
+            # Same status as the JSON endpoints' validation errors
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=str(we)
+            )
+        except ValueError as ve:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(ve)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Prediction error: {str(e)}"
+            )
+
+    return predict
+
+
+for _name, (_path, _getter, _columns, _to_matrix, _schema) in BINARY_MODELS.items():
+    router.add_api_route(
+        _path,
+        _binary_endpoint(_getter, _columns, _to_matrix, _schema),
+        methods=["POST"],
+        name=f"binary_predict_{_name}",
+        summary=f"Batch {_name} prediction, binary float32 matrix in and out",
+        description=f"""
+    Body: header `<4sIHBB` (b"BPM1", n_rows, n_cols, flags, 0) rồi ma trận float32 little-endian
+    theo thứ tự field của schema JSON (xem utils/wire.py; flags: 1=RAW, 2=is_raw từng dòng, 4=one-hot gửi dạng mã).
+    Response: header b"BPR1" và ma trận float32 với các cột: {", ".join(_columns)} (cũng có trong X-Columns).
+    """,
+        response_class=Response,
+        responses={200: {"content": {MEDIA_TYPE: {}}}},
+        openapi_extra={
+            "requestBody": {
+                "required": True,
+                "content": {MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}},
+            }
+        }
+    )
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.requests import ClientDisconnect
+from utils.schemas import (
+    RandomForestPredictionRequest,
+    KNNSystolicPredictionRequest,
+    KNNDiastolicPredictionRequest
+)
+from utils.log import get_logger
+from utils.streaming import Decoder, LineSplitter, NDJSONRows, CSVRows, LineTooLong, InflatedTooLarge, iter_rows
+from config import Config
+from api.dependencies import (
+    get_random_forest_model,
+    get_knn_systolic_model,
+    get_knn_diastolic_model,
+    get_inference_executor
+)
+from api.executor import InferenceOverloaded
+
+
+logger = get_logger(__name__)
+
+router = APIRouter(prefix="/bulk", tags=["Bulk Scoring"])
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves `receive` to the body generator
+
+    Starlette's StreamingResponse reads `receive` while streaming to notice
+    a disconnect, which would swallow the upload the generator is still
+    reading. Here the generator reads the request itself (request.stream()
+    raises ClientDisconnect when the client goes away).
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _format_random_forest(model, output) -> List[Dict[str, Any]]:
+    predictions, probabilities = output
+    return [
+        {"prediction": prediction, "label": model.get_prediction_label(prediction), "probability": probability}
+        for prediction, probability in zip(predictions, probabilities)
+    ]
+
+
+def _format_knn(model, output) -> List[Dict[str, Any]]:
+    keys = list(output)
+    return [dict(zip(keys, values)) for values in zip(*output.values())]
+
+
+# name -> (request schema, model getter, output formatter)
+BULK_MODELS: Dict[str, Tuple[Any, Callable, Callable]] = {
+    "random_forest": (RandomForestPredictionRequest, get_random_forest_model, _format_random_forest),
+    "knn_systolic": (KNNSystolicPredictionRequest, get_knn_systolic_model, _format_knn),
+    "knn_diastolic": (KNNDiastolicPredictionRequest, get_knn_diastolic_model, _format_knn),
+}
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+def score_model_rows(name: str, rows: List[Optional[Dict[str, Any]]]) -> Tuple[List[Optional[Dict[str, Any]]], Optional[str]]:
+    """
+    Validate and score one chunk with one model (runs in the inference executor)
+
+    Args:
+        name: Key of BULK_MODELS
+        rows: Parsed rows (None for rows that failed parsing)
+
+    Returns:
+        (per-row result or {"error": ...} or None for unparsed rows, model version)
+    """
+    schema, getter, formatter = BULK_MODELS[name]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    items, positions = [], []
+    for position, row in enumerate(rows):
+        if row is None:
+            continue
+        try:
+            items.append(schema.model_validate(row))
+            positions.append(position)
+        except ValidationError as e:
+            results[position] = {"error": _validation_message(e)}
+
+    model = getter()
+    if items:
+        output = model.predict_batch(items, is_raw=[item.is_raw for item in items])
+        for position, value in zip(positions, formatter(model, output)):
+            results[position] = value
+    return results, getattr(model, "version", None)
+
+
+async def _run_with_retry(executor, fn, *args):
+    # Bulk scoring is throughput work: wait for room in the executor instead of failing the stream
+    while True:
+        try:
+            return await executor.run(fn, *args)
+        except InferenceOverloaded:
+            await asyncio.sleep(executor.retry_after)
+
+
+async def score_stream(
+    chunks: AsyncIterator[bytes],
+    models: List[str],
+    csv_input: bool = False,
+    gzip: Optional[bool] = None,
+    default_raw: bool = False,
+    chunk_size: Optional[int] = None,
+    executor=None
+) -> AsyncIterator[bytes]:
+    """
+    Score an upload chunk by chunk and yield NDJSON result lines
+
+    At most `chunk_size` rows (plus one unfinished line) are held at a time:
+    each full chunk is scored (the models concurrently, in the inference
+    executor) and its results are yielded before more of the upload is
+    read, so memory stays flat however large the upload is.
+
+    Yields:
+        One line per input row, {"row": i, "<model>": {...} | {"error": ...}}
+        or {"row": i, "error": ...} for unparsable rows, then one
+        {"summary": {...}} line ("aborted" set when the stream stopped early)
+    """
+    chunk_size = chunk_size or Config.BULK_CHUNK_SIZE
+    executor = executor or get_inference_executor()
+    decoder = Decoder(gzip, max_size=Config.BULK_MAX_INFLATED_BYTES)
+    splitter = LineSplitter(Config.BULK_MAX_LINE_CHARS)
+    parser = CSVRows() if csv_input else NDJSONRows()
+    start = time.perf_counter()
+    summary = {"rows": 0, "invalid_rows": 0, "model_errors": {name: 0 for name in models}, "model_versions": {}}
+    pending: List[Tuple[Optional[Dict[str, Any]], Optional[str]]] = []
+
+    async def flush() -> bytes:
+        rows = [row for row, _ in pending]
+        for row, _ in pending:
+            if row is not None:
+                row.setdefault("is_raw", default_raw)
+        scored = await asyncio.gather(*(_run_with_retry(executor, score_model_rows, name, rows) for name in models))
+
+        lines = []
+        first = summary["rows"]
+        for i, (row, error) in enumerate(pending):
+            line: Dict[str, Any] = {"row": first + i}
+            if error is not None:
+                line["error"] = error
+                summary["invalid_rows"] += 1
+            else:
+                for name, (results, _) in zip(models, scored):
+                    line[name] = results[i]
+                    if "error" in results[i]:
+                        summary["model_errors"][name] += 1
+            lines.append(json.dumps(line))
+        for name, (_, version) in zip(models, scored):
+            summary["model_versions"][name] = version
+        summary["rows"] += len(pending)
+        pending.clear()
+        return ("\n".join(lines) + "\n").encode()
+
+    def scoring_failed(error: Exception) -> None:
+        # Rows of the failed chunk get no result lines; the summary says how many
+        logger.exception("Bulk scoring failed", extra={"fields": {"models": models, "rows": len(pending)}})
+        reason = f"Scoring failed: {type(error).__name__}: {error}"
+        summary["aborted"] = f"{summary['aborted']}; {reason}" if "aborted" in summary else reason
+        summary["unscored_rows"] = len(pending)
+        pending.clear()
+
+    try:
+        async for data in chunks:
+            for text in decoder.decode(data):
+                for parsed in iter_rows(splitter.feed(text), parser):
+                    pending.append(parsed)
+                    if len(pending) >= chunk_size:
+                        yield await flush()
+        for parsed in iter_rows(splitter.feed(decoder.flush(), final=True), parser):
+            pending.append(parsed)
+            if len(pending) >= chunk_size:
+                yield await flush()
+        if pending:
+            yield await flush()
+    except ClientDisconnect:
+        return
+    except (LineTooLong, InflatedTooLarge, UnicodeDecodeError, zlib.error) as e:
+        # The 200 status is already sent: report the problem in-band and stop
+        summary["aborted"] = f"{type(e).__name__}: {e}"
+        if pending:
+            try:
+                yield await flush()
+            except Exception as scoring_error:
+                scoring_failed(scoring_error)
+    except Exception as e:
+        # Model / executor failure: same in-band report instead of a truncated stream
+        scoring_failed(e)
+
+    summary["elapsed_s"] = time.perf_counter() - start
+    yield (json.dumps({"summary": summary}) + "\n").encode()
+
+
+@router.post(
+    "/score",
+    summary="Stream-score an NDJSON or CSV upload",
+    description="""
+    Chấm điểm file NDJSON / CSV lớn (có thể gzip) theo từng chunk, kết quả NDJSON trả về ngay khi từng chunk xong.
+    """,
+    response_class=DuplexStreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string", "format": "binary"}},
+                "text/csv": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    }
+)
+async def bulk_score(
+    request: Request,
+    models: str = Query("random_forest,knn_systolic,knn_diastolic", description="Comma-separated models"),
+    is_raw: bool = Query(False, description="is_raw of rows that do not set it"),
+    chunk_size: int = Query(None, ge=1, le=Config.BULK_MAX_CHUNK_SIZE, description="Rows scored per chunk")
+):
+    """
+    Score a streamed upload of patient rows
+
+    Args:
+        request: Body = NDJSON (one request object per line) or CSV with a header
+            row of field names (Content-Type: text/csv); Content-Encoding: gzip or
+            gzip magic bytes are decompressed on the fly
+        models: Models to run on every row
+        is_raw: Default is_raw of the rows
+        chunk_size: Rows per scoring chunk. Mặc định: Config.BULK_CHUNK_SIZE
+
+    Returns:
+        Chunked NDJSON, one line per row in input order, then a summary line
+    """
+    names = [name.strip() for name in models.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BULK_MODELS]
+    if not names or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown models: {', '.join(unknown) or '(none)'}; available: {', '.join(BULK_MODELS)}"
+        )
+
+    encoding = request.headers.get("content-encoding", "").lower()
+    return DuplexStreamingResponse(
+        score_stream(
+            request.stream(),
+            names,
+            csv_input="csv" in request.headers.get("content-type", ""),
+            gzip=True if "gzip" in encoding else None,
+            default_raw=is_raw,
+            chunk_size=chunk_size
+        ),
+        media_type="application/x-ndjson"
+    )
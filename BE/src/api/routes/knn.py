@@ -1,13 +1,48 @@
-from fastapi import APIRouter, HTTPException, Depends
-from src.utils.schemas import (
+from typing import Any, Dict, List, Union
+from fastapi import APIRouter, HTTPException, Depends, Query
+from utils.schemas import (
     KNNSystolicPredictionRequest,
     KNNDiastolicPredictionRequest,
+    KNNSystolicBatchPredictionRequest,
+    KNNDiastolicBatchPredictionRequest,
+    ColumnarKNNSystolicBatchRequest,
+    ColumnarKNNDiastolicBatchRequest,
+    KNNJointPredictionRequest,
+    KNNJointBatchPredictionRequest,
     BPPredictionResponse,
+    BPBatchPredictionResponse,
+    ColumnarBPBatchPredictionResponse,
+    JointBPPredictionResponse,
+    JointBPBatchPredictionResponse,
+    ColumnarJointBPBatchPredictionResponse,
     ErrorResponse
 )
-from src.api.dependencies import get_knn_systolic_model, get_knn_diastolic_model
+from config import Config
+from api.dependencies import (
+    get_knn_systolic_model,
+    get_knn_diastolic_model,
+    get_knn_systolic_batcher,
+    get_knn_diastolic_batcher,
+    get_inference_executor
+)
+from api.metrics import MetricsRoute
+from api.responses import BP_FIELDS, bp_columns, bp_rows, respond
+from models.knn_model import estimate_joint_bp
+
+router = APIRouter(prefix="/knn", tags=["KNN Blood Pressure Prediction"], route_class=MetricsRoute)
+
+
+COLUMNAR_QUERY = Query(False, description="One array per field instead of one object per row")
+
 
-router = APIRouter(prefix="/knn", tags=["KNN Blood Pressure Prediction"])
+def _single_content(result: Dict[str, Any], is_raw: bool, model_type: str) -> Dict[str, Any]:
+    """BPPredictionResponse body of a predict() dict (model_version included)"""
+    return {
+        **{field: result[field] for field in BP_FIELDS},
+        "input_type": "raw" if is_raw else "normalized",
+        "model_type": model_type,
+        "model_version": result.get("model_version")
+    }
 
 
 @router.post(
@@ -20,49 +55,80 @@ router = APIRouter(prefix="/knn", tags=["KNN Blood Pressure Prediction"])
 )
 async def predict_systolic_bp(
     request: KNNSystolicPredictionRequest,
-    model = Depends(get_knn_systolic_model)
+    batcher = Depends(get_knn_systolic_batcher),
+    executor = Depends(get_inference_executor)
 ):
     """
     Predict Systolic Blood Pressure using KNN regression
-    
+
     Args:
         request: Input features including Diastolic_BP
-        model: KNN Systolic model instance
-        
+        batcher: Micro-batcher of the KNN Systolic model
+        executor: Inference executor (used when micro-batching is disabled)
+
     Returns:
         BPPredictionResponse with predicted Systolic BP value
     """
     try:
-        # Convert request to dict
-        input_data = request.model_dump()
-        is_raw = input_data.pop('is_raw', False)
-        
-        # Map field names to match model expectations
-        if 'Diabetes_Type2' in input_data:
-            input_data['Diabetes_Type 2 Diabetes'] = input_data.pop('Diabetes_Type2')
-        if 'Cerebral_infarction_infarction' in input_data:
-            input_data['Cerebral_infarction_cerebral infarction'] = input_data.pop('Cerebral_infarction_infarction')
-        if 'Cerebrovascular_disease' in input_data:
-            input_data['Cerebrovascular_disease_cerebrovascular disease'] = input_data.pop('Cerebrovascular_disease')
-        if 'Cerebrovascular_insuff' in input_data:
-            input_data['Cerebrovascular_disease_insufficiency of cerebral blood supply'] = input_data.pop('Cerebrovascular_insuff')
-        if 'Cerebrovascular_None' in input_data:
-            input_data['Cerebrovascular_disease_None'] = input_data.pop('Cerebrovascular_None')
-        
-        # Make prediction
-        result = model.predict(input_data, is_raw=is_raw)
-        
-        return BPPredictionResponse(
-            predicted_normalized=result["predicted_normalized"],
-            prediction_std_normalized=result["prediction_std_normalized"],
-            predicted_value_mmHg=result["predicted_value_mmHg"],
-            prediction_std_mmHg=result["prediction_std_mmHg"],
-            confidence_interval_lower=result["confidence_interval_lower"],
-            confidence_interval_upper=result["confidence_interval_upper"],
-            input_type="raw" if is_raw else "normalized",
-            model_type="knn_systolic"
+        is_raw = request.is_raw
+
+        # Make prediction (concurrent single-row requests are coalesced into one batch)
+        if Config.MICRO_BATCH_ENABLED:
+            result = await batcher.submit(request, is_raw)
+        else:
+            result, version = await executor.run_model_versioned(
+                get_knn_systolic_model, "predict", request, is_raw=is_raw
+            )
+            result["model_version"] = version
+
+        return respond(_single_content(result, is_raw, "knn_systolic"), BPPredictionResponse)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}"
         )
-        
+
+
+@router.post(
+    "/predict/systolic/batch",
+    response_model=Union[BPBatchPredictionResponse, ColumnarBPBatchPredictionResponse],
+    summary="Predict Systolic Blood Pressure (batch)",
+    description="""
+    Dự đoán Systolic BP cho nhiều dòng với một lần tìm kiếm láng giềng.
+    """
+)
+async def predict_systolic_bp_batch(
+    request: KNNSystolicBatchPredictionRequest,
+    columnar: bool = COLUMNAR_QUERY,
+    executor = Depends(get_inference_executor)
+):
+    """
+    Predict Systolic Blood Pressure for many rows using KNN regression
+
+    Args:
+        request: List of rows, each including Diastolic_BP
+        columnar: Return ColumnarBPBatchPredictionResponse (one array per field)
+        executor: Inference executor running the KNN Systolic model
+
+    Returns:
+        BPBatchPredictionResponse with one prediction per row, in input order
+    """
+    try:
+        is_raw = [item.is_raw for item in request.items]
+        result, version = await executor.run_model_versioned(
+            get_knn_systolic_model, "predict_batch", request.items, is_raw=is_raw
+        )
+
+        if columnar:
+            return respond(bp_columns(result, is_raw, "knn_systolic", version), ColumnarBPBatchPredictionResponse)
+        predictions = bp_rows(result, is_raw, "knn_systolic", version)
+        return respond({"predictions": predictions, "count": len(predictions)}, BPBatchPredictionResponse)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -80,49 +146,286 @@ async def predict_systolic_bp(
 )
 async def predict_diastolic_bp(
     request: KNNDiastolicPredictionRequest,
-    model = Depends(get_knn_diastolic_model)
+    batcher = Depends(get_knn_diastolic_batcher),
+    executor = Depends(get_inference_executor)
 ):
     """
     Predict Diastolic Blood Pressure using KNN regression
-    
+
     Args:
         request: Input features including Systolic_BP
-        model: KNN Diastolic model instance
-        
+        batcher: Micro-batcher of the KNN Diastolic model
+        executor: Inference executor (used when micro-batching is disabled)
+
     Returns:
         BPPredictionResponse with predicted Diastolic BP value
     """
     try:
-        # Convert request to dict
-        input_data = request.model_dump()
-        is_raw = input_data.pop('is_raw', False)
-        
-        # Map field names to match model expectations
-        if 'Diabetes_Type2' in input_data:
-            input_data['Diabetes_Type 2 Diabetes'] = input_data.pop('Diabetes_Type2')
-        if 'Cerebral_infarction_infarction' in input_data:
-            input_data['Cerebral_infarction_cerebral infarction'] = input_data.pop('Cerebral_infarction_infarction')
-        if 'Cerebrovascular_disease' in input_data:
-            input_data['Cerebrovascular_disease_cerebrovascular disease'] = input_data.pop('Cerebrovascular_disease')
-        if 'Cerebrovascular_insuff' in input_data:
-            input_data['Cerebrovascular_disease_insufficiency of cerebral blood supply'] = input_data.pop('Cerebrovascular_insuff')
-        if 'Cerebrovascular_None' in input_data:
-            input_data['Cerebrovascular_disease_None'] = input_data.pop('Cerebrovascular_None')
-        
-        # Make prediction
-        result = model.predict(input_data, is_raw=is_raw)
-        
-        return BPPredictionResponse(
-            predicted_normalized=result["predicted_normalized"],
-            prediction_std_normalized=result["prediction_std_normalized"],
-            predicted_value_mmHg=result["predicted_value_mmHg"],
-            prediction_std_mmHg=result["prediction_std_mmHg"],
-            confidence_interval_lower=result["confidence_interval_lower"],
-            confidence_interval_upper=result["confidence_interval_upper"],
-            input_type="raw" if is_raw else "normalized",
-            model_type="knn_diastolic"
+        is_raw = request.is_raw
+
+        # Make prediction (concurrent single-row requests are coalesced into one batch)
+        if Config.MICRO_BATCH_ENABLED:
+            result = await batcher.submit(request, is_raw)
+        else:
+            result, version = await executor.run_model_versioned(
+                get_knn_diastolic_model, "predict", request, is_raw=is_raw
+            )
+            result["model_version"] = version
+
+        return respond(_single_content(result, is_raw, "knn_diastolic"), BPPredictionResponse)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}"
+        )
+
+
+@router.post(
+    "/predict/diastolic/batch",
+    response_model=Union[BPBatchPredictionResponse, ColumnarBPBatchPredictionResponse],
+    summary="Predict Diastolic Blood Pressure (batch)",
+    description="""
+    Dự đoán Diastolic BP cho nhiều dòng với một lần tìm kiếm láng giềng.
+    """
+)
+async def predict_diastolic_bp_batch(
+    request: KNNDiastolicBatchPredictionRequest,
+    columnar: bool = COLUMNAR_QUERY,
+    executor = Depends(get_inference_executor)
+):
+    """
+    Predict Diastolic Blood Pressure for many rows using KNN regression
+
+    Args:
+        request: List of rows, each including Systolic_BP
+        columnar: Return ColumnarBPBatchPredictionResponse (one array per field)
+        executor: Inference executor running the KNN Diastolic model
+
+    Returns:
+        BPBatchPredictionResponse with one prediction per row, in input order
+    """
+    try:
+        is_raw = [item.is_raw for item in request.items]
+        result, version = await executor.run_model_versioned(
+            get_knn_diastolic_model, "predict_batch", request.items, is_raw=is_raw
         )
-        
+
+        if columnar:
+            return respond(bp_columns(result, is_raw, "knn_diastolic", version), ColumnarBPBatchPredictionResponse)
+        predictions = bp_rows(result, is_raw, "knn_diastolic", version)
+        return respond({"predictions": predictions, "count": len(predictions)}, BPBatchPredictionResponse)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}"
+        )
+
+
+async def _predict_columnar(request, getter, model_type: str, executor) -> Dict[str, Any]:
+    """ColumnarBPBatchPredictionResponse body of a columnar batch request (validated matrix -> predict_batch)"""
+    matrix = request.to_matrix(getter().layout.fields)
+    result, version = await executor.run_model_versioned(
+        getter, "predict_batch", matrix, is_raw=request.raw_mask
+    )
+    return bp_columns(result, request.raw_mask.tolist(), model_type, version)
+
+
+@router.post(
+    "/predict/systolic/columnar",
+    response_model=ColumnarBPBatchPredictionResponse,
+    summary="Predict Systolic Blood Pressure (columnar batch)",
+    description="""
+    Dự đoán Systolic BP cho một batch dạng cột (một mảng cho mỗi feature), kiểm tra bằng NumPy.
+    """
+)
+async def predict_systolic_bp_columnar(
+    request: ColumnarKNNSystolicBatchRequest,
+    executor = Depends(get_inference_executor)
+):
+    """
+    Predict Systolic Blood Pressure for a columnar batch
+
+    Args:
+        request: One array per feature (including Diastolic_BP) and is_raw for all or each row;
+            ranges and one-hot groups are checked per column (422 lists the offending rows)
+        executor: Inference executor running the KNN Systolic model
+
+    Returns:
+        ColumnarBPBatchPredictionResponse, one array per field in input order
+    """
+    try:
+        content = await _predict_columnar(request, get_knn_systolic_model, "knn_systolic", executor)
+        return respond(content, ColumnarBPBatchPredictionResponse)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}"
+        )
+
+
+@router.post(
+    "/predict/diastolic/columnar",
+    response_model=ColumnarBPBatchPredictionResponse,
+    summary="Predict Diastolic Blood Pressure (columnar batch)",
+    description="""
+    Dự đoán Diastolic BP cho một batch dạng cột (một mảng cho mỗi feature), kiểm tra bằng NumPy.
+    """
+)
+async def predict_diastolic_bp_columnar(
+    request: ColumnarKNNDiastolicBatchRequest,
+    executor = Depends(get_inference_executor)
+):
+    """
+    Predict Diastolic Blood Pressure for a columnar batch
+
+    Args:
+        request: One array per feature (including Systolic_BP) and is_raw for all or each row;
+            ranges and one-hot groups are checked per column (422 lists the offending rows)
+        executor: Inference executor running the KNN Diastolic model
+
+    Returns:
+        ColumnarBPBatchPredictionResponse, one array per field in input order
+    """
+    try:
+        content = await _predict_columnar(request, get_knn_diastolic_model, "knn_diastolic", executor)
+        return respond(content, ColumnarBPBatchPredictionResponse)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}"
+        )
+
+
+def _estimate_joint(items, **kwargs) -> Dict:
+    """estimate_joint_bp on the active models (module-level so a process pool can pickle it)"""
+    systolic_model, diastolic_model = get_knn_systolic_model(), get_knn_diastolic_model()
+    result = estimate_joint_bp(systolic_model, diastolic_model, items, **kwargs)
+    result["versions"] = {"systolic": systolic_model.version, "diastolic": diastolic_model.version}
+    return result
+
+
+async def _run_joint_estimation(items, executor) -> Dict[str, Any]:
+    """Run the SBP/DBP fixed-point iteration for all rows at once"""
+    is_raw = [item.is_raw for item in items]
+    result = await executor.run(
+        _estimate_joint,
+        items,
+        is_raw=is_raw,
+        initial_systolic=[item.initial_systolic_mmHg for item in items],
+        initial_diastolic=[item.initial_diastolic_mmHg for item in items],
+        max_iterations=[item.max_iterations for item in items],
+        tolerance=[item.tolerance_mmHg for item in items]
+    )
+    result["is_raw"] = is_raw
+    return result
+
+
+def _joint_rows(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One JointBPPredictionResponse body per row"""
+    is_raw, versions = result["is_raw"], result["versions"]
+    systolic = bp_rows(result["systolic"], is_raw, "knn_systolic", versions["systolic"])
+    diastolic = bp_rows(result["diastolic"], is_raw, "knn_diastolic", versions["diastolic"])
+    return [
+        {
+            "systolic": systolic[i],
+            "diastolic": diastolic[i],
+            "iterations": result["iterations"][i],
+            "converged": result["converged"][i]
+        }
+        for i in range(len(is_raw))
+    ]
+
+
+@router.post(
+    "/predict/joint",
+    response_model=JointBPPredictionResponse,
+    summary="Estimate Systolic and Diastolic Blood Pressure together",
+    description="""
+    Ước lượng đồng thời Systolic và Diastolic BP khi không có số đo huyết áp.
+    """
+)
+async def predict_joint_bp(
+    request: KNNJointPredictionRequest,
+    executor = Depends(get_inference_executor)
+):
+    """
+    Estimate both BP values by alternating the KNN Systolic and Diastolic models
+
+    Args:
+        request: Input features without Systolic_BP / Diastolic_BP, plus iteration settings
+        executor: Inference executor running both KNN models
+
+    Returns:
+        JointBPPredictionResponse with the final estimates and the iteration count
+    """
+    try:
+        result = await _run_joint_estimation([request], executor)
+        return respond(_joint_rows(result)[0], JointBPPredictionResponse)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}"
+        )
+
+
+@router.post(
+    "/predict/joint/batch",
+    response_model=Union[JointBPBatchPredictionResponse, ColumnarJointBPBatchPredictionResponse],
+    summary="Estimate Systolic and Diastolic Blood Pressure together (batch)",
+    description="""
+    Ước lượng đồng thời Systolic và Diastolic BP cho nhiều dòng.
+    """
+)
+async def predict_joint_bp_batch(
+    request: KNNJointBatchPredictionRequest,
+    columnar: bool = COLUMNAR_QUERY,
+    executor = Depends(get_inference_executor)
+):
+    """
+    Estimate both BP values for many rows, iterating all rows together
+
+    Args:
+        request: List of rows without Systolic_BP / Diastolic_BP
+        columnar: Return ColumnarJointBPBatchPredictionResponse (one array per field)
+        executor: Inference executor running both KNN models
+
+    Returns:
+        JointBPBatchPredictionResponse with one result per row, in input order
+    """
+    try:
+        result = await _run_joint_estimation(request.items, executor)
+        if columnar:
+            is_raw, versions = result["is_raw"], result["versions"]
+            return respond(
+                {
+                    "systolic": bp_columns(result["systolic"], is_raw, "knn_systolic", versions["systolic"]),
+                    "diastolic": bp_columns(result["diastolic"], is_raw, "knn_diastolic", versions["diastolic"]),
+                    "iterations": result["iterations"],
+                    "converged": result["converged"],
+                    "count": len(is_raw)
+                },
+                ColumnarJointBPBatchPredictionResponse
+            )
+        predictions = _joint_rows(result)
+        return respond({"predictions": predictions, "count": len(predictions)}, JointBPBatchPredictionResponse)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
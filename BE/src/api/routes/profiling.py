@@ -0,0 +1,67 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from config import Config
+from api.dependencies import require_admin_token
+from utils import profiling
+
+
+router = APIRouter(
+    prefix="/admin/profiling",
+    tags=["Profiling"],
+    dependencies=[Depends(require_admin_token)]
+)
+
+
+@router.get("")
+async def profiling_status():
+    """
+    Profiling settings, pending request profiles and counters
+
+    Returns:
+        {dir, sample_rate, header_enabled, requested, requested_path_prefix, busy, profiled, skipped_busy, window_running}
+    """
+    return profiling.status()
+
+
+@router.post("/requests")
+async def profile_requests(
+    count: int = Query(1, ge=0, le=1000, description="Số request tiếp theo được profile (0 = hủy)"),
+    path_prefix: Optional[str] = Query(None, description="Chỉ profile các path bắt đầu bằng prefix này, vd. /api/v1/knn")
+):
+    """
+    Profile the next `count` prediction requests with cProfile
+
+    Each profile is written to Config.PROFILE_DIR as <timestamp>-<request id>-<path>.prof
+    (pstats) with a .json of the request metadata and the top functions.
+    """
+    profiling.request_profiles(count, path_prefix)
+    return profiling.status()
+
+
+@router.post("/sample")
+async def sample_stacks(seconds: float = Query(10.0, gt=0, description="Độ dài cửa sổ lấy mẫu (giây)")):
+    """
+    Sample the stacks of every thread for `seconds` and write a collapsed-stack file
+
+    The file (<timestamp>-window-<seconds>s.collapsed) is the input of flamegraph.pl
+    or speedscope. Traffic keeps being served during the window.
+
+    Returns:
+        {path, samples, stacks, seconds}
+    """
+    try:
+        if seconds > Config.PROFILE_MAX_WINDOW_S:
+            raise ValueError(f"seconds must be <= {Config.PROFILE_MAX_WINDOW_S:g}")
+        sampler = profiling.start_window()
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    except RuntimeError as re:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(re))
+
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        # Stop + write outside the event loop (joins the sampler thread, file I/O)
+        result = await asyncio.get_running_loop().run_in_executor(None, profiling.finish_window, sampler, seconds)
+    return result
@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, status
-from utils.schemas import RandomForestPredictionRequest, PredictionResponse
-from api.dependencies import get_random_forest_model
-import pandas as pd
+from typing import Union
+from fastapi import APIRouter, HTTPException, Query, status
+from utils.schemas import (
+    RandomForestPredictionRequest,
+    PredictionResponse,
+    RandomForestBatchPredictionRequest,
+    BatchPredictionResponse,
+    ColumnarBatchPredictionResponse,
+    ColumnarRandomForestBatchRequest
+)
+from config import Config
+from api.dependencies import get_random_forest_model, get_random_forest_batcher, get_inference_executor
+from api.metrics import MetricsRoute
+from api.responses import respond
 
 
 router = APIRouter(
     prefix="/random-forest",
-    tags=["Random Forest"]
+    tags=["Random Forest"],
+    route_class=MetricsRoute
 )
 
 
@@ -23,21 +34,29 @@ async def predict_hypertension(request: RandomForestPredictionRequest):
         # Lấy model instance
         model = get_random_forest_model()
         
-        # Chuyển đổi request thành DataFrame
-        input_dict = request.dict(exclude={'is_raw'})  # Exclude is_raw từ data
-        input_df = pd.DataFrame([input_dict])
-        
-        # Dự đoán với flag is_raw
-        prediction, probability = model.predict(input_df, is_raw=request.is_raw)
+        # Dự đoán với flag is_raw (request được vectorize trực tiếp theo layout của model);
+        # các request đồng thời được gom thành một batch
+        if Config.MICRO_BATCH_ENABLED:
+            prediction, probability, version = await get_random_forest_batcher().submit(request, request.is_raw)
+        else:
+            (prediction, probability), version = await get_inference_executor().run_model_versioned(
+                get_random_forest_model, "predict", request, is_raw=request.is_raw
+            )
         label = model.get_prediction_label(prediction)
         
-        return PredictionResponse(
-            prediction=prediction,
-            label=label,
-            probability=probability,
-            model_type="Random Forest"
+        return respond(
+            {
+                "prediction": prediction,
+                "label": label,
+                "probability": probability,
+                "model_type": "Random Forest",
+                "model_version": version
+            },
+            PredictionResponse
         )
         
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -49,3 +68,113 @@ async def predict_hypertension(request: RandomForestPredictionRequest):
             detail=f"Prediction error: {str(e)}"
         )
 
+
+@router.post("/predict/batch", response_model=Union[BatchPredictionResponse, ColumnarBatchPredictionResponse])
+async def predict_hypertension_batch(
+    request: RandomForestBatchPredictionRequest,
+    columnar: bool = Query(False, description="Một mảng cho mỗi field thay vì một object cho mỗi dòng")
+):
+    """
+    Predict hypertension for many rows in one pass.
+    
+    Scaler và predict_proba chạy một lần cho cả batch; kết quả trả về
+    theo đúng thứ tự của `items`. Mỗi dòng có thể có cờ is_raw riêng.
+    Với columnar=true: ColumnarBatchPredictionResponse (gọn hơn, encode nhanh hơn cho batch lớn).
+    """
+    try:
+        model = get_random_forest_model()
+        
+        is_raw = [item.is_raw for item in request.items]
+        
+        (predictions, probabilities), version = await get_inference_executor().run_model_versioned(
+            get_random_forest_model, "predict_batch", request.items, is_raw=is_raw
+        )
+        
+        labels = [model.get_prediction_label(prediction) for prediction in predictions]
+        
+        if columnar:
+            return respond(
+                {
+                    "prediction": predictions,
+                    "label": labels,
+                    "probability": probabilities,
+                    "model_type": "Random Forest",
+                    "model_version": version,
+                    "count": len(predictions)
+                },
+                ColumnarBatchPredictionResponse
+            )
+        
+        return respond(
+            {
+                "predictions": [
+                    {
+                        "prediction": prediction,
+                        "label": label,
+                        "probability": probability,
+                        "model_type": "Random Forest",
+                        "model_version": version
+                    }
+                    for prediction, label, probability in zip(predictions, labels, probabilities)
+                ],
+                "count": len(predictions)
+            },
+            BatchPredictionResponse
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(ve)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Prediction error: {str(e)}"
+        )
+
+
+@router.post("/predict/columnar", response_model=ColumnarBatchPredictionResponse)
+async def predict_hypertension_columnar(request: ColumnarRandomForestBatchRequest):
+    """
+    Predict hypertension for a columnar batch (one array per feature).
+    
+    Không tạo object cho từng dòng: các mảng được kiểm tra bằng NumPy (khoảng giá trị,
+    đúng một field = 1 trong mỗi nhóm one-hot; lỗi 422 kèm chỉ số dòng) rồi đi thẳng
+    vào predict_batch dưới dạng ma trận. is_raw: một cờ chung hoặc một cờ cho mỗi dòng.
+    """
+    try:
+        model = get_random_forest_model()
+        
+        matrix = request.to_matrix(model.layout.fields)
+        
+        (predictions, probabilities), version = await get_inference_executor().run_model_versioned(
+            get_random_forest_model, "predict_batch", matrix, is_raw=request.raw_mask
+        )
+        
+        return respond(
+            {
+                "prediction": predictions,
+                "label": [model.get_prediction_label(prediction) for prediction in predictions],
+                "probability": probabilities,
+                "model_type": "Random Forest",
+                "model_version": version,
+                "count": len(predictions)
+            },
+            ColumnarBatchPredictionResponse
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(ve)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Prediction error: {str(e)}"
+        )
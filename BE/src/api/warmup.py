@@ -0,0 +1,222 @@
+"""
+Warm-up - load models at startup, exercise every prediction path, report readiness
+"""
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+from utils.schemas import (
+    RandomForestPredictionRequest,
+    KNNSystolicPredictionRequest,
+    KNNDiastolicPredictionRequest,
+    KNNJointPredictionRequest
+)
+
+
+# Model states, in order
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+def _examples(schema) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Raw and normalized example rows of a request schema"""
+    examples = schema.model_config["json_schema_extra"]
+    return examples["example_raw"], examples.get("example_normalized", examples["example_raw"])
+
+
+def _request_rows(schema, n: int = 8) -> List[Any]:
+    """n request objects alternating the raw and normalized examples"""
+    raw, normalized = _examples(schema)
+    return [schema(**(raw if i % 2 == 0 else normalized)) for i in range(n)]
+
+
+# Warm-up and self-test bypass the prediction cache (use_cache=False): with the cache
+# the repeated example rows would be hits, leaving the real paths cold and the
+# self-test timing a cache lookup
+
+
+def warm_random_forest(model) -> Callable[[], Any]:
+    """
+    Chạy qua mọi nhánh predict của Random Forest
+
+    Returns:
+        Self-test call (one single-row raw prediction)
+    """
+    rows = _request_rows(RandomForestPredictionRequest)
+    is_raw = [row.is_raw for row in rows]
+    model.predict(rows[0], is_raw=True, use_cache=False)
+    model.predict(rows[1], is_raw=False, use_cache=False)
+    model.predict_batch(rows, is_raw=is_raw, use_cache=False)
+    # Large-batch path of the "auto" backend (sklearn predict_proba)
+    model.model.predict_proba(model.preprocess(rows, is_raw=is_raw))
+    return lambda: model.predict(rows[0], is_raw=True, use_cache=False)
+
+
+def warm_knn(schema) -> Callable[[Any], Callable[[], Any]]:
+    """Warm-up function of a KNN model with the given request schema"""
+    def warm(model) -> Callable[[], Any]:
+        rows = _request_rows(schema)
+        is_raw = [row.is_raw for row in rows]
+        model.predict(rows[0], is_raw=True, use_cache=False)
+        model.predict(rows[1], is_raw=False, use_cache=False)
+        model.predict_batch(rows, is_raw=is_raw, use_cache=False)
+        return lambda: model.predict(rows[0], is_raw=True, use_cache=False)
+    return warm
+
+
+def warm_joint(systolic_model, diastolic_model) -> None:
+    """Joint SBP/DBP estimation path (needs both KNN models)"""
+    from models.knn_model import estimate_joint_bp
+
+    raw, _ = _examples(KNNJointPredictionRequest)
+    estimate_joint_bp(systolic_model, diastolic_model, [KNNJointPredictionRequest(**raw)], is_raw=True, use_cache=False)
+
+
+class ModelWarmup:
+    """Load / warm-up state and timings of one model"""
+
+    def __init__(self, name: str, getter: Callable[[], Any], warm: Callable[[Any], Callable[[], Any]]):
+        self.name = name
+        self.getter = getter
+        self.warm = warm
+        self.state = PENDING
+        self.load_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self.self_test_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.model = None
+
+    def run(self, self_test_runs: int) -> None:
+        try:
+            self.state = LOADING
+            start = time.perf_counter()
+            self.model = self.getter()
+            self.load_ms = (time.perf_counter() - start) * 1000.0
+
+            self.state = WARMING
+            start = time.perf_counter()
+            self_test = self.warm(self.model)
+            self.warmup_ms = (time.perf_counter() - start) * 1000.0
+
+            # Latency of a warm single-row prediction (median)
+            timings = []
+            for _ in range(max(1, self_test_runs)):
+                start = time.perf_counter()
+                self_test()
+                timings.append((time.perf_counter() - start) * 1000.0)
+            self.self_test_ms = statistics.median(timings)
+            self.state = READY
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = FAILED
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "self_test_ms": self.self_test_ms,
+            "error": self.error,
+        }
+
+
+class WarmupManager:
+    """
+    Startup phase: load every model in a background thread and warm it up
+
+    Each model is loaded through its dependency getter (so requests reuse
+    the same instance), pushed through every prediction path once (single
+    raw / normalized, mixed batch, sklearn large-batch path, joint
+    estimation) and then timed on a few single-row predictions. `ready`
+    only turns True when every model reached READY, which is what /ready
+    reports to the orchestrator.
+
+    When warm-up is never started (Config.WARMUP_ON_STARTUP = False), a
+    model counts as READY once it is loaded (`loaded(name)`, e.g. by the
+    first request), without warm-up timings.
+    """
+
+    def __init__(
+        self,
+        models: List[ModelWarmup],
+        executor=None,
+        self_test_runs: Optional[int] = None,
+        loaded: Optional[Callable[[str], bool]] = None
+    ):
+        """
+        Args:
+            models: Models to warm up, in order
+            executor: InferenceExecutor whose pool workers are started during warm-up
+            self_test_runs: Single-row predictions timed per model. Mặc định: Config.WARMUP_SELF_TEST_RUNS
+            loaded: Whether a model is loaded, by name (used while warm-up is not started)
+        """
+        self.models = models
+        self.executor = executor
+        self.loaded = loaded
+        self.self_test_runs = self_test_runs or Config.WARMUP_SELF_TEST_RUNS
+        self.total_ms: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    def state(self, model: ModelWarmup) -> str:
+        """State of one model; READY for a loaded model if warm-up was not started"""
+        if model.state == PENDING and self._thread is None and self.loaded is not None and self.loaded(model.name):
+            return READY
+        return model.state
+
+    @property
+    def ready(self) -> bool:
+        return all(self.state(model) == READY for model in self.models)
+
+    def start(self) -> None:
+        """Chạy warm-up trong background thread (chỉ lần đầu)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until warm-up finished; returns `ready`"""
+        self._done.wait(timeout)
+        return self.ready
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        try:
+            for model in self.models:
+                model.run(self.self_test_runs)
+
+            loaded = {model.name: model for model in self.models if model.state == READY}
+            if "knn_systolic" in loaded and "knn_diastolic" in loaded:
+                try:
+                    warm_joint(loaded["knn_systolic"].model, loaded["knn_diastolic"].model)
+                except Exception as e:
+                    loaded["knn_diastolic"].error = f"joint estimation: {type(e).__name__}: {e}"
+                    loaded["knn_diastolic"].state = FAILED
+
+            if self.executor is not None:
+                # Start the pool threads / processes before the first request
+                self.executor.prestart()
+            self.total_ms = (time.perf_counter() - start) * 1000.0
+        finally:
+            self._done.set()
+
+    def status(self) -> Dict[str, Any]:
+        """Trạng thái từng model cho /ready và /health"""
+        return {
+            "ready": self.ready,
+            "warmup_total_ms": self.total_ms,
+            "models": {model.name: dict(model.status(), state=self.state(model)) for model in self.models},
+        }
+
+
+def default_models(getters: Dict[str, Callable[[], Any]]) -> List[ModelWarmup]:
+    """Warm-up entries of the three served models"""
+    return [
+        ModelWarmup("random_forest", getters["random_forest"], warm_random_forest),
+        ModelWarmup("knn_systolic", getters["knn_systolic"], warm_knn(KNNSystolicPredictionRequest)),
+        ModelWarmup("knn_diastolic", getters["knn_diastolic"], warm_knn(KNNDiastolicPredictionRequest)),
+    ]
@@ -12,10 +12,36 @@ class Config:
     VERSION = "2.0.0"
     DESCRIPTION = ""
     
+    # Routers ("module:attribute"), imported at startup only when listed here
+    ROUTERS = [
+        "api.routes.random_forest:router",
+        "api.routes.knn:router",
+        "api.routes.bulk:router",
+        "api.routes.binary:router",
+        "api.routes.assess:router",
+        "api.routes.profiling:router",
+        "api.routes.admin:router",
+    ]
+    
     # Random Forest Model Paths
     RANDOM_FOREST_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'random_forest', 'random_forest.joblib')
     RANDOM_FOREST_SCALER_PATH = os.path.join(BASE_DIR, 'models', 'random_forest', 'scaler.pkl')
     
+    # Random Forest inference backend: "sklearn", "compiled" or "auto"
+    # ("auto" = CompiledForest up to COMPILED_FOREST_MAX_ROWS rows, sklearn above)
+    RANDOM_FOREST_BACKEND = "auto"
+    COMPILED_FOREST_MAX_ROWS = 2048
+    
+    # Compiled forest bundles written by export_compiled_models.py, loaded when they match the model
+    # ("normalized" = z-score thresholds, "raw" = scaler folded into the thresholds, skips fold_scaler at load)
+    COMPILED_FOREST_DIR = os.path.join(BASE_DIR, 'models', 'random_forest', 'compiled')
+    # np.load mmap_mode of the bundle ("r" = read-only pages shared by all workers, None = don't use the bundle)
+    COMPILED_FOREST_MMAP_MODE = "r"
+    
+    # joblib mmap_mode for the KNN models: training matrix mapped read-only from the
+    # (uncompressed) .joblib file, shared by all worker processes
+    KNN_MMAP_MODE = "r"
+    
     # KNN Systolic BP Model Paths
     KNN_SYSTOLIC_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'knn', 'knn_systolic_bp.joblib')
     KNN_SYSTOLIC_SCALER_PATH = os.path.join(BASE_DIR, 'models', 'knn', 'scaler_systolic_bp.pkl')
@@ -24,16 +50,88 @@ class Config:
     KNN_DIASTOLIC_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'knn', 'knn_diastolic_bp.joblib')
     KNN_DIASTOLIC_SCALER_PATH = os.path.join(BASE_DIR, 'models', 'knn', 'scaler_diastolic_bp.pkl')
     
+    # Model registry: versioned artifacts in <model dir>/versions/<version>/ (same file names);
+    # the files directly in the model dir are version BASE_MODEL_VERSION
+    BASE_MODEL_VERSION = "base"
+    MODEL_VERSIONS = {}             # pinned version per model name, e.g. {"random_forest": "v2"}; default newest
+    MODEL_KEEP_VERSIONS = 2         # loaded versions per model (active + rollback)
+    MODEL_WATCH_ENABLED = True      # poll the model dirs and hot-swap newer versions
+    MODEL_WATCH_INTERVAL_S = 10.0
+    MODEL_WATCH_SETTLE_S = 2.0      # ignore artifacts modified more recently (still being copied)
+    ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")  # X-Admin-Token of /admin endpoints (None = /admin disabled, 403)
+    
     # Blood Pressure Denormalization Constants (from raw dataset statistics)
     SYSTOLIC_BP_MEAN = 127.945205  # mmHg
     SYSTOLIC_BP_STD = 20.377779    # mmHg
     DIASTOLIC_BP_MEAN = 71.849315  # mmHg
     DIASTOLIC_BP_STD = 11.111203   # mmHg
     
+    # Joint SBP/DBP Estimation Settings (fixed-point alternation between KNN models)
+    JOINT_BP_INITIAL_SYSTOLIC = 120.0  # mmHg
+    JOINT_BP_INITIAL_DIASTOLIC = 80.0  # mmHg
+    JOINT_BP_MAX_ITERATIONS = 10
+    JOINT_BP_TOLERANCE_MMHG = 0.1
+    
+    # Batch Prediction Settings
+    MAX_BATCH_SIZE = 100_000  # rows per batch request
+    
+    # Prediction responses: True = the handler's dict is encoded directly (orjson if installed),
+    # skipping response_model validation and jsonable_encoder (same JSON values, same OpenAPI)
+    FAST_RESPONSES = False
+    
+    # Streaming bulk scoring (/bulk/score): rows scored per chunk, longest accepted line
+    BULK_CHUNK_SIZE = 1000
+    BULK_MAX_CHUNK_SIZE = 10_000
+    BULK_MAX_LINE_CHARS = 64 * 1024
+    BULK_MAX_INFLATED_BYTES = 2 * 1024 ** 3   # gzip uploads: decompressed size at which the stream is aborted
+    
+    # /assess: True = three model calls run concurrently in the inference executor,
+    # False = one executor call runs the three models one after another
+    ASSESS_CONCURRENT = True
+    
+    # Micro-batching: gom các request một dòng đồng thời thành một batch
+    MICRO_BATCH_ENABLED = True
+    MICRO_BATCH_MAX_SIZE = 64      # rows per flushed batch
+    MICRO_BATCH_MAX_WAIT_MS = 2.0  # max wait of the oldest queued row
+    
+    # Prediction cache: exact outputs per (model version, vectorized row, is_raw), LRU + TTL,
+    # cleared when a model version is swapped
+    PREDICTION_CACHE_ENABLED = True
+    PREDICTION_CACHE_MAX_BYTES = 32 * 1024 * 1024  # per model
+    PREDICTION_CACHE_TTL_S = 3600.0                # 0 = no expiry (LRU eviction / swap only)
+    PREDICTION_CACHE_MAX_ROWS = 1024               # larger batches skip the cache (identical rows still computed once)
+    
+    # Inference executor: predict chạy ngoài event loop ("thread" hoặc "process")
+    INFERENCE_EXECUTOR = "thread"
+    INFERENCE_WORKERS = 4
+    INFERENCE_MAX_QUEUE = 64       # calls waiting for a worker before answering 503
+    INFERENCE_RETRY_AFTER_S = 1    # Retry-After header of the 503
+    
+    # Logging (utils/log.py): records are queued and written by a background thread
+    LOG_LEVEL = "INFO"
+    LOG_FORMAT = "json"             # "json" (one object per line) or "text"
+    LOG_QUEUE_SIZE = 10_000         # records waiting for the writer; more are dropped, never blocking
+    LOG_DEBUG_SAMPLE_RATE = 0.01    # fraction of hot-path DEBUG events kept (per-request timings, scaling)
+    LOG_SLOW_REQUEST_MS = 1000.0    # requests slower than this are always logged (INFO)
+    
+    # Profiling (utils/profiling.py): cProfile per request, stack sampler for time windows
+    PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+    PROFILE_SAMPLE_RATE = 0.0           # fraction of prediction requests profiled without being asked
+    PROFILE_HEADER_ENABLED = True       # X-Profile: 1 + X-Admin-Token (ignored while ADMIN_TOKEN is not set)
+    PROFILE_SAMPLER_INTERVAL_MS = 5.0   # stack sampling interval of /admin/profiling/sample
+    PROFILE_MAX_WINDOW_S = 120.0        # longest sampling window
+    PROFILE_KEEP_FILES = 200            # older files in PROFILE_DIR are deleted
+    
+    # Startup warm-up: load every model in the background and run self-test predictions
+    WARMUP_ON_STARTUP = True
+    WARMUP_SELF_TEST_RUNS = 5
+    
     # Server Settings
     HOST = "0.0.0.0"
     PORT = 8000
     RELOAD = True  
+    WORKERS = 1  # >1: models are loaded once, then the workers are forked and share them
+    WORKER_MEMORY_REPORT_S = 60  # interval of the per-worker RSS report (0 = only at start-up)
     
     # CORS Settings
     ALLOWED_ORIGINS = [
@@ -41,6 +139,3 @@ class Config:
         "http://localhost:3000",
         "http://localhost:8000",
     ]
-    
-    # Logging
-    LOG_LEVEL = "INFO"
\ No newline at end of file
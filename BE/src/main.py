@@ -1,8 +1,31 @@
+from contextlib import asynccontextmanager
+from importlib import import_module
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from config import Config
-from api.routes import random_forest_router, knn_router
-from utils.schemas import HealthCheckResponse
+from utils.schemas import HealthCheckResponse, ReadinessResponse
+from api.dependencies import get_batching_stats, get_inference_executor, get_model_registry, get_warmup_manager
+from utils import log, metrics
+from utils.cache import prediction_cache_stats
+
+
+# Log records are written by a background thread (JSON lines on stderr)
+log.configure()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load + warm up every model in the background; /ready reports when done
+    if Config.WARMUP_ON_STARTUP:
+        get_warmup_manager().start()
+    # Hot-swap: version mới trong thư mục model được load + warm-up rồi thay thế nguyên tử
+    if Config.MODEL_WATCH_ENABLED:
+        get_model_registry().start_watching()
+    yield
+    # Dừng watcher và inference pool khi tắt server
+    get_model_registry().stop_watching()
+    get_inference_executor().shutdown(wait=False)
 
 
 # Khởi tạo FastAPI app
@@ -11,7 +34,8 @@ app = FastAPI(
     description=Config.DESCRIPTION,
     version=Config.VERSION,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -26,17 +50,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# X-Request-ID: mọi log record của request mang cùng id
+app.add_middleware(log.RequestIdMiddleware)
+
 
 # Health check endpoint
+MODEL_DESCRIPTIONS = {
+    "random_forest": "Hypertension Classification",
+    "knn_systolic": "Systolic BP Prediction (R²≈0.42)",
+    "knn_diastolic": "Diastolic BP Prediction (R²≈0.38)"
+}
+
+
 @app.get("/", response_model=HealthCheckResponse, tags=["Health Check"])
 async def health_check():
+    # Liveness: process đang chạy; trạng thái model lấy từ warm-up (không hard-code)
+    models = get_warmup_manager().status()["models"]
     return {
         "status": "healthy",
         "message": f"{Config.PROJECT_NAME} v{Config.VERSION} đang hoạt động",
         "models": {
-            "random_forest": "available - Hypertension Classification",
-            "knn_systolic": "available - Systolic BP Prediction (R²≈0.42)",
-            "knn_diastolic": "available - Diastolic BP Prediction (R²≈0.38)"
+            name: f"{models[name]['state']} - {description}"
+            for name, description in MODEL_DESCRIPTIONS.items()
         }
     }
 
@@ -46,9 +81,41 @@ async def health():
     return await health_check()
 
 
-# Include routers
-app.include_router(random_forest_router, prefix=Config.API_V1_STR)
-app.include_router(knn_router, prefix=Config.API_V1_STR)
+@app.get(
+    "/ready",
+    response_model=ReadinessResponse,
+    responses={503: {"model": ReadinessResponse}},
+    tags=["Health Check"]
+)
+async def ready():
+    """Readiness probe: 200 khi mọi model đã load và warm-up xong, 503 nếu chưa"""
+    status = get_warmup_manager().status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/batching/stats", tags=["Monitoring"])
+async def batching_stats():
+    """Queue depth và thống kê kích thước batch của micro-batcher mỗi model, trạng thái inference executor và prediction cache"""
+    return {
+        "enabled": Config.MICRO_BATCH_ENABLED,
+        "models": get_batching_stats(),
+        "executor": get_inference_executor().stats(),
+        "cache": prediction_cache_stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Monitoring"])
+async def prometheus_metrics():
+    """Histograms theo từng stage (model, input type), batch size, lỗi và cache ở Prometheus text format"""
+    executor = get_inference_executor()
+    metrics.INFERENCE_QUEUE.set_function(lambda: {(): executor.queue_depth})
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Include routers (chỉ các router có trong Config.ROUTERS mới được import)
+for router_path in Config.ROUTERS:
+    module_name, _, attribute = router_path.partition(":")
+    app.include_router(getattr(import_module(module_name), attribute), prefix=Config.API_V1_STR)
 
 if __name__ == "__main__":
     import uvicorn
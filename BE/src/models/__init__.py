@@ -4,5 +4,10 @@ Models package - Chứa tất cả các ML models
 from .base_model import BaseModel
 from .random_forest_model import RandomForestModel
 from .knn_model import KNNSystolicModel, KNNDiastolicModel
+from .compiled_forest import CompiledForest
+from .knn_engine import BruteForceKNN
 
-__all__ = ['BaseModel', 'RandomForestModel', 'KNNSystolicModel', 'KNNDiastolicModel']
\ No newline at end of file
+__all__ = [
+    'BaseModel', 'RandomForestModel', 'KNNSystolicModel', 'KNNDiastolicModel',
+    'CompiledForest', 'BruteForceKNN'
+]
\ No newline at end of file
@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Tuple
-import pandas as pd
+from typing import TYPE_CHECKING, Any, Dict, Tuple
+
+if TYPE_CHECKING:
+    # Chỉ dùng cho type hints: pandas không được import khi khởi động
+    import pandas as pd
 
 
 class BaseModel(ABC):
@@ -23,7 +26,7 @@ class BaseModel(ABC):
         pass
     
     @abstractmethod
-    def predict(self, input_data: pd.DataFrame) -> Tuple[Any, float]:
+    def predict(self, input_data: "pd.DataFrame") -> Tuple[Any, float]:
         """
         Thực hiện prediction
         
@@ -36,7 +39,7 @@ class BaseModel(ABC):
         pass
     
     @abstractmethod
-    def preprocess(self, input_data: pd.DataFrame) -> pd.DataFrame:
+    def preprocess(self, input_data: "pd.DataFrame") -> "pd.DataFrame":
         """
         Tiền xử lý dữ liệu trước khi predict
         
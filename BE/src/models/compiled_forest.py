@@ -0,0 +1,368 @@
+"""
+Compiled Forest - Random Forest flattened into contiguous NumPy arrays
+"""
+import hashlib
+import json
+import os
+from typing import Optional, Sequence
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Array-based inference engine for a fitted RandomForestClassifier
+
+    All trees are flattened into one set of node arrays (feature, threshold,
+    left, right, leaf value). Leaves point to themselves, so every tree of a
+    whole batch can be advanced one level per step with a handful of
+    vectorized gathers instead of sklearn's per-estimator Python loop.
+    predict_proba reproduces RandomForestClassifier.predict_proba: inputs are
+    compared in float32 like sklearn trees, leaf class counts are normalized
+    per tree and averaged over the trees.
+
+    sklearn compares a float32 input against a float64 threshold. For a
+    float32 x, `x <= t` is the same as `x <= t32` where t32 is the largest
+    float32 not above t, so thresholds are stored that way and the whole
+    traversal stays in float32 / int32.
+
+    fold_scaler() rewrites the thresholds of standardized features into raw
+    units; such a forest takes raw input directly and compares in float64.
+    It records what it was folded from (folded_from), so a saved folded
+    bundle can be checked with is_folded() instead of being folded again.
+    """
+
+    # Arrays written by save() / read by load()
+    ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "classes", "_children", "_threshold_cmp")
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        classes: np.ndarray,
+        max_depth: int,
+        n_features: int,
+        input_dtype=np.float32
+    ):
+        """
+        Args:
+            feature: Split feature per node (0 for leaves), shape (n_nodes,)
+            threshold: Split threshold per node, shape (n_nodes,)
+            left: Global index of the left child (self for leaves)
+            right: Global index of the right child (self for leaves)
+            value: Normalized class probabilities per node, shape (n_nodes, n_classes)
+            roots: Global index of each tree's root, shape (n_trees,)
+            classes: Class labels (RandomForestClassifier.classes_)
+            max_depth: Depth of the deepest tree
+            n_features: Number of input features
+            input_dtype: float32 to reproduce sklearn trees, float64 for folded (raw-unit) forests
+        """
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.classes = classes
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.n_trees = len(roots)
+        self.input_dtype = np.dtype(input_dtype)
+
+        # Traversal arrays: [right, left] per node so that the next node is
+        # children[2 * node + go_left], and thresholds in the input dtype
+        self._children = np.ascontiguousarray(np.stack([self.right, self.left], axis=1).ravel())
+        if self.input_dtype == np.float32:
+            self._threshold_cmp = self._round_down_float32(self.threshold)
+        else:
+            self._threshold_cmp = self.threshold
+        # Set by fold_scaler(): source thresholds + scaler of a raw-unit forest
+        self.folded_from: Optional[dict] = None
+
+    @staticmethod
+    def _round_down_float32(threshold: np.ndarray) -> np.ndarray:
+        """Largest float32 not above each float64 threshold"""
+        threshold32 = threshold.astype(np.float32)
+        above = threshold32.astype(np.float64) > threshold
+        threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+        return threshold32
+
+    @classmethod
+    def from_sklearn(cls, forest) -> "CompiledForest":
+        """
+        Flatten every tree of a fitted RandomForestClassifier
+
+        Args:
+            forest: Fitted sklearn RandomForestClassifier (single output)
+
+        Returns:
+            CompiledForest instance
+        """
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("CompiledForest only supports single-output forests")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes)
+            is_leaf = tree.children_left < 0
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.asarray(roots),
+            classes=np.asarray(forest.classes_),
+            max_depth=max_depth,
+            n_features=forest.n_features_in_
+        )
+
+    def matches(self, forest) -> bool:
+        """
+        Whether this forest was compiled from the given RandomForestClassifier
+
+        Node counts alone do not tell two retrained model versions apart, so
+        split features and thresholds are compared too.
+        """
+        if not (
+            self.n_trees == len(forest.estimators_)
+            and self.n_features == forest.n_features_in_
+            and len(self.feature) == sum(estimator.tree_.node_count for estimator in forest.estimators_)
+            and np.array_equal(self.classes, forest.classes_)
+        ):
+            return False
+        for root, estimator in zip(self.roots, forest.estimators_):
+            tree = estimator.tree_
+            nodes = slice(root, root + tree.node_count)
+            if not np.array_equal(self.threshold[nodes], tree.threshold):
+                return False
+            if not np.array_equal(self.feature[nodes], np.where(tree.children_left < 0, 0, tree.feature)):
+                return False
+        return True
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Leaf reached in every tree for every row
+
+        Args:
+            X: Feature matrix (n_rows, n_features)
+
+        Returns:
+            Global leaf indices, shape (n_trees, n_rows)
+        """
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        row_offsets = np.arange(n_rows, dtype=np.int32) * np.int32(self.n_features)
+
+        nodes = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            go_left = flat_X.take(row_offsets + self.feature.take(nodes)) <= self._threshold_cmp.take(nodes)
+            nodes = self._children.take(2 * nodes + go_left)
+        return nodes
+
+    def predict_proba(self, X: np.ndarray, chunk_size: int = 128) -> np.ndarray:
+        """
+        Class probabilities averaged over all trees
+
+        Args:
+            X: Feature matrix (n_rows, n_features), already preprocessed
+            chunk_size: Rows evaluated together (small chunks keep the working set in cache)
+
+        Returns:
+            Probabilities, shape (n_rows, n_classes)
+        """
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {X.shape}")
+
+        proba = np.empty((X.shape[0], len(self.classes)), dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            leaves = self.apply(X[start:start + chunk_size])
+            proba[start:start + chunk_size] = self.value.take(leaves, axis=0).sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Class labels (argmax of predict_proba, like RandomForestClassifier.predict)"""
+        return self.classes.take(self.predict_proba(X).argmax(axis=1))
+
+    def fold_scaler(self, feature_idx: Sequence[int], mean: np.ndarray, scale: np.ndarray) -> "CompiledForest":
+        """
+        Export a copy of the forest that takes raw (unscaled) input
+
+        A split `(x - mean) / scale <= t` on a standardized feature only
+        depends on x through a monotone function, so it is the same as
+        `x <= r` for a raw-unit threshold r. r is not simply t * scale + mean:
+        sklearn rounds the scaled value to float32 before comparing, and the
+        trees split exactly at training values, so r is searched as the
+        largest float64 x that still goes left. The folded forest then
+        compares raw float64 input without any per-request transform.
+
+        Args:
+            feature_idx: Column index of every standardized feature
+            mean: Scaler mean per standardized feature
+            scale: Scaler scale per standardized feature
+
+        Returns:
+            New CompiledForest comparing raw float64 input
+        """
+        feature_idx = np.asarray(feature_idx, dtype=np.int64)
+        mean = np.asarray(mean, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        if np.any(scale <= 0):
+            raise ValueError("Cannot fold a scaler with non-positive scale")
+
+        column_mean = np.zeros(self.n_features)
+        column_scale = np.ones(self.n_features)
+        column_mean[feature_idx] = mean
+        column_scale[feature_idx] = scale
+
+        # Unscaled features go through the same search (mean 0, scale 1) so that
+        # float64 input reproduces sklearn's float32 comparison there too
+        threshold = self.threshold.copy()
+        nodes = np.flatnonzero(self.left != np.arange(len(self.left)))
+        feature = self.feature[nodes]
+        threshold[nodes] = self._raw_thresholds(threshold[nodes], column_mean[feature], column_scale[feature])
+
+        folded = CompiledForest(
+            feature=self.feature,
+            threshold=threshold,
+            left=self.left,
+            right=self.right,
+            value=self.value,
+            roots=self.roots,
+            classes=self.classes,
+            max_depth=self.max_depth,
+            n_features=self.n_features,
+            input_dtype=np.float64
+        )
+        folded.folded_from = _fold_source(self.threshold, feature_idx, mean, scale)
+        return folded
+
+    def is_folded(self, forest: "CompiledForest", feature_idx: Sequence[int], mean: np.ndarray, scale: np.ndarray) -> bool:
+        """Whether this forest is forest.fold_scaler(feature_idx, mean, scale)"""
+        return (
+            self.folded_from is not None
+            and self.folded_from == _fold_source(forest.threshold, feature_idx, mean, scale)
+            and np.array_equal(self.roots, forest.roots)
+            and np.array_equal(self.feature, forest.feature)
+            and np.array_equal(self.left, forest.left)
+            and np.array_equal(self.right, forest.right)
+            and np.array_equal(self.value, forest.value)
+        )
+
+    @staticmethod
+    def _raw_thresholds(threshold: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        """
+        Largest float64 x with float32((x - mean) / scale) <= threshold, per split
+
+        Bisection over the ordered bit patterns of all finite float64 values.
+        """
+        def goes_left(key):
+            x = _key_to_float(key)
+            # Probes beyond the float32 range become +-inf, as in sklearn's own float32 cast
+            with np.errstate(over="ignore"):
+                return ((x - mean) / scale).astype(np.float32) <= threshold
+
+        lo = np.full(threshold.shape, _float_to_key(np.float64(-np.finfo(np.float64).max)))
+        hi = np.full(threshold.shape, _float_to_key(np.float64(np.finfo(np.float64).max)))
+        # Invariant: goes_left(lo) and not goes_left(hi)
+        while True:
+            gap = (hi.view(np.uint64) - lo.view(np.uint64)) >> np.uint64(1)
+            if not gap.any():
+                return _key_to_float(lo)
+            mid = (lo.view(np.uint64) + gap).view(np.int64)
+            left = goes_left(mid)
+            lo = np.where(left, mid, lo)
+            hi = np.where(left, hi, mid)
+
+    def save(self, directory: str) -> None:
+        """
+        Write the forest as one .npy file per array plus meta.json
+
+        The uncompressed .npy layout lets load() memory-map the arrays.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f"{name.lstrip('_')}.npy"), getattr(self, name))
+        meta = {
+            "max_depth": self.max_depth,
+            "n_features": self.n_features,
+            "n_trees": self.n_trees,
+            "input_dtype": self.input_dtype.name,
+        }
+        if self.folded_from is not None:
+            meta["folded_from"] = self.folded_from
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = None) -> "CompiledForest":
+        """
+        Read a forest written by save()
+
+        Args:
+            directory: Bundle directory
+            mmap_mode: Passed to np.load ("r" shares the pages between processes)
+
+        Returns:
+            CompiledForest instance
+        """
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+
+        forest = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(forest, name, np.load(os.path.join(directory, f"{name.lstrip('_')}.npy"), mmap_mode=mmap_mode))
+        forest.max_depth = int(meta["max_depth"])
+        forest.n_features = int(meta["n_features"])
+        forest.n_trees = int(meta["n_trees"])
+        forest.input_dtype = np.dtype(meta["input_dtype"])
+        forest.folded_from = meta.get("folded_from")
+        return forest
+
+
+def _fold_source(threshold: np.ndarray, feature_idx: Sequence[int], mean: np.ndarray, scale: np.ndarray) -> dict:
+    """JSON-serializable fingerprint of a fold_scaler() call (float64 values round-trip exactly through JSON)"""
+    return {
+        "threshold_sha256": hashlib.sha256(np.ascontiguousarray(threshold, dtype=np.float64).tobytes()).hexdigest(),
+        "feature_idx": [int(i) for i in feature_idx],
+        "mean": [float(m) for m in np.asarray(mean, dtype=np.float64)],
+        "scale": [float(s) for s in np.asarray(scale, dtype=np.float64)],
+    }
+
+
+def _float_to_key(x: np.ndarray) -> np.ndarray:
+    """Map float64 values to int64 keys with the same ordering"""
+    bits = np.asarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, np.int64(np.iinfo(np.int64).min) - bits, bits)
+
+
+def _key_to_float(key: np.ndarray) -> np.ndarray:
+    """Inverse of _float_to_key"""
+    key = np.asarray(key, dtype=np.int64)
+    return np.where(key < 0, np.int64(np.iinfo(np.int64).min) - key, key).view(np.float64)
@@ -0,0 +1,228 @@
+"""
+KNN Engine - single-search brute-force neighbor queries for the KNN regressors
+"""
+from typing import Callable, Optional, Sequence, Tuple, Union
+import numpy as np
+
+
+# Metrics served by the precomputed squared-norm search (everything else falls back to sklearn)
+EUCLIDEAN_METRICS = ("euclidean", "l2")
+
+
+class BruteForceKNN:
+    """
+    Brute-force neighbor search over a precomputed training matrix
+
+    The training points are kept as a float32 matrix with cached squared
+    norms, so one query batch costs a single matrix product plus
+    argpartition. The float32 search only shortlists candidates: distances
+    of the shortlist are recomputed in float64 and rows whose shortlist
+    cannot be proven to contain the true k nearest fall back to an exact
+    float64 search, so the neighbors (and therefore the predictions) match
+    the fitted sklearn model.
+
+    With per-feature weights w the distance is sqrt(sum(w * (x - r)^2));
+    fold_scaler() uses this to search raw input against training points
+    kept in raw units.
+    """
+
+    def __init__(
+        self,
+        fit_X: np.ndarray,
+        y: np.ndarray,
+        n_neighbors: int,
+        weights: Union[str, Callable, None] = "uniform",
+        metric: str = "euclidean",
+        fallback=None,
+        feature_weights: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            fit_X: Training points (n_train, n_features)
+            y: Training targets (n_train,)
+            n_neighbors: Number of neighbors (k)
+            weights: "uniform", "distance" or a callable, as in KNeighborsRegressor
+            metric: Effective metric of the fitted model
+            fallback: Fitted sklearn estimator used for metrics without a fast path
+            feature_weights: Optional per-feature weights of the squared Euclidean distance
+        """
+        self.fit_X = np.ascontiguousarray(fit_X, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.n_neighbors = int(n_neighbors)
+        self.weights = weights or "uniform"
+        self.metric = metric
+        self.fallback = fallback
+
+        if self.n_neighbors > self.fit_X.shape[0]:
+            raise ValueError(f"n_neighbors={self.n_neighbors} exceeds {self.fit_X.shape[0]} training points")
+        if metric not in EUCLIDEAN_METRICS and (fallback is None or feature_weights is not None):
+            raise ValueError(f"Metric '{metric}' needs a fallback estimator and no feature weights")
+        self.feature_weights = None if feature_weights is None else np.asarray(feature_weights, dtype=np.float64)
+
+        # Precomputed float32 search matrix (weighted training points) and weighted squared norms:
+        # sum(w * (x - r)^2) = sum(w * x^2) - 2 * x . (w * r) + sum(w * r^2)
+        weighted_X = self.fit_X if self.feature_weights is None else self.fit_X * self.feature_weights
+        self.fit_X32 = np.ascontiguousarray(weighted_X, dtype=np.float32)
+        self.fit_norms32 = np.einsum('ij,ij->i', weighted_X, self.fit_X).astype(np.float32)
+        self.n_candidates = min(self.fit_X.shape[0], 2 * self.n_neighbors)
+
+    @classmethod
+    def from_sklearn(cls, model) -> "BruteForceKNN":
+        """
+        Build the engine from a fitted KNeighborsRegressor
+
+        Training points and targets are only exposed through private
+        attributes, so they are read here once instead of on every request.
+        """
+        metric = getattr(model, 'effective_metric_', model.metric)
+        params = getattr(model, 'effective_metric_params_', None) or {}
+        if metric == "minkowski" and params.get('p', 2) == 2 and 'w' not in params:
+            metric = "euclidean"
+        return cls(
+            fit_X=model._fit_X,
+            y=model._y,
+            n_neighbors=model.n_neighbors,
+            weights=model.weights,
+            metric=metric,
+            fallback=model
+        )
+
+    def kneighbors(self, X: np.ndarray, chunk_size: int = 4096) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest training points of every row, sorted by distance
+
+        Args:
+            X: Query matrix (n_rows, n_features) in the model's feature space
+            chunk_size: Rows searched together (bounds temporary memory)
+
+        Returns:
+            Tuple[distances (n_rows, k) float64, indices (n_rows, k)]
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if self.metric not in EUCLIDEAN_METRICS:
+            return self.fallback.kneighbors(X)
+        if X.shape[0] <= chunk_size:
+            return self._kneighbors_chunk(X)
+
+        results = [self._kneighbors_chunk(X[start:start + chunk_size]) for start in range(0, X.shape[0], chunk_size)]
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def _kneighbors_chunk(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Euclidean search of one chunk of rows"""
+        k = self.n_neighbors
+        m = self.n_candidates
+        n_train = self.fit_X.shape[0]
+
+        # float32 shortlist: |x|^2 is constant per row and does not change the ranking
+        X32 = X.astype(np.float32)
+        partial = self.fit_norms32 - 2.0 * (X32 @ self.fit_X32.T)
+        if m < n_train:
+            order = np.argpartition(partial, m, axis=1)
+            candidates = order[:, :m]
+            boundary = np.take_along_axis(partial, order[:, m:m + 1], axis=1)[:, 0]
+        else:
+            candidates = np.broadcast_to(np.arange(n_train), (X.shape[0], n_train))
+            boundary = None
+
+        # Exact float64 distances of the shortlist, ordered by (distance, index)
+        distances = self._exact_distances(X, candidates)
+        order = np.lexsort((candidates, distances), axis=1)[:, :k]
+        indices = np.take_along_axis(candidates, order, axis=1)
+        distances = np.take_along_axis(distances, order, axis=1)
+
+        if boundary is not None:
+            # The shortlist is complete when the k-th exact distance is clearly
+            # below the best excluded float32 score (with float32 rounding slack)
+            query_norms = self._squared_norms(X)
+            slack = 1e-4 * (query_norms + self.fit_norms32.max() + 1.0)
+            unsure = np.flatnonzero(distances[:, -1] ** 2 - query_norms >= boundary - slack)
+            if unsure.size:
+                all_candidates = np.broadcast_to(np.arange(n_train), (unsure.size, n_train))
+                exact = self._exact_distances(X[unsure], all_candidates)
+                order = np.lexsort((all_candidates, exact), axis=1)[:, :k]
+                indices[unsure] = np.take_along_axis(all_candidates, order, axis=1)
+                distances[unsure] = np.take_along_axis(exact, order, axis=1)
+
+        return distances, indices
+
+    def predict_from_neighbors(self, distances: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        KNeighborsRegressor.predict computed from an existing neighbor search
+
+        Args:
+            distances: Neighbor distances from kneighbors()
+            indices: Neighbor indices from kneighbors()
+
+        Returns:
+            Tuple[predictions (n_rows,), neighbor target values (n_rows, k)]
+        """
+        neighbor_values = self.y[indices]
+        weights = self._get_weights(distances)
+        if weights is None:
+            prediction = np.mean(neighbor_values, axis=1)
+        else:
+            prediction = np.sum(neighbor_values * weights, axis=1) / np.sum(weights, axis=1)
+        return prediction, neighbor_values
+
+    def _get_weights(self, distances: np.ndarray) -> Optional[np.ndarray]:
+        """Neighbor weights, same rules as sklearn.neighbors._base._get_weights"""
+        if self.weights == "uniform":
+            return None
+        if self.weights == "distance":
+            with np.errstate(divide="ignore"):
+                weights = 1.0 / distances
+            inf_mask = np.isinf(weights)
+            inf_row = np.any(inf_mask, axis=1)
+            weights[inf_row] = inf_mask[inf_row]
+            return weights
+        if callable(self.weights):
+            return self.weights(distances)
+        raise ValueError(f"Unsupported weights: {self.weights}")
+
+    def fold_scaler(self, feature_idx: Sequence[int], mean: np.ndarray, scale: np.ndarray) -> "BruteForceKNN":
+        """
+        Export a copy of the engine that searches raw (unscaled) input
+
+        With z = (x - mean) / scale, (z - z_train)^2 = (x - x_train)^2 / scale^2,
+        so the training points are moved back to raw units and the scaler
+        becomes per-feature distance weights 1 / scale^2.
+
+        Args:
+            feature_idx: Column index of every standardized feature
+            mean: Scaler mean per standardized feature
+            scale: Scaler scale per standardized feature
+
+        Returns:
+            New BruteForceKNN taking raw input
+        """
+        if self.metric not in EUCLIDEAN_METRICS or self.feature_weights is not None:
+            raise ValueError("Only unweighted Euclidean engines can fold a scaler")
+        feature_idx = np.asarray(feature_idx, dtype=np.int64)
+        scale = np.asarray(scale, dtype=np.float64)
+
+        raw_X = self.fit_X.copy()
+        raw_X[:, feature_idx] = raw_X[:, feature_idx] * scale + np.asarray(mean, dtype=np.float64)
+        feature_weights = np.ones(self.fit_X.shape[1])
+        feature_weights[feature_idx] = 1.0 / scale ** 2
+
+        return BruteForceKNN(
+            fit_X=raw_X,
+            y=self.y,
+            n_neighbors=self.n_neighbors,
+            weights=self.weights,
+            metric=self.metric,
+            feature_weights=feature_weights
+        )
+
+    def _squared_norms(self, X: np.ndarray) -> np.ndarray:
+        """(Weighted) squared norm of every row"""
+        if self.feature_weights is None:
+            return np.einsum('ij,ij->i', X, X)
+        return np.einsum('ij,j,ij->i', X, self.feature_weights, X)
+
+    def _exact_distances(self, X: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """float64 (weighted) Euclidean distances from each row to its candidate training points"""
+        diff = self.fit_X[candidates] - X[:, None, :]
+        if self.feature_weights is None:
+            return np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+        return np.sqrt(np.einsum('ijk,k,ijk->ij', diff, self.feature_weights, diff))
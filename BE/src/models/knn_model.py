@@ -1,82 +1,109 @@
-import joblib
-import pandas as pd
 import numpy as np
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, List, Optional, Sequence, Union
 from config import Config
+from utils.features import FeatureLayout
+from utils.metrics import StageTimer
+from utils.cache import get_prediction_cache, predict_rows
+from .knn_engine import BruteForceKNN, EUCLIDEAN_METRICS
 
 
-class KNNSystolicModel:
- 
+class KNNBloodPressureModel:
+    """
+    Shared KNN regression logic for the Systolic and Diastolic BP models.
+
+    Subclasses only define the feature layout and the denormalization constants.
+    """
+
+    # "model" label of the metrics (set by subclasses)
+    model_name: str = "knn"
+
+    # Expected features in training order (set by subclasses)
+    expected_features: List[str] = []
+
+    # Numeric features that need scaling (set by subclasses)
+    numeric_features: List[str] = []
+
+    # Denormalization constants (set by subclasses)
+    target_mean: float = 0.0
+    target_std: float = 1.0
+
+    # Keys of predict() / predict_batch(), in the column order of _predict_matrix()
+    OUTPUT_KEYS = (
+        "predicted_normalized",
+        "predicted_value_mmHg",
+        "confidence_interval_lower",
+        "confidence_interval_upper",
+        "prediction_std_normalized",
+        "prediction_std_mmHg"
+    )
+
+    # Model registry version (set when the registry loads the model); None = loaded directly
+    version: Optional[str] = None
+
     def __init__(self, model_path: str, scaler_path: Optional[str] = None):
         """
-        Initialize KNN Systolic BP model
-        
+        Initialize KNN BP model
+
         Args:
             model_path: Path to the trained KNN model (.joblib)
             scaler_path: Path to the scaler (.pkl) for raw input normalization
         """
-        self.model = joblib.load(model_path)
+        # joblib (and sklearn, through unpickling) is only imported when a model is loaded
+        import joblib
+
+        self.model = joblib.load(model_path, mmap_mode=Config.KNN_MMAP_MODE)
         self.scaler = joblib.load(scaler_path) if scaler_path else None
-        
-        # Denormalization constants
-        self.target_mean = Config.SYSTOLIC_BP_MEAN
-        self.target_std = Config.SYSTOLIC_BP_STD
-        
-        # Expected features (15 total, includes Diastolic_BP)
-        self.expected_features = [
-            'Sex', 'Age', 'Height', 'Weight', 'Diastolic_BP', 'Heart_Rate', 'BMI',
-            'Diabetes_Diabetes', 'Diabetes_None', 'Diabetes_Type 2 Diabetes',
-            'Cerebral_infarction_None', 'Cerebral_infarction_cerebral infarction',
-            'Cerebrovascular_disease_None', 'Cerebrovascular_disease_cerebrovascular disease',
-            'Cerebrovascular_disease_insufficiency of cerebral blood supply'
-        ]
-        
-        # Numeric features that need scaling (6 features including Diastolic_BP)
-        self.numeric_features = ['Age', 'Height', 'Weight', 'Diastolic_BP', 'Heart_Rate', 'BMI']
-        
-    def preprocess(self, input_data: Dict[str, Any], is_raw: bool = False) -> pd.DataFrame:
+
+        # Precompiled input layout; missing features default to 0
+        self.layout = FeatureLayout(self.expected_features, self.numeric_features, strict=False)
+        self.layout.check_estimator(self.model)
+        if hasattr(self.model, 'feature_names_in_'):
+            # Inputs are always vectorized in layout order
+            del self.model.feature_names_in_
+        if self.scaler is not None:
+            self.layout.bind_scaler(self.scaler)
+
+        # One neighbor search per batch gives prediction, std and CI together
+        self.engine = BruteForceKNN.from_sklearn(self.model)
+
+        # Same search with the scaler folded into the training points, so raw rows skip scaling
+        self.raw_engine = None
+        if self.scaler is not None and self.engine.metric in EUCLIDEAN_METRICS:
+            self.raw_engine = self.engine.fold_scaler(self.layout.scaled_idx, self.layout.mean, self.layout.scale)
+
+        # Output cache shared by all versions of this model (None = disabled)
+        self.cache = get_prediction_cache(self.model_name)
+
+    def preprocess(self, input_data: Any, is_raw: Union[bool, Sequence[bool]] = False) -> np.ndarray:
         """
         Preprocess input data for prediction
-        
+
         Args:
-            input_data: Dictionary with feature values
-            is_raw: If True, normalize numeric features using scaler
-            
+            input_data: Request object or feature dict (one row), a list of them,
+                a DataFrame, or an array in expected_features order
+            is_raw: If True, normalize numeric features using scaler.
+                May also be a per-row mask for batches mixing raw and normalized rows
+
         Returns:
-            DataFrame ready for model prediction
+            float64 matrix (n_rows, 15) ready for model prediction
         """
-        # Create DataFrame from input
-        df = pd.DataFrame([input_data])
-        
-        # Ensure all expected features exist
-        for feature in self.expected_features:
-            if feature not in df.columns:
-                df[feature] = 0
-        
-        # Reorder columns to match training data
-        df = df[self.expected_features]
-        
+        matrix = self.layout.vectorize(input_data)
+
         # Normalize numeric features if raw input
-        if is_raw and self.scaler:
-            # Extract numeric features
-            numeric_data = df[self.numeric_features].values
-            
-            # Scale numeric features
-            scaled_numeric = self.scaler.transform(numeric_data)
-            
-            # Replace with scaled values
-            df[self.numeric_features] = scaled_numeric
-        
-        return df
-    
-    def predict(self, input_data: Dict[str, Any], is_raw: bool = False) -> Dict[str, float]:
+        if self.scaler is not None and np.any(is_raw):
+            self.layout.scale_rows(matrix, is_raw)
+
+        return matrix
+
+    def predict(self, input_data: Any, is_raw: bool = False, use_cache: bool = True) -> Dict[str, float]:
         """
-        Predict Systolic BP with denormalization
-        
+        Predict BP with denormalization
+
         Args:
-            input_data: Dictionary with feature values
+            input_data: Request object or dictionary with feature values
             is_raw: If True, input will be normalized before prediction
-            
+            use_cache: False = always run the neighbor search (warm-up, self-test)
+
         Returns:
             Dictionary with:
                 - predicted_normalized: Predicted value in normalized form
@@ -86,169 +113,258 @@ class KNNSystolicModel:
                 - prediction_std_normalized: Std of prediction (normalized)
                 - prediction_std_mmHg: Std of prediction (mmHg)
         """
-        # Preprocess input
-        processed_data = self.preprocess(input_data, is_raw)
-        
-        # Get prediction (normalized)
-        prediction_normalized = self.model.predict(processed_data)[0]
-        
-        # Denormalize prediction to mmHg
-        prediction_mmHg = prediction_normalized * self.target_std + self.target_mean
-        
-        # Calculate prediction uncertainty using k nearest neighbors
-        try:
-            # Get k nearest neighbors and their target values
-            distances, indices = self.model.kneighbors(processed_data)
-            
-            # Get the target values of k nearest neighbors
-            # Note: self.model._y contains training targets
-            neighbor_values = self.model._y[indices[0]]
-            
-            # Calculate standard deviation of neighbor predictions (normalized)
-            prediction_std_normalized = float(np.std(neighbor_values))
-            
-            # Convert std to mmHg scale
-            prediction_std_mmHg = prediction_std_normalized * self.target_std
-            
-            # Calculate 95% confidence interval (±1.96 * std)
-            ci_lower = prediction_mmHg - 1.96 * prediction_std_mmHg
-            ci_upper = prediction_mmHg + 1.96 * prediction_std_mmHg
-            
-        except Exception as e:
-            prediction_std_normalized = 0.0
-            prediction_std_mmHg = 0.0
-            ci_lower = prediction_mmHg
-            ci_upper = prediction_mmHg
-        
-        return {
-            "predicted_normalized": float(prediction_normalized),
-            "predicted_value_mmHg": float(prediction_mmHg),
-            "confidence_interval_lower": float(ci_lower),
-            "confidence_interval_upper": float(ci_upper),
-            "prediction_std_normalized": prediction_std_normalized,
-            "prediction_std_mmHg": prediction_std_mmHg
-        }
-
-
-class KNNDiastolicModel:
-    
-    def __init__(self, model_path: str, scaler_path: Optional[str] = None):
-        """
-        Initialize KNN Diastolic BP model
-        
-        Args:
-            model_path: Path to the trained KNN model (.joblib)
-            scaler_path: Path to the scaler (.pkl) for raw input normalization
-        """
-        self.model = joblib.load(model_path)
-        self.scaler = joblib.load(scaler_path) if scaler_path else None
-        
-        # Denormalization constants
-        self.target_mean = Config.DIASTOLIC_BP_MEAN
-        self.target_std = Config.DIASTOLIC_BP_STD
-        
-        # Expected features (15 total, includes Systolic_BP)
-        self.expected_features = [
-            'Sex', 'Age', 'Height', 'Weight', 'Systolic_BP', 'Heart_Rate', 'BMI',
-            'Diabetes_Diabetes', 'Diabetes_None', 'Diabetes_Type 2 Diabetes',
-            'Cerebral_infarction_None', 'Cerebral_infarction_cerebral infarction',
-            'Cerebrovascular_disease_None', 'Cerebrovascular_disease_cerebrovascular disease',
-            'Cerebrovascular_disease_insufficiency of cerebral blood supply'
-        ]
-        
-        # Numeric features that need scaling (6 features including Systolic_BP)
-        self.numeric_features = ['Age', 'Height', 'Weight', 'Systolic_BP', 'Heart_Rate', 'BMI']
-        
-    def preprocess(self, input_data: Dict[str, Any], is_raw: bool = False) -> pd.DataFrame:
+        result = self.predict_batch(input_data, is_raw=is_raw, use_cache=use_cache)
+        return {key: values[0] for key, values in result.items()}
+
+    def normalize_feature(self, feature: str, values: np.ndarray) -> np.ndarray:
         """
-        Preprocess input data for prediction
-        
+        Convert raw values of one numeric feature into the model's z-score units
+
         Args:
-            input_data: Dictionary with feature values
-            is_raw: If True, normalize numeric features using scaler
-            
+            feature: Name of a feature in numeric_features
+            values: Raw values (e.g. mmHg)
+
         Returns:
-            DataFrame ready for model prediction
+            Values normalized with the model's scaler
         """
-        # Create DataFrame from input
-        df = pd.DataFrame([input_data])
-        
-        # Ensure all expected features exist
-        for feature in self.expected_features:
-            if feature not in df.columns:
-                df[feature] = 0
-        
-        # Reorder columns to match training data
-        df = df[self.expected_features]
-        
-        # Normalize numeric features if raw input
-        if is_raw and self.scaler:
-            # Extract numeric features
-            numeric_data = df[self.numeric_features].values
-            
-            # Scale numeric features
-            scaled_numeric = self.scaler.transform(numeric_data)
-            
-            # Replace with scaled values
-            df[self.numeric_features] = scaled_numeric
-        
-        return df
-    
-    def predict(self, input_data: Dict[str, Any], is_raw: bool = False) -> Dict[str, float]:
+        if self.layout.mean is None:
+            raise ValueError("Cannot normalize feature: scaler not found")
+        idx = self.numeric_features.index(feature)
+        return (np.asarray(values, dtype=float) - self.layout.mean[idx]) / self.layout.scale[idx]
+
+    def _kneighbors(self, matrix: np.ndarray, is_raw: Union[bool, Sequence[bool]], timer: StageTimer):
+        """Neighbor search of vectorized rows; raw rows go to the folded engine when available"""
+        if self.raw_engine is None or not np.any(is_raw):
+            if self.scaler is not None and np.any(is_raw):
+                self.layout.scale_rows(matrix, is_raw)
+                timer.lap("scale")
+            return self.engine.kneighbors(matrix)
+
+        raw_mask = np.broadcast_to(np.asarray(is_raw, dtype=bool), (matrix.shape[0],))
+        if raw_mask.all():
+            return self.raw_engine.kneighbors(matrix)
+
+        k = self.engine.n_neighbors
+        distances = np.empty((matrix.shape[0], k))
+        indices = np.empty((matrix.shape[0], k), dtype=np.intp)
+        for engine, rows in ((self.raw_engine, raw_mask), (self.engine, ~raw_mask)):
+            distances[rows], indices[rows] = engine.kneighbors(matrix[rows])
+        return distances, indices
+
+    def predict_batch(
+        self,
+        input_data: Any,
+        is_raw: Union[bool, Sequence[bool]] = False,
+        use_cache: bool = True
+    ) -> Dict[str, List[float]]:
         """
-        Predict Diastolic BP with denormalization
-        
+        Predict BP for many rows with a single neighbor search
+
+        Identical rows are searched once; batches of up to
+        Config.PREDICTION_CACHE_MAX_ROWS rows also go through the prediction
+        cache, and only the rows not cached for this model version are searched.
+
         Args:
-            input_data: Dictionary with feature values
-            is_raw: If True, input will be normalized before prediction
-            
+            input_data: List of request objects / feature dicts, a DataFrame, or a feature matrix
+            is_raw: If True, input will be normalized before prediction (or a per-row mask)
+            use_cache: False = skip the prediction cache and the dedup, search every row (warm-up, self-test)
+
         Returns:
-            Dictionary with:
-                - predicted_normalized: Predicted value in normalized form
-                - predicted_value_mmHg: Predicted value in mmHg (denormalized)
-                - confidence_interval_lower: Lower bound of 95% confidence interval (mmHg)
-                - confidence_interval_upper: Upper bound of 95% confidence interval (mmHg)
-                - prediction_std_normalized: Std of prediction (normalized)
-                - prediction_std_mmHg: Std of prediction (mmHg)
+            Dictionary with the same keys as predict(), each holding one value per row
+            in input order
         """
-        # Preprocess input
-        processed_data = self.preprocess(input_data, is_raw)
-        
-        # Get prediction (normalized)
-        prediction_normalized = self.model.predict(processed_data)[0]
-        
+        timer = StageTimer(self.model_name, is_raw)
+        matrix = self.layout.vectorize(input_data)
+        timer.lap("vectorize")
+        timer.rows(matrix.shape[0])
+
+        if not use_cache or matrix.shape[0] == 0 or (matrix.shape[0] == 1 and self.cache is None):
+            outputs = self._predict_matrix(matrix, is_raw, timer)
+        else:
+            raw_mask = np.broadcast_to(np.asarray(is_raw, dtype=bool), (matrix.shape[0],))
+            outputs = predict_rows(
+                self.cache,
+                self.version if self.version is not None else id(self),
+                matrix,
+                raw_mask,
+                lambda rows: self._predict_matrix(matrix[rows], raw_mask[rows], timer),
+                timer
+            )
+        return {key: outputs[:, i].tolist() for i, key in enumerate(self.OUTPUT_KEYS)}
+
+    def _predict_matrix(
+        self,
+        matrix: np.ndarray,
+        is_raw: Union[bool, Sequence[bool]],
+        timer: StageTimer
+    ) -> np.ndarray:
+        """Outputs of vectorized rows, one column per OUTPUT_KEYS entry"""
+        # Get k nearest neighbors once for the whole matrix
+        distances, indices = self._kneighbors(matrix, is_raw, timer)
+        timer.lap("kneighbors")
+
+        # Get prediction (normalized) and the target values of the k nearest neighbors,
+        # honoring the fitted model's weights
+        prediction_normalized, neighbor_values = self.engine.predict_from_neighbors(distances, indices)
+
         # Denormalize prediction to mmHg
         prediction_mmHg = prediction_normalized * self.target_std + self.target_mean
-        
-        # Calculate prediction uncertainty using k nearest neighbors
-        try:
-            # Get k nearest neighbors and their target values
-            distances, indices = self.model.kneighbors(processed_data)
-            
-            # Get the target values of k nearest neighbors
-            neighbor_values = self.model._y[indices[0]]
-            
-            # Calculate standard deviation of neighbor predictions (normalized)
-            prediction_std_normalized = float(np.std(neighbor_values))
-            
-            # Convert std to mmHg scale
-            prediction_std_mmHg = prediction_std_normalized * self.target_std
-            
-            # Calculate 95% confidence interval (±1.96 * std)
-            ci_lower = prediction_mmHg - 1.96 * prediction_std_mmHg
-            ci_upper = prediction_mmHg + 1.96 * prediction_std_mmHg
-            
-        except Exception as e:
-            prediction_std_normalized = 0.0
-            prediction_std_mmHg = 0.0
-            ci_lower = prediction_mmHg
-            ci_upper = prediction_mmHg
-        
-        return {
-            "predicted_normalized": float(prediction_normalized),
-            "predicted_value_mmHg": float(prediction_mmHg),
-            "confidence_interval_lower": float(ci_lower),
-            "confidence_interval_upper": float(ci_upper),
-            "prediction_std_normalized": prediction_std_normalized,
-            "prediction_std_mmHg": prediction_std_mmHg
-        }
+
+        # Calculate standard deviation of neighbor predictions (normalized)
+        prediction_std_normalized = neighbor_values.std(axis=1)
+
+        # Convert std to mmHg scale
+        prediction_std_mmHg = prediction_std_normalized * self.target_std
+
+        # Calculate 95% confidence interval (±1.96 * std)
+        ci_lower = prediction_mmHg - 1.96 * prediction_std_mmHg
+        ci_upper = prediction_mmHg + 1.96 * prediction_std_mmHg
+
+        return np.column_stack([
+            prediction_normalized,
+            prediction_mmHg,
+            ci_lower,
+            ci_upper,
+            prediction_std_normalized,
+            prediction_std_mmHg
+        ])
+
+
+class KNNSystolicModel(KNNBloodPressureModel):
+
+    model_name = "knn_systolic"
+
+    # Denormalization constants
+    target_mean = Config.SYSTOLIC_BP_MEAN
+    target_std = Config.SYSTOLIC_BP_STD
+
+    # Expected features (15 total, includes Diastolic_BP)
+    expected_features = [
+        'Sex', 'Age', 'Height', 'Weight', 'Diastolic_BP', 'Heart_Rate', 'BMI',
+        'Diabetes_Diabetes', 'Diabetes_None', 'Diabetes_Type 2 Diabetes',
+        'Cerebral_infarction_None', 'Cerebral_infarction_cerebral infarction',
+        'Cerebrovascular_disease_None', 'Cerebrovascular_disease_cerebrovascular disease',
+        'Cerebrovascular_disease_insufficiency of cerebral blood supply'
+    ]
+
+    # Numeric features that need scaling (6 features including Diastolic_BP)
+    numeric_features = ['Age', 'Height', 'Weight', 'Diastolic_BP', 'Heart_Rate', 'BMI']
+
+
+class KNNDiastolicModel(KNNBloodPressureModel):
+
+    model_name = "knn_diastolic"
+
+    # Denormalization constants
+    target_mean = Config.DIASTOLIC_BP_MEAN
+    target_std = Config.DIASTOLIC_BP_STD
+
+    # Expected features (15 total, includes Systolic_BP)
+    expected_features = [
+        'Sex', 'Age', 'Height', 'Weight', 'Systolic_BP', 'Heart_Rate', 'BMI',
+        'Diabetes_Diabetes', 'Diabetes_None', 'Diabetes_Type 2 Diabetes',
+        'Cerebral_infarction_None', 'Cerebral_infarction_cerebral infarction',
+        'Cerebrovascular_disease_None', 'Cerebrovascular_disease_cerebrovascular disease',
+        'Cerebrovascular_disease_insufficiency of cerebral blood supply'
+    ]
+
+    # Numeric features that need scaling (6 features including Systolic_BP)
+    numeric_features = ['Age', 'Height', 'Weight', 'Systolic_BP', 'Heart_Rate', 'BMI']
+
+
+def estimate_joint_bp(
+    systolic_model: KNNSystolicModel,
+    diastolic_model: KNNDiastolicModel,
+    input_data: Sequence[Dict[str, Any]],
+    is_raw: Union[bool, Sequence[bool]] = False,
+    initial_systolic: Union[float, Sequence[float]] = Config.JOINT_BP_INITIAL_SYSTOLIC,
+    initial_diastolic: Union[float, Sequence[float]] = Config.JOINT_BP_INITIAL_DIASTOLIC,
+    max_iterations: Union[int, Sequence[int]] = Config.JOINT_BP_MAX_ITERATIONS,
+    tolerance: Union[float, Sequence[float]] = Config.JOINT_BP_TOLERANCE_MMHG,
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """
+    Estimate Systolic and Diastolic BP together when neither is measured
+
+    Each KNN model needs the other BP as an input feature, so starting from the
+    initial guesses the two models are alternated (SBP from current DBP, then DBP
+    from the new SBP) until both estimates move less than `tolerance` mmHg or
+    `max_iterations` is reached. All rows are iterated together; converged rows
+    are frozen and dropped from later model calls.
+
+    Args:
+        systolic_model: KNN Systolic model instance
+        diastolic_model: KNN Diastolic model instance
+        input_data: List of request objects / feature dicts without Systolic_BP / Diastolic_BP
+        is_raw: If True, input is raw (or a per-row mask)
+        initial_systolic: Starting SBP guess in mmHg (scalar or per row)
+        initial_diastolic: Starting DBP guess in mmHg (scalar or per row)
+        max_iterations: Iteration cap (scalar or per row)
+        tolerance: Convergence tolerance in mmHg (scalar or per row)
+        use_cache: False = skip the prediction cache of both models
+
+    Returns:
+        Dictionary with:
+            - systolic: predict_batch() output of the last SBP evaluation per row
+            - diastolic: predict_batch() output of the last DBP evaluation per row
+            - iterations: Number of alternations run per row
+            - converged: Whether each row reached the tolerance
+    """
+    systolic_base = systolic_model.layout.vectorize(input_data)
+    diastolic_base = diastolic_model.layout.vectorize(input_data)
+    dbp_col = systolic_model.layout.index['Diastolic_BP']
+    sbp_col = diastolic_model.layout.index['Systolic_BP']
+    n = systolic_base.shape[0]
+    raw_mask = np.broadcast_to(np.asarray(is_raw, dtype=bool), (n,)).copy()
+    max_iterations = np.broadcast_to(np.asarray(max_iterations, dtype=int), (n,))
+    tolerance = np.broadcast_to(np.asarray(tolerance, dtype=float), (n,))
+
+    systolic = np.broadcast_to(np.asarray(initial_systolic, dtype=float), (n,)).copy()
+    diastolic = np.broadcast_to(np.asarray(initial_diastolic, dtype=float), (n,)).copy()
+    iterations = np.zeros(n, dtype=int)
+    converged = np.zeros(n, dtype=bool)
+    systolic_result = {}
+    diastolic_result = {}
+
+    def as_feature(model, feature, values_mmHg, mask):
+        # Raw rows take mmHg directly, normalized rows need the model's z-score
+        values = np.array(values_mmHg, dtype=float)
+        if not mask.all():
+            values[~mask] = model.normalize_feature(feature, values[~mask])
+        return values
+
+    def store(target, result, idx):
+        for key, values in result.items():
+            target.setdefault(key, np.zeros(n))[idx] = values
+
+    active = np.flatnonzero(max_iterations > 0)
+    while active.size:
+        mask = raw_mask[active]
+
+        sbp_rows = systolic_base[active]
+        sbp_rows[:, dbp_col] = as_feature(systolic_model, 'Diastolic_BP', diastolic[active], mask)
+        sbp_result = systolic_model.predict_batch(sbp_rows, is_raw=mask, use_cache=use_cache)
+        new_systolic = np.asarray(sbp_result["predicted_value_mmHg"])
+
+        dbp_rows = diastolic_base[active]
+        dbp_rows[:, sbp_col] = as_feature(diastolic_model, 'Systolic_BP', new_systolic, mask)
+        dbp_result = diastolic_model.predict_batch(dbp_rows, is_raw=mask, use_cache=use_cache)
+        new_diastolic = np.asarray(dbp_result["predicted_value_mmHg"])
+
+        delta = np.maximum(np.abs(new_systolic - systolic[active]), np.abs(new_diastolic - diastolic[active]))
+        systolic[active] = new_systolic
+        diastolic[active] = new_diastolic
+        store(systolic_result, sbp_result, active)
+        store(diastolic_result, dbp_result, active)
+        iterations[active] += 1
+        converged[active] = delta <= tolerance[active]
+
+        keep = ~converged[active] & (iterations[active] < max_iterations[active])
+        active = active[keep]
+
+    return {
+        "systolic": {key: values.tolist() for key, values in systolic_result.items()},
+        "diastolic": {key: values.tolist() for key, values in diastolic_result.items()},
+        "iterations": iterations.tolist(),
+        "converged": converged.tolist()
+    }
@@ -2,25 +2,51 @@
 Random Forest Model - Model dự đoán tăng huyết áp
 """
 import os
-from typing import Tuple, Any
-import pandas as pd
-from joblib import load
+from typing import Tuple, Any, List, Sequence, Union
+import numpy as np
+from config import Config
+from utils.features import FeatureLayout
+from utils.metrics import StageTimer
+from utils.cache import get_prediction_cache, predict_rows
+from utils.log import debug_sampled, fields, get_logger
 from .base_model import BaseModel
+from .compiled_forest import CompiledForest
 
 
+logger = get_logger(__name__)
+
 class RandomForestModel(BaseModel):
 
-    def __init__(self, model_path: str, scaler_path: str = None):
+    BACKENDS = ("sklearn", "compiled", "auto")
+    
+    # Nhãn "model" của metrics
+    model_name = "random_forest"
+    
+    # Version trong model registry (set khi registry load model); None = model load trực tiếp
+    version = None
+
+    def __init__(self, model_path: str, scaler_path: str = None, backend: str = None, compiled_dir: str = None):
         """
         Initialize Random Forest Model
         
         Args:
             model_path: Đường dẫn đến file random_forest.joblib
             scaler_path: Đường dẫn đến file scaler.pkl (optional)
+            backend: "sklearn", "compiled" (CompiledForest) hoặc "auto"
+                (compiled cho batch nhỏ, sklearn cho batch lớn). Mặc định: Config.RANDOM_FOREST_BACKEND
+            compiled_dir: Thư mục bundle CompiledForest đã export. Mặc định: Config.COMPILED_FOREST_DIR
         """
         super().__init__(model_path)
         self.scaler_path = scaler_path
         self.scaler = None
+        self.backend = backend or Config.RANDOM_FOREST_BACKEND
+        if self.backend not in self.BACKENDS:
+            raise ValueError(f"Unknown Random Forest backend: {self.backend}")
+        self.compiled_dir = compiled_dir or Config.COMPILED_FOREST_DIR
+        self.compiled = None
+        self.compiled_raw = None
+        # Cache kết quả dùng chung giữa các version của model (None = tắt)
+        self.cache = get_prediction_cache(self.model_name)
         
         # Features cần scale (không bao gồm Sex)
         self.features_to_scale = ['Age', 'Height', 'Weight', 'Systolic_BP', 'Diastolic_BP', 'Heart_Rate', 'BMI']
@@ -33,6 +59,18 @@ class RandomForestModel(BaseModel):
             'Cerebrovascular_None', 'Cerebrovascular_disease', 'Cerebrovascular_insuff'
         ]
         
+        # Thứ tự cột lúc train (tên cột one-hot khác với tên field của request)
+        self.layout = FeatureLayout(
+            columns=[
+                'Sex', 'Age', 'Height', 'Weight', 'Systolic_BP', 'Diastolic_BP', 'Heart_Rate', 'BMI',
+                'Diabetes_Diabetes', 'Diabetes_None', 'Diabetes_Type 2 Diabetes',
+                'Cerebral_infarction_None', 'Cerebral_infarction_cerebral infarction',
+                'Cerebrovascular_disease_None', 'Cerebrovascular_disease_cerebrovascular disease',
+                'Cerebrovascular_disease_insufficiency of cerebral blood supply'
+            ],
+            scaled_columns=self.features_to_scale
+        )
+        
         self.label_map = {
             0: "Bình thường (Normal)",
             1: "Tiền tăng huyết áp (Prehypertension)",
@@ -47,102 +85,207 @@ class RandomForestModel(BaseModel):
             if not os.path.exists(self.model_path):
                 raise FileNotFoundError(f"Model file not found: {self.model_path}")
             
+            # joblib (và sklearn khi unpickle) chỉ được import lúc load model
+            from joblib import load
+            
             self.model = load(self.model_path)
+            
+            # Input luôn được vectorize theo layout, nên bỏ kiểm tra tên cột của sklearn
+            # (tránh warning "X does not have valid feature names" mỗi request)
+            self.layout.check_estimator(self.model)
+            if hasattr(self.model, 'feature_names_in_'):
+                del self.model.feature_names_in_
+            
+            if self.backend != "sklearn":
+                self.compiled = self._load_compiled()
             self.is_loaded = True
-            print(f"Loaded Random Forest model from {self.model_path}")
+            logger.info("Loaded Random Forest model", extra=fields(path=self.model_path, backend=self.backend))
             
             # Load scaler 
             if self.scaler_path and os.path.exists(self.scaler_path):
                 self.scaler = load(self.scaler_path)
-                print(f"Loaded scaler from {self.scaler_path}")
-                print(f"ℹAPI can accept RAW input")
+                self.layout.bind_scaler(self.scaler)
+                if self.compiled is not None:
+                    # Gộp scaler vào threshold: input RAW đi thẳng vào cây, không cần scale
+                    self.compiled_raw = self._load_compiled_raw()
+                logger.info("Loaded scaler, RAW input accepted", extra=fields(path=self.scaler_path))
             else:
-                print(f"No scaler found - API only accepts NORMALIZED input")
+                logger.warning("No scaler found - only NORMALIZED input accepted", extra=fields(path=self.scaler_path))
             
-        except Exception as e:
-            print(f"Error loading model: {e}")
+        except Exception:
+            logger.exception("Error loading Random Forest model", extra=fields(path=self.model_path))
             raise
     
-    def preprocess(self, input_data: pd.DataFrame, is_raw: bool = False) -> pd.DataFrame:
+    def _load_compiled(self) -> CompiledForest:
+        """
+        CompiledForest của model: đọc bundle đã export (memory-mapped, các worker
+        dùng chung một bản trong page cache) nếu có và khớp model, ngược lại build từ sklearn
+        """
+        bundle = os.path.join(self.compiled_dir, "normalized")
+        if Config.COMPILED_FOREST_MMAP_MODE and os.path.exists(os.path.join(bundle, "meta.json")):
+            compiled = CompiledForest.load(bundle, mmap_mode=Config.COMPILED_FOREST_MMAP_MODE)
+            if compiled.matches(self.model):
+                logger.info("Memory-mapped compiled forest", extra=fields(path=bundle))
+                return compiled
+            logger.warning("Compiled forest bundle does not match the model - rebuilding", extra=fields(path=bundle))
+        return CompiledForest.from_sklearn(self.model)
+    
+    def _load_compiled_raw(self) -> CompiledForest:
+        """
+        CompiledForest đã gộp scaler: đọc bundle "raw" đã export nếu nó được gộp từ
+        đúng forest + scaler này, ngược lại chạy fold_scaler (bisection trên mọi threshold)
+        """
+        fold = (self.layout.scaled_idx, self.layout.mean, self.layout.scale)
+        bundle = os.path.join(self.compiled_dir, "raw")
+        if Config.COMPILED_FOREST_MMAP_MODE and os.path.exists(os.path.join(bundle, "meta.json")):
+            compiled_raw = CompiledForest.load(bundle, mmap_mode=Config.COMPILED_FOREST_MMAP_MODE)
+            if compiled_raw.is_folded(self.compiled, *fold):
+                logger.info("Memory-mapped compiled forest", extra=fields(path=bundle))
+                return compiled_raw
+            logger.warning("Raw compiled forest bundle does not match the model/scaler - folding", extra=fields(path=bundle))
+        return self.compiled.fold_scaler(*fold)
+    
+    def preprocess(self, input_data: Any, is_raw: Union[bool, Sequence[bool]] = False) -> np.ndarray:
         """
         Tiền xử lý dữ liệu
         
         Args:
-            input_data: DataFrame với input features
-            is_raw: True nếu input là RAW data (chưa normalized), False nếu đã normalized
+            input_data: Request object, dict, list các dòng, DataFrame hoặc ndarray theo thứ tự layout
+            is_raw: True nếu input là RAW data (chưa normalized), False nếu đã normalized.
+                Có thể là một mask theo từng dòng (batch trộn RAW và NORMALIZED)
             
         Returns:
-            DataFrame đã được chuẩn hóa (normalized)
+            Ma trận float64 (n_rows, 16) đã chuẩn hóa, đúng thứ tự cột lúc train
         
         Raises:
             ValueError: Nếu is_raw=True nhưng không có scaler
         """
-        df = input_data.copy()
+        matrix = self.layout.vectorize(input_data)
         
-        if is_raw:
-            # Input là RAW data, cần normalize
+        if np.any(is_raw):
+            # Input là RAW data, cần normalize ONLY numeric features (excluding Sex)
             if self.scaler is None:
                 raise ValueError(
                     "Cannot process raw input: scaler not found. "
                     "Please provide normalized input or ensure scaler.pkl exists."
                 )
-            
-            # Transform ONLY numeric features (excluding Sex)
-            df[self.features_to_scale] = self.scaler.transform(df[self.features_to_scale])
-            print(f"✅ Normalized raw input using scaler")
-        
-        # Rename columns to match training data format
-        column_mapping = {
-            'Diabetes_Type2': 'Diabetes_Type 2 Diabetes',
-            'Cerebral_infarction_infarction': 'Cerebral_infarction_cerebral infarction',
-            'Cerebrovascular_None': 'Cerebrovascular_disease_None',
-            'Cerebrovascular_disease': 'Cerebrovascular_disease_cerebrovascular disease',
-            'Cerebrovascular_insuff': 'Cerebrovascular_disease_insufficiency of cerebral blood supply'
-        }
-        df = df.rename(columns=column_mapping)
-        
-        # Update feature order with correct column names
-        correct_feature_order = [
-            'Sex', 'Age', 'Height', 'Weight', 'Systolic_BP', 'Diastolic_BP', 'Heart_Rate', 'BMI',
-            'Diabetes_Diabetes', 'Diabetes_None', 'Diabetes_Type 2 Diabetes',
-            'Cerebral_infarction_None', 'Cerebral_infarction_cerebral infarction',
-            'Cerebrovascular_disease_None', 'Cerebrovascular_disease_cerebrovascular disease',
-            'Cerebrovascular_disease_insufficiency of cerebral blood supply'
-        ]
+            self.layout.scale_rows(matrix, is_raw)
+            debug_sampled(logger, "Normalized raw input using scaler", rows=matrix.shape[0])
         
-        # Đảm bảo thứ tự features đúng
-        df = df[correct_feature_order]
-        
-        return df
+        return matrix
     
-    def predict(self, input_data: pd.DataFrame, is_raw: bool = False) -> Tuple[int, float]:
+    def predict(self, input_data: Any, is_raw: bool = False, use_cache: bool = True) -> Tuple[int, float]:
         """
         Dự đoán tăng huyết áp
         
         Args:
-            input_data: DataFrame với các features
+            input_data: Một dòng (request object, dict hoặc DataFrame một dòng)
             is_raw: True nếu input là RAW data, False nếu đã normalized
+            use_cache: False = luôn tính bằng model (warm-up, self-test)
             
         Returns:
             Tuple[prediction_class, probability]
         """
+        predictions, probabilities = self.predict_batch(input_data, is_raw=is_raw, use_cache=use_cache)
+        return predictions[0], probabilities[0]
+    
+    def predict_batch(
+        self,
+        input_data: Any,
+        is_raw: Union[bool, Sequence[bool]] = False,
+        use_cache: bool = True
+    ) -> Tuple[List[int], List[float]]:
+        """
+        Dự đoán tăng huyết áp cho nhiều dòng cùng lúc
+        
+        Scaler và predict_proba chỉ chạy một lần cho cả batch; class dự đoán
+        được lấy bằng argmax của xác suất (giống RandomForestClassifier.predict).
+        Các dòng trùng nhau chỉ được tính một lần; batch tới Config.PREDICTION_CACHE_MAX_ROWS
+        dòng còn dùng prediction cache (chỉ các dòng chưa có trong cache được tính).
+        
+        Args:
+            input_data: List request objects/dicts, DataFrame hoặc ndarray; mỗi dòng là một bệnh nhân
+            is_raw: bool cho cả batch, hoặc mask RAW/NORMALIZED theo từng dòng
+            use_cache: False = bỏ qua cache và dedup, mọi dòng đều được tính (warm-up, self-test)
+            
+        Returns:
+            Tuple[danh sách prediction_class, danh sách probability] theo thứ tự input
+        """
         if not self.is_loaded:
             raise RuntimeError("Model chưa được load. Gọi load_model() trước.")
         
-        # Tiền xử lý dữ liệu
-        processed_data = self.preprocess(input_data, is_raw=is_raw)
+        timer = StageTimer(self.model_name, is_raw)
+        matrix = self.layout.vectorize(input_data)
+        timer.lap("vectorize")
+        timer.rows(matrix.shape[0])
         
-        # Dự đoán
-        prediction = int(self.model.predict(processed_data)[0])
+        if not use_cache or matrix.shape[0] == 0 or (matrix.shape[0] == 1 and self.cache is None):
+            predictions, probability = self._predict_matrix(matrix, is_raw, timer)
+        else:
+            # Dòng trùng trong batch chỉ tính một lần; batch nhỏ còn dùng cache (cùng version)
+            raw_mask = np.broadcast_to(np.asarray(is_raw, dtype=bool), (matrix.shape[0],))
+            outputs = predict_rows(
+                self.cache,
+                self.version if self.version is not None else id(self),
+                matrix,
+                raw_mask,
+                lambda rows: np.column_stack(self._predict_matrix(matrix[rows], raw_mask[rows], timer)),
+                timer
+            )
+            predictions, probability = outputs[:, 0], outputs[:, 1]
+        
+        return [int(p) for p in predictions], [float(p) for p in probability]
+    
+    def _predict_matrix(
+        self,
+        matrix: np.ndarray,
+        is_raw: Union[bool, Sequence[bool]],
+        timer: StageTimer
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(prediction_class, probability) arrays của các dòng đã vectorize"""
+        # Lấy xác suất (compiled: dòng RAW đi qua forest đã gộp scaler, không có bước scale)
+        if self._use_compiled(matrix.shape[0]):
+            probabilities = self._compiled_proba(matrix, is_raw)
+            timer.lap("predict_proba")
+            best = probabilities.argmax(axis=1)
+            return self.compiled.classes.take(best), probabilities[np.arange(len(best)), best]
+        
+        # Tiền xử lý dữ liệu
+        processed_data = self.preprocess(matrix, is_raw=is_raw)
+        timer.lap("scale")
         
-        # Lấy xác suất
         if hasattr(self.model, "predict_proba"):
-            probabilities = self.model.predict_proba(processed_data)[0]
-            probability = float(probabilities[prediction])
-        else:
-            probability = 0.0
+            probabilities = self.model.predict_proba(processed_data)
+            timer.lap("predict_proba")
+            best = probabilities.argmax(axis=1)
+            return self.model.classes_.take(best), probabilities[np.arange(len(best)), best]
+        
+        predictions = self.model.predict(processed_data)
+        timer.lap("predict")
+        return predictions, np.zeros(len(predictions))
+    
+    def _compiled_proba(self, matrix: np.ndarray, is_raw: Union[bool, Sequence[bool]]) -> np.ndarray:
+        """Xác suất từ CompiledForest: dòng RAW dùng forest đã gộp scaler, dòng NORMALIZED dùng forest gốc"""
+        raw_mask = np.broadcast_to(np.asarray(is_raw, dtype=bool), (matrix.shape[0],))
+        if not raw_mask.any():
+            return self.compiled.predict_proba(matrix)
+        if self.compiled_raw is None:
+            return self.compiled.predict_proba(self.preprocess(matrix, is_raw=raw_mask))
+        if raw_mask.all():
+            return self.compiled_raw.predict_proba(matrix)
         
-        return prediction, probability
+        probabilities = np.empty((matrix.shape[0], len(self.compiled.classes)))
+        probabilities[raw_mask] = self.compiled_raw.predict_proba(matrix[raw_mask])
+        probabilities[~raw_mask] = self.compiled.predict_proba(matrix[~raw_mask])
+        return probabilities
+    
+    def _use_compiled(self, n_rows: int) -> bool:
+        """Chọn backend: compiled cho p99 thấp, sklearn (đa luồng) cho batch rất lớn"""
+        if self.compiled is None:
+            return False
+        if self.backend == "auto":
+            return n_rows <= Config.COMPILED_FOREST_MAX_ROWS
+        return True
     
     def get_prediction_label(self, prediction: int) -> str:
         """
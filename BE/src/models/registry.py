@@ -0,0 +1,376 @@
+"""
+Model Registry - versioned models with background load, atomic swap and rollback
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+from utils.log import fields, get_logger
+from utils.memory import process_memory
+
+
+logger = get_logger(__name__)
+
+
+# Version states
+LOADING = "loading"
+ACTIVE = "active"
+STANDBY = "standby"      # loaded, kept for rollback
+RETIRED = "retired"      # unloaded (rolled back or dropped from history)
+FAILED = "failed"
+
+
+def version_key(version: str) -> Tuple:
+    """Natural sort key; the unversioned base artifacts sort first"""
+    if version == Config.BASE_MODEL_VERSION:
+        return (0,)
+    parts = re.split(r"(\d+)", version)
+    return (1,) + tuple((0, int(part)) if part.isdigit() else (1, part) for part in parts if part)
+
+
+class ModelSpec:
+    """
+    Where the artifacts of one model live and how to build it
+
+    Version "base" (Config.BASE_MODEL_VERSION) is the unversioned file
+    in `directory`; every other version is a sub-directory
+    `directory/versions/<version>/` holding the same file names.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        model_file: str,
+        scaler_file: Optional[str],
+        factory: Callable[[str, Optional[str], str], Any],
+        warm: Optional[Callable[[Any], Any]] = None
+    ):
+        """
+        Args:
+            name: Model name (random_forest, knn_systolic, ...)
+            directory: Model directory (BE/models/<...>)
+            model_file: Model file name (.joblib)
+            scaler_file: Scaler file name (optional in each version)
+            factory: (model_path, scaler_path, version_dir) -> model instance
+            warm: Runs every prediction path of a freshly loaded model
+        """
+        self.name = name
+        self.directory = directory
+        self.model_file = model_file
+        self.scaler_file = scaler_file
+        self.factory = factory
+        self.warm = warm
+
+    def version_dir(self, version: str) -> str:
+        if version == Config.BASE_MODEL_VERSION:
+            return self.directory
+        return os.path.join(self.directory, "versions", version)
+
+    def artifact_paths(self, version: str) -> Tuple[str, Optional[str]]:
+        """(model_path, scaler_path or None) of a version"""
+        directory = self.version_dir(version)
+        scaler_path = os.path.join(directory, self.scaler_file) if self.scaler_file else None
+        if scaler_path and not os.path.exists(scaler_path):
+            scaler_path = None
+        return os.path.join(directory, self.model_file), scaler_path
+
+    def discover(self, settle_s: float = 0.0) -> List[str]:
+        """
+        Versions with a complete model file, oldest first
+
+        Args:
+            settle_s: Ignore files modified less than this many seconds ago (still being copied)
+        """
+        now = time.time()
+
+        def settled(path: str) -> bool:
+            return os.path.isfile(path) and now - os.path.getmtime(path) >= settle_s
+
+        versions = []
+        if settled(os.path.join(self.directory, self.model_file)):
+            versions.append(Config.BASE_MODEL_VERSION)
+        versions_dir = os.path.join(self.directory, "versions")
+        if os.path.isdir(versions_dir):
+            for version in os.listdir(versions_dir):
+                if settled(os.path.join(versions_dir, version, self.model_file)):
+                    versions.append(version)
+        return sorted(versions, key=version_key)
+
+
+class ModelVersion:
+    """One loaded (or failed) version of a model, with its load metrics"""
+
+    def __init__(self, name: str, version: str):
+        self.name = name
+        self.version = version
+        self.model = None
+        self.state = LOADING
+        self.load_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self.rss_delta_kb: Optional[int] = None
+        self.loaded_at: Optional[float] = None
+        self.activated_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "state": self.state,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "rss_delta_kb": self.rss_delta_kb,
+            "loaded_at": self.loaded_at,
+            "activated_at": self.activated_at,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    """
+    Active version of every model, swapped atomically
+
+    `get(name)` returns the active model object. A new version is loaded
+    and warmed up completely on the caller's (background) thread while the
+    old one keeps serving; the swap itself is a single dict assignment, so
+    a request that already holds the old object finishes on it and the
+    next `get` returns the new one. Up to `keep_versions` versions stay
+    loaded so that `rollback` is instant.
+
+    `start_watching` polls the model directories for version directories
+    not seen before and activates the newest one when it sorts after the
+    active version. A version that fails to load is recorded as FAILED and
+    the active version stays in place.
+    """
+
+    def __init__(self, specs: Dict[str, ModelSpec], keep_versions: Optional[int] = None):
+        """
+        Args:
+            specs: ModelSpec by model name
+            keep_versions: Loaded versions kept per model (active + rollback). Mặc định: Config.MODEL_KEEP_VERSIONS
+        """
+        self.specs = specs
+        self.keep_versions = max(1, keep_versions or Config.MODEL_KEEP_VERSIONS)
+        self._active: Dict[str, ModelVersion] = {}
+        self._history: Dict[str, List[ModelVersion]] = {name: [] for name in specs}
+        self._records: Dict[str, Dict[str, ModelVersion]] = {name: {} for name in specs}
+        self._seen: Dict[str, set] = {name: set() for name in specs}
+        self._locks = {name: threading.RLock() for name in specs}
+        self._listeners: List[Callable[[str, ModelVersion], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # Serving
+
+    def get(self, name: str) -> Any:
+        """Active model (loads the initial version on first use)"""
+        active = self._active.get(name)
+        if active is None:
+            with self._locks[name]:
+                active = self._active.get(name)
+                if active is None:
+                    version = self.initial_version(name)
+                    # Warm-up of the initial version is done by the startup WarmupManager
+                    active = self._swap(name, self.load(name, version, warm=False))
+        return active.model
+
+    def active_version(self, name: str) -> Optional[str]:
+        active = self._active.get(name)
+        return active.version if active else None
+
+    def active_versions(self) -> Dict[str, str]:
+        return {name: active.version for name, active in self._active.items()}
+
+    def initial_version(self, name: str) -> str:
+        """Pinned version from Config.MODEL_VERSIONS, else the newest available"""
+        spec = self.specs[name]
+        available = spec.discover()
+        self._seen[name].update(available)
+        pinned = Config.MODEL_VERSIONS.get(name)
+        if pinned:
+            return pinned
+        if not available:
+            raise FileNotFoundError(f"No artifacts for model '{name}' in {spec.directory}")
+        return available[-1]
+
+    # Loading and swapping
+
+    def load(self, name: str, version: str, warm: bool = True) -> ModelVersion:
+        """
+        Load (and warm up) one version without activating it
+
+        Raises:
+            Exception: Whatever the factory / warm-up raised (recorded as FAILED)
+        """
+        spec = self.specs[name]
+        record = ModelVersion(name, version)
+        self._records[name][version] = record
+        self._seen[name].add(version)
+        try:
+            model_path, scaler_path = spec.artifact_paths(version)
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Model file not found: {model_path}")
+
+            rss_before = process_memory().get("rss_kb")
+            start = time.perf_counter()
+            model = spec.factory(model_path, scaler_path, spec.version_dir(version))
+            record.load_ms = (time.perf_counter() - start) * 1000.0
+            rss_after = process_memory().get("rss_kb")
+            if rss_before is not None and rss_after is not None:
+                record.rss_delta_kb = rss_after - rss_before
+            model.version = version
+
+            if warm and spec.warm is not None:
+                start = time.perf_counter()
+                spec.warm(model)
+                record.warmup_ms = (time.perf_counter() - start) * 1000.0
+
+            record.model = model
+            record.loaded_at = time.time()
+            record.state = STANDBY
+            return record
+        except Exception as e:
+            record.state = FAILED
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+
+    def activate(self, name: str, version: str) -> ModelVersion:
+        """
+        Make `version` active: reuse it if still loaded, otherwise load + warm it first
+
+        Returns:
+            The now active ModelVersion
+        """
+        with self._locks[name]:
+            active = self._active.get(name)
+            if active is not None and active.version == version:
+                return active
+            record = next((r for r in self._history[name] if r.version == version), None)
+            if record is not None:
+                self._history[name].remove(record)
+            else:
+                record = self.load(name, version)
+            return self._swap(name, record)
+
+    def rollback(self, name: str) -> ModelVersion:
+        """
+        Switch back to the previously active version (kept loaded)
+
+        Raises:
+            ValueError: If there is no previous version
+        """
+        with self._locks[name]:
+            if not self._history[name]:
+                raise ValueError(f"No previous version of '{name}' to roll back to")
+            previous = self._history[name].pop()
+            current = self._active.get(name)
+            self._swap(name, previous, keep_current=False)
+            if current is not None:
+                current.state = RETIRED
+                current.model = None
+            return previous
+
+    def reload(self, name: str) -> ModelVersion:
+        """Load the active version again from disk and swap it in"""
+        with self._locks[name]:
+            version = self.active_version(name) or self.initial_version(name)
+            return self._swap(name, self.load(name, version))
+
+    def _swap(self, name: str, record: ModelVersion, keep_current: bool = True) -> ModelVersion:
+        current = self._active.get(name)
+        record.state = ACTIVE
+        record.activated_at = time.time()
+        self._active[name] = record
+
+        if current is not None and current is not record and keep_current:
+            if current.version == record.version:
+                # reload(): the old copy of the same version is no rollback target
+                current.state = RETIRED
+                current.model = None
+            else:
+                current.state = STANDBY
+                history = self._history[name]
+                history.append(current)
+                # Drop the oldest versions beyond keep_versions (freed once in-flight requests finish)
+                while len(history) > self.keep_versions - 1:
+                    retired = history.pop(0)
+                    retired.state = RETIRED
+                    retired.model = None
+
+        for listener in list(self._listeners):
+            try:
+                listener(name, record)
+            except Exception:
+                logger.exception("Model swap listener failed", extra=fields(model=name, version=record.version))
+        return record
+
+    def add_listener(self, listener: Callable[[str, ModelVersion], None]) -> None:
+        """listener(name, new_active_record) is called after every swap"""
+        self._listeners.append(listener)
+
+    # Watching
+
+    def poll(self) -> Dict[str, str]:
+        """
+        Activate new versions that appeared on disk
+
+        Returns:
+            {name: version} of the versions activated by this poll
+        """
+        activated = {}
+        for name, spec in self.specs.items():
+            if name not in self._active:
+                continue
+            new = [v for v in spec.discover(Config.MODEL_WATCH_SETTLE_S) if v not in self._seen[name]]
+            if not new:
+                continue
+            self._seen[name].update(new)
+            candidate = max(new, key=version_key)
+            if version_key(candidate) <= version_key(self.active_version(name)):
+                continue
+            try:
+                self.activate(name, candidate)
+                activated[name] = candidate
+                logger.info("Activated model version", extra=fields(model=name, version=candidate))
+            except Exception:
+                logger.exception("Failed to load model version", extra=fields(model=name, version=candidate))
+        return activated
+
+    def start_watching(self, interval_s: Optional[float] = None) -> None:
+        """Poll the model directories in a background thread"""
+        if self._watcher is not None:
+            return
+        interval = interval_s or Config.MODEL_WATCH_INTERVAL_S
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.poll()
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    # Reporting
+
+    def status(self) -> Dict[str, Any]:
+        """Active version, rollback candidates, available versions and per-version metrics"""
+        result = {}
+        for name, spec in self.specs.items():
+            result[name] = {
+                "active_version": self.active_version(name),
+                "rollback_versions": [r.version for r in reversed(self._history[name])],
+                "available_versions": spec.discover(),
+                "versions": {
+                    version: record.status()
+                    for version, record in sorted(self._records[name].items(), key=lambda item: version_key(item[0]))
+                },
+            }
+        return result
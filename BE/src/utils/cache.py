@@ -0,0 +1,299 @@
+"""
+Prediction cache - exact LRU + TTL cache of model outputs per vectorized row
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from config import Config
+from utils.metrics import CACHE_REQUESTS, CACHE_EVICTIONS, CACHE_BYTES, StageTimer
+
+
+# Approximate bytes per entry besides the row and output bytes (dict slot, tuples, bytes headers)
+ENTRY_OVERHEAD = 200
+
+# Entries looked up / inserted per lock acquisition, so that single-row requests
+# never wait behind the whole key loop of a large batch
+LOCK_SLICE = 256
+
+
+def unique_rows(matrix: np.ndarray, raw_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distinct rows of a batch (the is_raw flag is part of the row, -0.0 == 0.0)
+
+    Every row is hashed to one uint64 and the hashes go through np.unique;
+    the grouping is then checked against the rows themselves, and on a hash
+    collision the exact (much slower) np.unique(..., axis=0) is used.
+
+    Returns:
+        (first index of every distinct row in input order, index of every row into those)
+    """
+    n_rows, n_features = matrix.shape
+    if n_rows <= 1:
+        return np.arange(n_rows), np.zeros(n_rows, dtype=np.intp)
+    values = np.asarray(matrix, dtype=np.float64) + 0.0
+    raw_mask = np.asarray(raw_mask, dtype=bool)
+    weights = np.random.default_rng(n_features).integers(1, 2 ** 63, size=n_features + 1, dtype=np.uint64) | np.uint64(1)
+    codes = values.view(np.uint64) @ weights[:-1] + raw_mask * weights[-1]
+    _, positions, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    if len(positions) < n_rows and not (
+        np.array_equal(values[positions[inverse]], values) and np.array_equal(raw_mask[positions[inverse]], raw_mask)
+    ):
+        rows = np.column_stack([values, raw_mask])
+        _, positions, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    # Distinct rows in order of first occurrence
+    order = np.argsort(positions)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return positions[order], rank[inverse]
+
+
+def predict_rows(
+    cache: Optional["PredictionCache"],
+    version: Hashable,
+    matrix: np.ndarray,
+    raw_mask: np.ndarray,
+    compute: Callable[[np.ndarray], Any],
+    timer: Optional[StageTimer] = None
+) -> np.ndarray:
+    """
+    Outputs of every row, identical rows computed once
+
+    Batches of up to Config.PREDICTION_CACHE_MAX_ROWS rows go through the
+    cache (if enabled). Larger batches skip it, so bulk scoring neither pays
+    for the key bookkeeping nor evicts the entries of single-row traffic;
+    they are still deduplicated.
+
+    Args:
+        cache: PredictionCache of the model, None = disabled
+        compute: compute(rows) -> outputs (one row each) of matrix[rows]; rows is an
+            index array, or slice(None) when the batch has no duplicates
+
+    Returns:
+        float64 array (n_rows, n_outputs) in input order
+    """
+    if cache is not None and matrix.shape[0] <= Config.PREDICTION_CACHE_MAX_ROWS:
+        return cache.get_or_compute(version, matrix, raw_mask, compute, timer)
+    positions, inverse = unique_rows(matrix, raw_mask)
+    if timer is not None:
+        timer.lap("dedup")
+    if len(positions) == matrix.shape[0]:
+        return np.asarray(compute(slice(None)), dtype=np.float64).reshape(len(positions), -1)
+    outputs = np.asarray(compute(positions), dtype=np.float64).reshape(len(positions), -1)
+    return outputs[inverse]
+
+
+def row_keys(matrix: np.ndarray, raw_mask: np.ndarray) -> List[bytes]:
+    """
+    Canonical key of every row: float64 features followed by the is_raw flag
+
+    A raw row and a normalized row with the same numbers are different
+    inputs, so the flag is part of the key; "+ 0.0" folds -0.0 into 0.0.
+    """
+    rows = np.empty((matrix.shape[0], matrix.shape[1] + 1), dtype=np.float64)
+    rows[:, :-1] = matrix
+    rows[:, -1] = raw_mask
+    rows += 0.0
+    return _split_bytes(rows)
+
+
+def _split_bytes(array: np.ndarray) -> List[bytes]:
+    # One tobytes() and slices: much cheaper than tobytes() per row view
+    data = array.tobytes()
+    width = array.shape[1] * array.itemsize
+    return [data[start:start + width] for start in range(0, len(data), width)]
+
+
+class PredictionCache:
+    """
+    Bounded cache of one model's outputs, keyed on (model version, row key)
+
+    Outputs are stored as float64 bytes, so a hit returns exactly what the
+    model computed. Entries leave the cache least recently used first once
+    `max_bytes` is exceeded, when older than `ttl_s`, or all at once on
+    clear() (model swap). Thread-safe: the lock is taken per LOCK_SLICE
+    entries for the lookups and the inserts, never while the model runs.
+    """
+
+    def __init__(self, model: str, max_bytes: int, ttl_s: Optional[float] = None):
+        """
+        Args:
+            model: Model name (label of the cache metrics)
+            max_bytes: Memory cap (approximate: keys, outputs and bookkeeping)
+            ttl_s: Seconds an entry stays valid; None / 0 = until evicted
+        """
+        self.model = model
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s or None
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple[Hashable, bytes], Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hit": 0, "miss": 0, "duplicate": 0, "size": 0, "expired": 0, "invalidated": 0}
+
+    def get_or_compute(
+        self,
+        version: Hashable,
+        matrix: np.ndarray,
+        raw_mask: np.ndarray,
+        compute: Callable[[np.ndarray], Any],
+        timer: Optional[StageTimer] = None
+    ) -> np.ndarray:
+        """
+        Outputs of every row: cached ones are reused, identical rows are computed once
+
+        Args:
+            version: Model version (or any token that changes with the model)
+            matrix: Vectorized rows (n_rows, n_features)
+            raw_mask: is_raw of every row
+            compute: compute(row indices) -> (len(indices), n_outputs) outputs of
+                those rows of `matrix`, called at most once with the distinct uncached rows
+            timer: StageTimer of the call (cache_lookup / cache_store laps)
+
+        Returns:
+            float64 array (n_rows, n_outputs) in input order
+        """
+        positions, inverse = unique_rows(matrix, raw_mask)
+        unique = row_keys(matrix[positions], raw_mask[positions])
+
+        found: List[Optional[bytes]] = [None] * len(unique)
+        now = time.monotonic()
+        for start in range(0, len(unique), LOCK_SLICE):
+            with self._lock:
+                for i in range(start, min(start + LOCK_SLICE, len(unique))):
+                    entry_key = (version, unique[i])
+                    entry = self._entries.get(entry_key)
+                    if entry is None:
+                        continue
+                    if entry[0] is not None and entry[0] <= now:
+                        self._remove(entry_key, "expired")
+                        continue
+                    self._entries.move_to_end(entry_key)
+                    found[i] = entry[1]
+        missing = [i for i, blob in enumerate(found) if blob is None]
+        hits = [i for i, blob in enumerate(found) if blob is not None]
+        with self._lock:
+            self._count("hit", len(hits))
+            self._count("miss", len(missing))
+            self._count("duplicate", len(matrix) - len(unique))
+        if timer is not None:
+            timer.lap("cache_lookup")
+
+        values = None
+        if hits:
+            stored = np.frombuffer(b"".join(found[i] for i in hits), dtype=np.float64)
+            stored = stored.reshape(len(hits), -1)
+            values = np.empty((len(unique), stored.shape[1]), dtype=np.float64)
+            values[hits] = stored
+        if missing:
+            computed = np.asarray(compute(positions[missing]), dtype=np.float64).reshape(len(missing), -1)
+            if values is None:
+                values = np.empty((len(unique), computed.shape[1]), dtype=np.float64)
+            values[missing] = computed
+            self._store(version, [unique[i] for i in missing], computed)
+            if timer is not None:
+                timer.lap("cache_store")
+        if values is None:
+            return np.empty((0, 0), dtype=np.float64)
+        return values[inverse]
+
+    def _store(self, version: Hashable, keys: List[bytes], outputs: np.ndarray) -> None:
+        expires = time.monotonic() + self.ttl_s if self.ttl_s else None
+        blobs = _split_bytes(outputs)
+        size = len(keys[0]) + len(blobs[0]) + ENTRY_OVERHEAD
+        for start in range(0, len(keys), LOCK_SLICE):
+            with self._lock:
+                for key, blob in zip(keys[start:start + LOCK_SLICE], blobs[start:start + LOCK_SLICE]):
+                    entry_key = (version, key)
+                    if entry_key in self._entries:
+                        # Computed concurrently by another batch
+                        self._remove(entry_key, None)
+                    self._entries[entry_key] = (expires, blob)
+                    self.bytes += size
+                while self.bytes > self.max_bytes and self._entries:
+                    self._remove(next(iter(self._entries)), "size")
+
+    def _remove(self, entry_key: Tuple[Hashable, bytes], reason: Optional[str]) -> None:
+        # Caller holds the lock
+        _, blob = self._entries.pop(entry_key)
+        self.bytes -= len(entry_key[1]) + len(blob) + ENTRY_OVERHEAD
+        if reason is not None:
+            self._count(reason, 1)
+
+    def _count(self, result: str, amount: int) -> None:
+        # Caller holds the lock
+        if not amount:
+            return
+        self._counts[result] += amount
+        if result in ("hit", "miss", "duplicate"):
+            CACHE_REQUESTS.inc(self.model, result, amount=amount)
+        else:
+            CACHE_EVICTIONS.inc(self.model, result, amount=amount)
+
+    def clear(self) -> None:
+        """Drop every entry (model swap)"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+            self._count("invalidated", count)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counts["hit"] + self._counts["miss"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self._counts["hit"],
+            "misses": self._counts["miss"],
+            "duplicates": self._counts["duplicate"],
+            "hit_rate": self._counts["hit"] / lookups if lookups else 0.0,
+            "evictions": {reason: self._counts[reason] for reason in ("size", "expired", "invalidated")},
+        }
+
+
+# One cache per model name, shared by all loaded versions of that model
+_caches: Dict[str, PredictionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_prediction_cache(model: str) -> Optional[PredictionCache]:
+    """
+    Cache of a model (created on first use)
+
+    Returns:
+        PredictionCache, or None if Config.PREDICTION_CACHE_ENABLED is off
+    """
+    if not Config.PREDICTION_CACHE_ENABLED or Config.PREDICTION_CACHE_MAX_BYTES <= 0:
+        return None
+    with _caches_lock:
+        cache = _caches.get(model)
+        if cache is None:
+            cache = _caches[model] = PredictionCache(
+                model, Config.PREDICTION_CACHE_MAX_BYTES, Config.PREDICTION_CACHE_TTL_S
+            )
+        return cache
+
+
+def clear_prediction_caches(model: Optional[str] = None) -> None:
+    """Drop the cached outputs of one model (or of all models)"""
+    with _caches_lock:
+        caches = [_caches[model]] if model in _caches else list(_caches.values()) if model is None else []
+    for cache in caches:
+        cache.clear()
+
+
+def prediction_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """stats() of every cache created so far"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+CACHE_BYTES.set_function(lambda: {(name,): cache.bytes for name, cache in list(_caches.items())})
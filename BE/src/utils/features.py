@@ -0,0 +1,197 @@
+"""
+Feature layout - map request fields straight into float64 NumPy matrices
+"""
+from itertools import chain
+from operator import attrgetter, itemgetter
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+import numpy as np
+
+
+# Request field name -> column name used when the models were trained
+FIELD_ALIASES = {
+    'Diabetes_Type2': 'Diabetes_Type 2 Diabetes',
+    'Cerebral_infarction_infarction': 'Cerebral_infarction_cerebral infarction',
+    'Cerebrovascular_None': 'Cerebrovascular_disease_None',
+    'Cerebrovascular_disease': 'Cerebrovascular_disease_cerebrovascular disease',
+    'Cerebrovascular_insuff': 'Cerebrovascular_disease_insufficiency of cerebral blood supply',
+}
+
+_COLUMN_TO_FIELD = {column: field for field, column in FIELD_ALIASES.items()}
+
+# One-hot groups (request field names): every row sets exactly one field of each group
+ONE_HOT_GROUPS = {
+    'Diabetes': ('Diabetes_Diabetes', 'Diabetes_None', 'Diabetes_Type2'),
+    'Cerebral_infarction': ('Cerebral_infarction_None', 'Cerebral_infarction_infarction'),
+    'Cerebrovascular': ('Cerebrovascular_None', 'Cerebrovascular_disease', 'Cerebrovascular_insuff'),
+}
+
+# Offending row indices listed in a validation message
+MAX_REPORTED_ROWS = 10
+
+
+def rows_message(rows: np.ndarray) -> str:
+    """'rows 3, 7 (+12 more)' for the indices of invalid rows"""
+    shown = ", ".join(str(i) for i in rows[:MAX_REPORTED_ROWS])
+    more = f" (+{len(rows) - MAX_REPORTED_ROWS} more)" if len(rows) > MAX_REPORTED_ROWS else ""
+    return f"rows {shown}{more}"
+
+
+class FeatureLayout:
+    """
+    Precompiled input layout of one model
+
+    Built once per model: the column order, the request field feeding each
+    column and the indices of the scaled columns. `vectorize` then turns
+    request objects, dicts, DataFrames or arrays into an (n_rows, n_features)
+    float64 matrix in training order without building a DataFrame.
+    """
+
+    def __init__(self, columns: Sequence[str], scaled_columns: Sequence[str], strict: bool = True):
+        """
+        Args:
+            columns: Feature names in training order (training names, not request names)
+            scaled_columns: Columns standardized by the model's scaler, in scaler order
+            strict: If True, missing features raise ValueError; otherwise they default to 0
+        """
+        self.columns = list(columns)
+        self.fields = [_COLUMN_TO_FIELD.get(column, column) for column in self.columns]
+        self.n_features = len(self.columns)
+        self.strict = strict
+
+        # Position of every column, addressable by training name or request name
+        self.index: Dict[str, int] = {}
+        for i, (column, field) in enumerate(zip(self.columns, self.fields)):
+            self.index[column] = i
+            self.index[field] = i
+
+        # Column indices of the one-hot groups in this layout (group order = ONE_HOT_GROUPS order)
+        self.groups: Dict[str, np.ndarray] = {
+            group: np.array([self.index[field] for field in fields], dtype=np.intp)
+            for group, fields in ONE_HOT_GROUPS.items()
+            if all(field in self.index for field in fields)
+        }
+
+        self.scaled_columns = list(scaled_columns)
+        self.scaled_idx = np.array([self.index[column] for column in self.scaled_columns], dtype=np.intp)
+
+        # Scaler statistics, set by bind_scaler()
+        self.mean: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+        self._get_fields = attrgetter(*self.fields)
+        self._get_items = itemgetter(*self.fields)
+
+    def bind_scaler(self, scaler) -> None:
+        """
+        Copy the statistics of a fitted StandardScaler for the scaled columns
+
+        Raises:
+            ValueError: If the scaler was fitted on other columns
+        """
+        names = getattr(scaler, 'feature_names_in_', None)
+        if names is not None and list(names) != self.scaled_columns:
+            raise ValueError(f"Scaler columns {list(names)} do not match {self.scaled_columns}")
+        n = len(self.scaled_columns)
+        mean = scaler.mean_ if getattr(scaler, 'with_mean', True) and scaler.mean_ is not None else np.zeros(n)
+        scale = scaler.scale_ if getattr(scaler, 'with_std', True) and scaler.scale_ is not None else np.ones(n)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def check_estimator(self, estimator) -> None:
+        """
+        Verify that an estimator was fitted on this column order
+
+        Raises:
+            ValueError: If the fitted feature names differ from the layout
+        """
+        names = getattr(estimator, 'feature_names_in_', None)
+        if names is not None and list(names) != self.columns:
+            raise ValueError(f"Model columns {list(names)} do not match {self.columns}")
+        n_features = getattr(estimator, 'n_features_in_', self.n_features)
+        if n_features != self.n_features:
+            raise ValueError(f"Model expects {n_features} features, layout has {self.n_features}")
+
+    def vectorize(self, rows: Any) -> np.ndarray:
+        """
+        Build the feature matrix for one or many rows
+
+        Args:
+            rows: A request object or dict (one row), a list of them, a DataFrame,
+                or an array already in layout order
+
+        Returns:
+            New float64 array of shape (n_rows, n_features)
+        """
+        if isinstance(rows, np.ndarray):
+            matrix = np.array(rows, dtype=np.float64, ndmin=2)
+            if matrix.shape[1] != self.n_features:
+                raise ValueError(f"Expected {self.n_features} features, got {matrix.shape[1]}")
+            return matrix
+        if hasattr(rows, 'columns') and hasattr(rows, 'to_numpy'):
+            return self._from_frame(rows)
+        if isinstance(rows, Mapping) or not isinstance(rows, Sequence):
+            rows = [rows]
+
+        n_rows = len(rows)
+        getter = self._get_items if n_rows and isinstance(rows[0], Mapping) else self._get_fields
+        try:
+            values = chain.from_iterable(map(getter, rows))
+            flat = np.fromiter(values, dtype=np.float64, count=n_rows * self.n_features)
+        except (KeyError, AttributeError):
+            flat = np.fromiter(
+                chain.from_iterable(self._row_values(row) for row in rows),
+                dtype=np.float64,
+                count=n_rows * self.n_features
+            )
+        return flat.reshape(n_rows, self.n_features)
+
+    def scale_rows(self, matrix: np.ndarray, raw_mask: Union[bool, Sequence[bool]] = True) -> np.ndarray:
+        """
+        Standardize the scaled columns of raw rows in place
+
+        Args:
+            matrix: Feature matrix from vectorize()
+            raw_mask: True/False for all rows, or a per-row mask
+
+        Returns:
+            The same matrix
+        """
+        if self.mean is None:
+            raise ValueError(
+                "Cannot process raw input: scaler not found. "
+                "Please provide normalized input or ensure the scaler file exists."
+            )
+        raw_mask = np.broadcast_to(np.asarray(raw_mask, dtype=bool), (matrix.shape[0],))
+        cols = self.scaled_idx
+        if raw_mask.all():
+            matrix[:, cols] = (matrix[:, cols] - self.mean) / self.scale
+        elif raw_mask.any():
+            rows = np.flatnonzero(raw_mask)[:, None]
+            matrix[rows, cols] = (matrix[rows, cols] - self.mean) / self.scale
+        return matrix
+
+    def _row_values(self, row: Any) -> List[float]:
+        """Slow path for rows with missing fields or training-name keys"""
+        values = []
+        for column, field in zip(self.columns, self.fields):
+            if isinstance(row, Mapping):
+                value = row.get(field, row.get(column))
+            else:
+                value = getattr(row, field, None)
+            if value is None:
+                if self.strict:
+                    raise ValueError(f"Missing feature: {field}")
+                value = 0.0
+            values.append(value)
+        return values
+
+    def _from_frame(self, frame) -> np.ndarray:
+        """Pick the layout columns out of a DataFrame (request or training names)"""
+        matrix = np.zeros((len(frame), self.n_features), dtype=np.float64)
+        for i, (column, field) in enumerate(zip(self.columns, self.fields)):
+            name = field if field in frame.columns else column
+            if name in frame.columns:
+                matrix[:, i] = frame[name].to_numpy(dtype=np.float64)
+            elif self.strict:
+                raise ValueError(f"Missing feature: {field}")
+        return matrix
@@ -0,0 +1,253 @@
+"""
+Structured logging - JSON lines written by a background thread
+
+A log call only builds the LogRecord, stamps the current request id and
+puts it on a bounded queue (QueueHandler, put_nowait). One QueueListener
+thread per process formats and writes the records, so request handlers
+and inference workers never wait on stdout / stderr. When the queue is
+full the record is dropped and counted instead of blocking the caller.
+
+    logger = get_logger(__name__)
+    logger.info("Activated model version", extra=fields(model="knn_systolic", version="v2"))
+    debug_sampled(logger, "Scaled raw rows", rows=64)   # hot path: Config.LOG_DEBUG_SAMPLE_RATE
+
+Loggers live under the "bp" namespace and do not propagate to the root
+logger (uvicorn's own loggers are left alone).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, TextIO
+from config import Config
+from utils.metrics import LOG_DROPPED
+
+
+ROOT_LOGGER = "bp"
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Id of the request being handled (set by RequestIdMiddleware, copied into executor threads)
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not structured fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id", "fields"}
+
+
+def fields(**values: Any) -> Dict[str, Dict[str, Any]]:
+    """`extra` of a log call carrying structured fields: logger.info(msg, extra=fields(rows=10))"""
+    return {"fields": values}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "bp" namespace (utils.log.get_logger(__name__))"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def debug_sampled(logger: logging.Logger, msg: str, **values: Any) -> None:
+    """
+    DEBUG record for hot-path events, kept with probability Config.LOG_DEBUG_SAMPLE_RATE
+
+    Costs one isEnabledFor() check when DEBUG is off (the default).
+    """
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < Config.LOG_DEBUG_SAMPLE_RATE:
+        logger.debug(msg, extra={"fields": dict(values, sample_rate=Config.LOG_DEBUG_SAMPLE_RATE)})
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, request_id, structured fields, exc"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(getattr(record, "fields", None) or {})
+        # extra={...} keys passed without fields()
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with the structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = dict(getattr(record, "fields", None) or {})
+        if getattr(record, "request_id", None):
+            extra["request_id"] = record.request_id
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: stamps the request id, drops (and counts) on a full queue"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Runs in the caller's context: the request id is read here, not in the listener thread
+        record.request_id = request_id.get()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # Message merged with its args now (args may not be safe to read later); record.fields stays
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Pipeline:
+    """Queue handler + listener thread of this process"""
+
+    def __init__(self, level: str, fmt: str, stream: TextIO, queue_size: int):
+        self.settings = (level, fmt, stream, queue_size)
+        self.pid = os.getpid()
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, output, respect_handler_level=False)
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        for handler in list(logger.handlers):
+            if isinstance(handler, DroppingQueueHandler):
+                logger.removeHandler(handler)
+        logger.addHandler(self.handler)
+        logger.setLevel(level)
+        logger.propagate = False
+        self.listener.start()
+        self.running = True
+
+    def stop(self) -> None:
+        """Write the queued records and stop the thread"""
+        logging.getLogger(ROOT_LOGGER).removeHandler(self.handler)
+        # The thread only exists in the process that started it
+        if self.running and self.pid == os.getpid():
+            self.listener.stop()
+        self.running = False
+
+
+_pipeline: Optional[_Pipeline] = None
+_lock = threading.Lock()
+
+
+def configure(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    stream: Optional[TextIO] = None,
+    queue_size: Optional[int] = None
+) -> None:
+    """
+    Install the queue-based pipeline on the "bp" logger (idempotent per process)
+
+    Args:
+        level: Mặc định Config.LOG_LEVEL
+        fmt: "json" hoặc "text". Mặc định Config.LOG_FORMAT
+        stream: Output. Mặc định sys.stderr
+        queue_size: Records waiting for the writer thread. Mặc định Config.LOG_QUEUE_SIZE
+    """
+    global _pipeline
+    settings = (
+        (level or Config.LOG_LEVEL).upper(),
+        fmt or Config.LOG_FORMAT,
+        stream or sys.stderr,
+        queue_size or Config.LOG_QUEUE_SIZE
+    )
+    with _lock:
+        if _pipeline is not None:
+            if _pipeline.settings == settings and _pipeline.pid == os.getpid():
+                return
+            _pipeline.stop()
+        _pipeline = _Pipeline(*settings)
+
+
+def shutdown() -> None:
+    """Flush and stop the writer thread (also run at exit)"""
+    global _pipeline
+    with _lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            _pipeline = None
+
+
+def stats() -> Dict[str, Any]:
+    """Queue depth and dropped records of this process"""
+    if _pipeline is None:
+        return {"configured": False}
+    return {"configured": True, "queued": _pipeline.queue.qsize(), "dropped": _pipeline.handler.dropped}
+
+
+LOG_DROPPED.set_function(lambda: {(): _pipeline.handler.dropped if _pipeline is not None else 0})
+
+
+def _after_fork_in_child() -> None:
+    # The listener thread does not survive fork(): forked workers (run_server --workers,
+    # process executor) get their own queue and thread
+    global _pipeline, _lock
+    _lock = threading.Lock()
+    if _pipeline is not None:
+        settings = _pipeline.settings
+        _pipeline = None
+        configure(*settings)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every HTTP request an id
+
+    Uses the X-Request-ID header when the client sends one, otherwise a
+    random 16-hex id; the id is stored in `request_id` for the log records
+    and echoed in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rid = next((value.decode("latin-1") for key, value in scope["headers"] if key == REQUEST_ID_HEADER), None)
+        rid = rid[:64] if rid else os.urandom(8).hex()
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(shutdown)
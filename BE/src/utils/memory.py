@@ -0,0 +1,75 @@
+"""
+Memory report - RSS / shared / private pages của một process (Linux /proc)
+"""
+import os
+from typing import Dict, Iterable, Optional
+
+
+# smaps_rollup fields reported, in kB
+SMAPS_FIELDS = {
+    "Rss": "rss_kb",
+    "Pss": "pss_kb",
+    "Shared_Clean": "shared_clean_kb",
+    "Shared_Dirty": "shared_dirty_kb",
+    "Private_Clean": "private_clean_kb",
+    "Private_Dirty": "private_dirty_kb",
+}
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """
+    Resident memory of a process, split into shared and private pages
+
+    Args:
+        pid: Process id (mặc định: process hiện tại)
+
+    Returns:
+        Dict with rss_kb, pss_kb, shared_kb, private_kb (and the raw
+        smaps_rollup fields). Only rss_kb is available when smaps_rollup
+        cannot be read (older kernels, other OSes: empty dict).
+    """
+    pid = pid or os.getpid()
+    memory: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    memory[SMAPS_FIELDS[name]] = int(rest.split()[0])
+    except OSError:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        memory["rss_kb"] = int(line.split()[1])
+        except OSError:
+            return {}
+        return memory
+
+    memory["shared_kb"] = memory.get("shared_clean_kb", 0) + memory.get("shared_dirty_kb", 0)
+    memory["private_kb"] = memory.get("private_clean_kb", 0) + memory.get("private_dirty_kb", 0)
+    return memory
+
+
+def format_memory_report(processes: Iterable[tuple]) -> str:
+    """
+    Bảng RSS / PSS / shared / private cho nhiều process
+
+    Args:
+        processes: (label, pid) pairs
+
+    Returns:
+        Multi-line table (MB); the last line sums PSS, i.e. the real total footprint
+    """
+    lines = [f"{'process':<12} {'pid':>7} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}"]
+    total_pss = 0
+    for label, pid in processes:
+        memory = process_memory(pid)
+        total_pss += memory.get("pss_kb", memory.get("rss_kb", 0))
+        lines.append(
+            f"{label:<12} {pid:>7} "
+            f"{memory.get('rss_kb', 0) / 1024:>9.1f} {memory.get('pss_kb', 0) / 1024:>9.1f} "
+            f"{memory.get('shared_kb', 0) / 1024:>10.1f} {memory.get('private_kb', 0) / 1024:>11.1f}"
+        )
+    lines.append(f"{'total (PSS)':<20} {total_pss / 1024:>17.1f}")
+    return "\n".join(lines)
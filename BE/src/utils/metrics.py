@@ -0,0 +1,247 @@
+"""
+Metrics - counters và histograms xuất theo Prometheus text format
+
+Recording is lock-free: every thread writes to its own shard (a dict of
+label tuple -> counts) and /metrics sums the shards when scraped. A lock
+is only taken the first time a thread records into a metric. An
+observation costs a dict lookup, a bisect and two list increments
+(about a microsecond).
+
+Metrics live in the process that records them. With
+INFERENCE_EXECUTOR="process" the model stages are recorded in the pool
+workers and do not show up here; with pre-forked server workers every
+worker exposes its own /metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple, Union
+
+
+# Seconds; covers a few µs (vectorize of one row) up to large batches
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Rows per model call (also the buckets of /batching/stats)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 100000)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _ShardedMetric:
+    """Per-thread shards of {label values: counts}; summed on collect()"""
+
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], list]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[Tuple[str, ...], list]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def collect(self) -> Dict[Tuple[str, ...], list]:
+        """Counts per label values, summed over all threads"""
+        with self._lock:
+            shards = list(self._shards)
+        merged: Dict[Tuple[str, ...], list] = {}
+        for shard in shards:
+            for labels, counts in list(shard.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(counts)
+                else:
+                    for i, count in enumerate(counts):
+                        total[i] += count
+        return merged
+
+    def reset(self) -> None:
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def _labels(self, labels: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for labels, counts in sorted(self.collect().items()):
+            lines.extend(self._render_series(labels, counts))
+        return lines
+
+    def _render_series(self, labels: Tuple[str, ...], counts: list) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_ShardedMetric):
+    """Monotonic counter"""
+
+    TYPE = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shard()
+        counts = shard.get(labels)
+        if counts is None:
+            counts = shard[labels] = [0]
+        counts[0] += amount
+
+    def value(self, *labels: str) -> float:
+        return self.collect().get(labels, [0])[0]
+
+    def _render_series(self, labels, counts):
+        return [f"{self.name}{self._labels(labels)} {_format_value(counts[0])}"]
+
+
+class Histogram(_ShardedMetric):
+    """Histogram with fixed upper bounds (le); +Inf and sum are added on render"""
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        counts = shard.get(labels)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum
+            counts = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def count(self, *labels: str) -> int:
+        counts = self.collect().get(labels)
+        return sum(counts[:-1]) if counts else 0
+
+    def _render_series(self, labels, counts):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+            cumulative += count
+            le = 'le="%s"' % _format_value(bound)
+            lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(labels)} {_format_value(counts[-1])}")
+        lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depth, in-flight calls, ...)"""
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._callbacks = []
+
+    def set_function(self, fn) -> None:
+        """fn() -> {label values tuple: value}"""
+        self._callbacks = [fn]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for fn in self._callbacks:
+            for labels, value in sorted(fn().items()):
+                pairs = ",".join(f'{name}="{_escape(v)}"' for name, v in zip(self.labelnames, labels))
+                series = f"{self.name}{{{pairs}}}" if pairs else self.name
+                lines.append(f"{series} {_format_value(value)}")
+        return lines
+
+
+# Metrics of the API
+STAGE_SECONDS = Histogram(
+    "bp_stage_duration_seconds",
+    "Time spent per request stage (validation, vectorize, scale, predict_proba, kneighbors, handler, serialization)",
+    ("stage", "model", "input_type")
+)
+BATCH_ROWS = Histogram(
+    "bp_batch_size_rows",
+    "Rows per model call (micro-batches and batch requests)",
+    ("model",),
+    buckets=BATCH_SIZE_BUCKETS
+)
+ERRORS = Counter("bp_errors_total", "Requests answered with an error status", ("model", "status"))
+CACHE_REQUESTS = Counter(
+    "bp_cache_requests_total", "Prediction cache lookups per row (hit, miss, duplicate within a batch)", ("model", "result")
+)
+CACHE_EVICTIONS = Counter(
+    "bp_cache_evictions_total", "Prediction cache entries removed (size, expired, invalidated)", ("model", "reason")
+)
+CACHE_BYTES = Gauge("bp_cache_bytes", "Approximate memory held by the prediction cache", ("model",))
+INFERENCE_QUEUE = Gauge("bp_inference_queue_depth", "Model calls waiting for an inference worker")
+LOG_DROPPED = Gauge("bp_log_records_dropped", "Log records dropped because the log queue was full (this process)")
+
+METRICS = [STAGE_SECONDS, BATCH_ROWS, ERRORS, CACHE_REQUESTS, CACHE_EVICTIONS, CACHE_BYTES, INFERENCE_QUEUE, LOG_DROPPED]
+
+
+def input_type(is_raw: Union[bool, Sequence[bool]]) -> str:
+    """'raw', 'normalized' or 'mixed' for a request flag or a per-row mask"""
+    if isinstance(is_raw, (list, tuple)):
+        if all(is_raw):
+            return "raw"
+        return "mixed" if any(is_raw) else "normalized"
+    if getattr(is_raw, "ndim", 0):
+        if is_raw.all():
+            return "raw"
+        return "mixed" if is_raw.any() else "normalized"
+    return "raw" if is_raw else "normalized"
+
+
+class StageTimer:
+    """
+    Consecutive stage timings of one model call
+
+        timer = StageTimer("random_forest", is_raw)
+        matrix = layout.vectorize(rows)
+        timer.lap("vectorize")      # time since the previous lap (or creation)
+    """
+
+    __slots__ = ("model", "input_type", "last")
+
+    def __init__(self, model: str, is_raw: Union[bool, Sequence[bool]]):
+        self.model = model
+        self.input_type = input_type(is_raw)
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self.last, stage, self.model, self.input_type)
+        self.last = now
+
+    def rows(self, n_rows: int) -> None:
+        BATCH_ROWS.observe(n_rows, self.model)
+
+
+def render() -> str:
+    """Every metric in Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,375 @@
+"""
+On-demand profiling - cProfile per request and a stack sampler for time windows
+
+Per request (cProfile): a prediction request is profiled when
+- it sends `X-Profile: 1` with a valid X-Admin-Token (never without Config.ADMIN_TOKEN),
+- an admin asked for the next N requests (POST /admin/profiling/requests), or
+- it is drawn by Config.PROFILE_SAMPLE_RATE.
+The profiler covers the route handler on the event loop and the model
+calls it sends to the thread inference executor. Before Python 3.12 a
+cProfile profiler only sees the thread that enabled it, so each worker
+call gets its own profiler and the stats are merged. From 3.12 cProfile
+runs on sys.monitoring: there is a single profiler per process, it
+already sees every thread, and a second one cannot be enabled.
+Only one request is profiled at a time, and whatever else runs meanwhile
+(the event loop between awaits, other threads from 3.12) is included.
+Process executors and micro-batched model calls of other requests are
+not profiled (a profiled single-row request skips the micro-batcher).
+
+Each profile is written to Config.PROFILE_DIR as <name>.prof (pstats, for
+snakeviz / pstats) and <name>.json (request metadata and top functions);
+the .json is renamed into place last, so it marks a complete profile.
+
+Time window (stack sampler): StackSampler reads sys._current_frames()
+every Config.PROFILE_SAMPLER_INTERVAL_MS and counts collapsed stacks
+("thread;outer;...;inner count"), the input format of flamegraph.pl and
+speedscope. Nothing is hooked into the profiled code.
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from config import Config
+from utils.log import get_logger, fields, request_id
+
+
+logger = get_logger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+# Functions listed in the .json metadata of a request profile
+TOP_FUNCTIONS = 20
+
+# Python < 3.12: a profiler sees only its own thread, worker calls need their own
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+# Characters allowed in profile file names (request id and path)
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]")
+_SAFE_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class RequestProfile:
+    """cProfile session of one request (event loop thread + inference threads)"""
+
+    def __init__(self, trigger: str, method: str, path: str):
+        self.trigger = trigger
+        self.method = method
+        self.path = path
+        self.request_id = request_id.get()
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.worker_calls = 0
+        self.error: Optional[str] = None
+        self._main = cProfile.Profile()
+        self._enabled = False
+        self._workers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._start = 0.0
+        self.token = None
+
+    def __enter__(self) -> "RequestProfile":
+        self._start = time.perf_counter()
+        # Never fail the request: another profiler may already be active (sys.monitoring)
+        try:
+            self._main.enable()
+            self._enabled = True
+        except ValueError as e:
+            self.error = str(e)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._enabled:
+            self._main.disable()
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn in an inference worker thread
+
+        Before 3.12 the call gets its own profiler (merged in stats()); from
+        3.12 the request's profiler already covers this thread.
+        """
+        with self._lock:
+            self.worker_calls += 1
+        if not (PER_THREAD_PROFILERS and self._enabled):
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return fn(*args, **kwargs)
+        with self._lock:
+            self._workers.append(profiler)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+    def stats(self) -> pstats.Stats:
+        """Merged statistics of the handler and the model calls"""
+        stats = pstats.Stats(self._main, stream=io.StringIO())
+        for profiler in self._workers:
+            stats.add(profiler)
+        return stats
+
+    def metadata(self) -> Dict[str, Any]:
+        stats = self.stats()
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status_code,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "worker_calls": self.worker_calls,
+            "error": self.error,
+            "top_cumulative": [
+                {
+                    "function": f"{os.path.basename(filename)}:{line}({name})",
+                    "calls": calls,
+                    "total_ms": round(total * 1000, 3),
+                    "cumulative_ms": round(cumulative * 1000, 3),
+                }
+                for (filename, line, name), (_, calls, total, cumulative, _) in top
+            ],
+        }
+
+    def file_name(self) -> str:
+        """<timestamp>-<request id>-<path>, only [A-Za-z0-9._-] (the request id comes from the client)"""
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        rid = self.request_id if self.request_id and _SAFE_REQUEST_ID.fullmatch(self.request_id) else os.urandom(8).hex()
+        return f"{stamp}-{rid}-{_UNSAFE_NAME.sub('_', self.path.strip('/'))}"
+
+    def write(self, directory: Optional[str] = None) -> str:
+        """
+        Write <name>.prof, then <name>.json
+
+        Both are written to temporary files and renamed, the .json last: a
+        reader that sees the .json finds the complete .prof next to it.
+
+        Returns:
+            Path of the .prof file
+        """
+        directory = directory or Config.PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.file_name())
+        self.stats().dump_stats(base + ".prof.tmp")
+        os.replace(base + ".prof.tmp", base + ".prof")
+        with open(base + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.metadata(), f, ensure_ascii=False, indent=2)
+        os.replace(base + ".json.tmp", base + ".json")
+        _prune(directory)
+        return base + ".prof"
+
+
+# Session of the request being profiled (copied into executor threads with the context)
+_session: ContextVar[Optional[RequestProfile]] = ContextVar("profile_session", default=None)
+
+_lock = threading.Lock()
+_busy = False
+_requested = 0
+_requested_prefix: Optional[str] = None
+
+# Stats
+profiled = 0
+skipped_busy = 0
+
+
+def current() -> Optional[RequestProfile]:
+    """Profile session of the current request, if any"""
+    return _session.get()
+
+
+def request_profiles(count: int, path_prefix: Optional[str] = None) -> None:
+    """Profile the next `count` prediction requests (optionally only paths starting with path_prefix)"""
+    global _requested, _requested_prefix
+    with _lock:
+        _requested = count
+        _requested_prefix = path_prefix
+
+
+def _trigger(headers, path: str) -> Optional[str]:
+    """Why this request should be profiled (None = it should not)"""
+    if _requested and (_requested_prefix is None or path.startswith(_requested_prefix)):
+        return "admin"
+    value = headers.get(PROFILE_HEADER)
+    if value and value != "0" and Config.PROFILE_HEADER_ENABLED:
+        token = headers.get("x-admin-token")
+        if Config.ADMIN_TOKEN and token and hmac.compare_digest(token.encode(), Config.ADMIN_TOKEN.encode()):
+            return "header"
+    if Config.PROFILE_SAMPLE_RATE and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def start_request(request) -> Optional[RequestProfile]:
+    """
+    Profile session for this request, or None (the common case, a few checks)
+
+    The caller runs the handler inside `with session:` and calls finish_request()
+    """
+    global _busy, _requested, skipped_busy
+    trigger = _trigger(request.headers, request.scope["path"])
+    if trigger is None:
+        return None
+    with _lock:
+        if _busy:
+            skipped_busy += 1
+            return None
+        _busy = True
+        if trigger == "admin":
+            _requested = max(0, _requested - 1)
+    session = RequestProfile(trigger, request.method, request.scope["path"])
+    session.token = _session.set(session)
+    return session
+
+
+def finish_request(session: RequestProfile, status_code: int) -> None:
+    """Release the profiler and write the files in a background thread"""
+    global _busy, profiled
+    _session.reset(session.token)
+    session.status_code = status_code
+    with _lock:
+        _busy = False
+        profiled += 1
+    threading.Thread(target=_write, args=(session,), name="profile-writer", daemon=True).start()
+
+
+def _write(session: RequestProfile) -> None:
+    try:
+        path = session.write()
+        logger.info("Request profile written", extra=fields(path=path, trigger=session.trigger, duration_ms=session.duration_ms))
+    except Exception:
+        logger.exception("Failed to write request profile")
+
+
+def _prune(directory: str) -> None:
+    """Keep the newest Config.PROFILE_KEEP_FILES files of the profile directory"""
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[Config.PROFILE_KEEP_FILES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def status() -> Dict[str, Any]:
+    """Profiling settings, pending admin requests and counters"""
+    return {
+        "dir": Config.PROFILE_DIR,
+        "sample_rate": Config.PROFILE_SAMPLE_RATE,
+        "header_enabled": Config.PROFILE_HEADER_ENABLED,
+        "requested": _requested,
+        "requested_path_prefix": _requested_prefix,
+        "busy": _busy,
+        "profiled": profiled,
+        "skipped_busy": skipped_busy,
+        "window_running": _window is not None,
+    }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class StackSampler:
+    """
+    Background thread counting the stacks of every other thread
+
+        sampler = StackSampler(interval_s=0.005)
+        sampler.start()
+        ...
+        counts = sampler.stop()    # Counter {"MainThread;main (x.py:1);f (y.py:3)": 42}
+    """
+
+    def __init__(self, interval_s: Optional[float] = None):
+        self.interval_s = interval_s or Config.PROFILE_SAMPLER_INTERVAL_MS / 1000
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}").replace(";", ","))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+def collapsed(counts: Counter) -> str:
+    """Collapsed-stack text (one "stack count" line per stack), most frequent first"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+_window: Optional[StackSampler] = None
+
+
+def start_window() -> StackSampler:
+    """
+    Start the stack sampler for a time window (one window at a time)
+
+    Raises:
+        RuntimeError: If a window is already running
+    """
+    global _window
+    with _lock:
+        if _window is not None:
+            raise RuntimeError("A sampling window is already running")
+        _window = StackSampler()
+    _window.start()
+    return _window
+
+
+def finish_window(sampler: StackSampler, seconds: float, directory: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stop the window and write <timestamp>-window-<seconds>s.collapsed
+
+    Returns:
+        {"path", "samples", "stacks", "seconds"}
+    """
+    global _window
+    counts = sampler.stop()
+    with _lock:
+        _window = None
+    directory = directory or Config.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-window-{seconds:g}s.collapsed")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(collapsed(counts))
+    _prune(directory)
+    logger.info("Stack samples written", extra=fields(path=path, samples=sampler.samples, seconds=seconds))
+    return {"path": path, "samples": sampler.samples, "stacks": len(counts), "seconds": seconds}
@@ -1,5 +1,9 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+import numpy as np
+from annotated_types import Ge, Le
+from pydantic import BaseModel, Field, PrivateAttr, SkipValidation, create_model, model_validator
+from typing import Annotated, ClassVar, Dict, List, Optional, Sequence, Tuple, Type, Union
+from config import Config
+from utils.features import ONE_HOT_GROUPS, rows_message
 
 
 class RandomForestPredictionRequest(BaseModel):
@@ -83,6 +87,38 @@ class PredictionResponse(BaseModel):
     label: str = Field(..., description="Nhãn có ý nghĩa")
     probability: float = Field(..., description="Xác suất dự đoán")
     model_type: str = Field(..., description="Loại model được sử dụng")
+    model_version: Optional[str] = Field(None, description="Version của model đã trả lời (model registry)")
+
+
+class RandomForestBatchPredictionRequest(BaseModel):
+    """
+    Request schema cho batch Random Forest prediction
+    
+    Mỗi phần tử trong `items` có cùng định dạng với RandomForestPredictionRequest
+    (kể cả cờ is_raw riêng của từng dòng).
+    """
+    items: List[RandomForestPredictionRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=Config.MAX_BATCH_SIZE,
+        description="Danh sách các dòng cần dự đoán"
+    )
+
+
+class BatchPredictionResponse(BaseModel):
+    """Response schema cho batch predictions (cùng thứ tự với input)"""
+    predictions: List[PredictionResponse] = Field(..., description="Kết quả theo thứ tự input")
+    count: int = Field(..., description="Số dòng đã dự đoán")
+
+
+class ColumnarBatchPredictionResponse(BaseModel):
+    """Response schema cho batch predictions dạng cột (?columnar=true): mỗi field là một mảng theo thứ tự input"""
+    prediction: List[int] = Field(..., description="Lớp dự đoán của từng dòng")
+    label: List[str] = Field(..., description="Nhãn của từng dòng")
+    probability: List[float] = Field(..., description="Xác suất của từng dòng")
+    model_type: str = Field(..., description="Loại model được sử dụng")
+    model_version: Optional[str] = Field(None, description="Version của model đã trả lời (model registry)")
+    count: int = Field(..., description="Số dòng đã dự đoán")
 
 
 class KNNSystolicPredictionRequest(BaseModel):
@@ -246,6 +282,7 @@ class BPPredictionResponse(BaseModel):
     # Metadata
     input_type: str = Field(..., description="Type of input used (raw/normalized)")
     model_type: str = Field(..., description="Model used (knn_systolic/knn_diastolic)")
+    model_version: Optional[str] = Field(None, description="Registry version of the model that answered")
     
     class Config:
         json_schema_extra = {
@@ -257,11 +294,383 @@ class BPPredictionResponse(BaseModel):
                 "confidence_interval_lower": 106.2,
                 "confidence_interval_upper": 165.0,
                 "input_type": "raw",
-                "model_type": "knn_systolic"
+                "model_type": "knn_systolic",
+                "model_version": "base"
+            }
+        }
+
+
+class KNNSystolicBatchPredictionRequest(BaseModel):
+    """Batch request schema for KNN Systolic BP prediction"""
+    items: List[KNNSystolicPredictionRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=Config.MAX_BATCH_SIZE,
+        description="Rows to predict (each row keeps its own is_raw flag)"
+    )
+
+
+class KNNDiastolicBatchPredictionRequest(BaseModel):
+    """Batch request schema for KNN Diastolic BP prediction"""
+    items: List[KNNDiastolicPredictionRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=Config.MAX_BATCH_SIZE,
+        description="Rows to predict (each row keeps its own is_raw flag)"
+    )
+
+
+def column_violations(
+    columns: np.ndarray,
+    fields: Sequence[str],
+    row_schema: Type[BaseModel]
+) -> List[Tuple[str, np.ndarray]]:
+    """
+    Kiểm tra vectorized các ràng buộc của schema một dòng trên cả ma trận
+
+    Giá trị hữu hạn, field kiểu int phải là số nguyên, khoảng ge/le của field và
+    one-hot (đúng một field = 1, còn lại 0, trong mỗi nhóm ONE_HOT_GROUPS có đủ field).
+    Dùng chung cho columnar JSON, binary wire format và score_file.py.
+
+    Args:
+        columns: Ma trận (n_fields, n_rows), một hàng cho mỗi field (có thể là view .T)
+        fields: Tên field của từng hàng, thuộc row_schema
+        row_schema: Schema một dòng (nguồn của kiểu và ge/le)
+
+    Returns:
+        (message, chỉ số các dòng vi phạm) cho mỗi ràng buộc bị vi phạm (rỗng nếu hợp lệ)
+    """
+    violations = []
+    bad = np.flatnonzero(~np.isfinite(columns).all(axis=0))
+    if bad.size:
+        violations.append(("non-finite values", bad))
+
+    for j, field in enumerate(fields):
+        column = columns[j]
+        info = row_schema.model_fields[field]
+        if info.annotation is int:
+            bad = np.flatnonzero(column != np.floor(column))
+            if bad.size:
+                violations.append((f"{field} must be an integer", bad))
+        for limit in info.metadata:
+            if isinstance(limit, Ge):
+                bad = np.flatnonzero(column < limit.ge)
+                bound = f">= {limit.ge}"
+            elif isinstance(limit, Le):
+                bad = np.flatnonzero(column > limit.le)
+                bound = f"<= {limit.le}"
+            else:
+                continue
+            if bad.size:
+                violations.append((f"{field} must be {bound}", bad))
+
+    index = {field: j for j, field in enumerate(fields)}
+    for group, group_fields in ONE_HOT_GROUPS.items():
+        if not all(field in index for field in group_fields):
+            continue
+        block = columns[[index[field] for field in group_fields]]
+        valid = ((block == 0) | (block == 1)).all(axis=0) & (block.sum(axis=0) == 1)
+        bad = np.flatnonzero(~valid)
+        if bad.size:
+            violations.append((f"exactly one of {', '.join(group_fields)} must be 1", bad))
+    return violations
+
+
+def column_errors(columns: np.ndarray, fields: Sequence[str], row_schema: Type[BaseModel]) -> List[str]:
+    """
+    column_violations dạng message: mỗi lỗi liệt kê chỉ số các dòng vi phạm
+
+    Returns:
+        Danh sách lỗi (rỗng nếu hợp lệ)
+    """
+    return [f"{message}: {rows_message(bad)}" for message, bad in column_violations(columns, fields, row_schema)]
+
+
+class ColumnarBatchRequest(BaseModel):
+    """
+    Base của các batch request dạng cột: mỗi feature là một mảng (cùng độ dài, theo thứ tự dòng)
+    và một cờ is_raw chung (hoặc một cờ cho mỗi dòng)
+
+    Không tạo object cho từng dòng, pydantic cũng không kiểm tra từng phần tử (SkipValidation,
+    JSON schema vẫn giữ kiểu mảng số): mỗi cột được đổi thành float64 bằng một lần gán NumPy,
+    rồi độ dài, giá trị hữu hạn, số nguyên, khoảng ge/le của schema một dòng và ràng buộc
+    one-hot (đúng một field = 1 trong mỗi nhóm ONE_HOT_GROUPS) được kiểm tra trên cả ma trận
+    (column_errors). Lỗi liệt kê chỉ số các dòng vi phạm.
+    """
+    # Schema một dòng tương ứng (nguồn của field, kiểu, default và ge/le)
+    row_schema: ClassVar[Type[BaseModel]]
+
+    is_raw: Union[bool, List[bool]] = Field(
+        default=False,
+        description="True=RAW, False=NORMALIZED cho mọi dòng, hoặc một cờ cho mỗi dòng"
+    )
+
+    _fields: List[str] = PrivateAttr(default_factory=list)
+    _columns: np.ndarray = PrivateAttr(default=None)
+    _raw_mask: np.ndarray = PrivateAttr(default=None)
+
+    @model_validator(mode="after")
+    def _check_columns(self):
+        fields = [field for field in type(self).model_fields if field != "is_raw"]
+        given = {field: getattr(self, field) for field in fields if getattr(self, field) is not None}
+        for field, values in given.items():
+            if not isinstance(values, list) or not 1 <= len(values) <= Config.MAX_BATCH_SIZE:
+                raise ValueError(f"{field} must be a list of 1 to {Config.MAX_BATCH_SIZE} numbers")
+        lengths = {len(values) for values in given.values()}
+        if len(lengths) != 1:
+            counts = ", ".join(f"{field}={len(values)}" for field, values in given.items())
+            raise ValueError(f"All columns must have the same length, got {counts}")
+        n_rows = lengths.pop()
+
+        if isinstance(self.is_raw, list):
+            if len(self.is_raw) != n_rows:
+                raise ValueError(f"is_raw has {len(self.is_raw)} flags for {n_rows} rows")
+            raw_mask = np.array(self.is_raw, dtype=bool)
+        else:
+            raw_mask = np.full(n_rows, self.is_raw)
+
+        # Một hàng cho mỗi field (theo thứ tự schema một dòng); cột bỏ trống = default của field.
+        # Gán cả list một lần (nhanh hơn fromiter); chuỗi số được chấp nhận như pydantic lax mode
+        columns = np.empty((len(fields), n_rows), dtype=np.float64)
+        for j, field in enumerate(fields):
+            values = given.get(field)
+            if values is None:
+                columns[j] = self.row_schema.model_fields[field].default
+                continue
+            try:
+                columns[j] = values
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be a list of numbers") from None
+
+        errors = column_errors(columns, fields, self.row_schema)
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        self._fields = fields
+        self._columns = columns
+        self._raw_mask = raw_mask
+        return self
+
+    @property
+    def count(self) -> int:
+        """Số dòng"""
+        return len(self._raw_mask)
+
+    @property
+    def raw_mask(self) -> np.ndarray:
+        """Cờ is_raw của từng dòng (bool array)"""
+        return self._raw_mask
+
+    def to_matrix(self, fields: Sequence[str]) -> np.ndarray:
+        """
+        Ma trận float64 (n_rows, n_features) theo thứ tự `fields` (thường là model.layout.fields)
+
+        Args:
+            fields: Tên field theo thứ tự cột mong muốn
+
+        Returns:
+            Ma trận C-contiguous mới của các giá trị đã kiểm tra
+        """
+        index = {field: j for j, field in enumerate(self._fields)}
+        return np.ascontiguousarray(self._columns[[index[field] for field in fields]].T)
+
+
+def _columnar_request(name: str, row_schema: Type[BaseModel], doc: str) -> Type[ColumnarBatchRequest]:
+    """
+    Columnar batch request của một schema một dòng: mỗi field -> một mảng
+
+    Field bắt buộc ở schema một dòng là mảng bắt buộc; field có default có thể bỏ trống
+    (cả cột lấy default).
+    """
+    columns = {}
+    for field, info in row_schema.model_fields.items():
+        if field == "is_raw":
+            continue
+        # SkipValidation: elements are checked as a whole array by _check_columns
+        item = int if info.annotation is int else float
+        if info.is_required():
+            columns[field] = (Annotated[List[item], SkipValidation], Field(
+                ..., min_length=1, max_length=Config.MAX_BATCH_SIZE, description=info.description
+            ))
+        else:
+            columns[field] = (Annotated[Optional[List[item]], SkipValidation], Field(
+                None, max_length=Config.MAX_BATCH_SIZE, description=f"{info.description}; default {info.default} for every row"
+            ))
+    model = create_model(name, __base__=ColumnarBatchRequest, __doc__=doc, **columns)
+    model.row_schema = row_schema
+    return model
+
+
+ColumnarRandomForestBatchRequest = _columnar_request(
+    "ColumnarRandomForestBatchRequest",
+    RandomForestPredictionRequest,
+    "Batch Random Forest request dạng cột (một mảng cho mỗi field của RandomForestPredictionRequest)"
+)
+
+ColumnarKNNSystolicBatchRequest = _columnar_request(
+    "ColumnarKNNSystolicBatchRequest",
+    KNNSystolicPredictionRequest,
+    "Columnar batch request for KNN Systolic BP prediction (one array per field of KNNSystolicPredictionRequest)"
+)
+
+ColumnarKNNDiastolicBatchRequest = _columnar_request(
+    "ColumnarKNNDiastolicBatchRequest",
+    KNNDiastolicPredictionRequest,
+    "Columnar batch request for KNN Diastolic BP prediction (one array per field of KNNDiastolicPredictionRequest)"
+)
+
+
+class BPBatchPredictionResponse(BaseModel):
+    """Batch response schema for Blood Pressure predictions (same order as input)"""
+    predictions: List[BPPredictionResponse] = Field(..., description="Results in input order")
+    count: int = Field(..., description="Number of predicted rows")
+
+
+class ColumnarBPBatchPredictionResponse(BaseModel):
+    """Columnar batch response for Blood Pressure predictions (?columnar=true): one array per field, input order"""
+    predicted_normalized: List[float] = Field(..., description="Predicted value per row (normalized)")
+    prediction_std_normalized: List[float] = Field(..., description="Std of neighbor values per row (normalized)")
+    predicted_value_mmHg: List[float] = Field(..., description="Predicted BP per row (mmHg)")
+    prediction_std_mmHg: List[float] = Field(..., description="Std of neighbor values per row (mmHg)")
+    confidence_interval_lower: List[float] = Field(..., description="Lower bound of the 95% CI per row (mmHg)")
+    confidence_interval_upper: List[float] = Field(..., description="Upper bound of the 95% CI per row (mmHg)")
+    input_type: List[str] = Field(..., description="raw/normalized per row")
+    model_type: str = Field(..., description="Model used (knn_systolic/knn_diastolic)")
+    model_version: Optional[str] = Field(None, description="Registry version of the model that answered")
+    count: int = Field(..., description="Number of predicted rows")
+
+
+class KNNJointPredictionRequest(BaseModel):
+    """
+    Request schema for joint Systolic/Diastolic BP estimation
+    Neither Systolic_BP nor Diastolic_BP is required: both are estimated by
+    alternating the two KNN models until they converge
+    """
+    # Input type flag
+    is_raw: bool = Field(
+        default=False,
+        description="True=RAW input (actual values), False=NORMALIZED (z-score)"
+    )
+    
+    # Numeric features
+    Sex: int = Field(..., ge=0, le=1, description="Gender (0=Female, 1=Male)")
+    Age: float = Field(..., description="Age (raw: years, normalized: z-score)")
+    Height: float = Field(..., description="Height (raw: cm, normalized: z-score)")
+    Weight: float = Field(..., description="Weight (raw: kg, normalized: z-score)")
+    Heart_Rate: float = Field(..., description="Heart rate (raw: bpm, normalized: z-score)")
+    BMI: float = Field(..., description="BMI (raw: kg/m², normalized: z-score)")
+    
+    # Categorical features (one-hot encoded, already 0/1)
+    Diabetes_Diabetes: int = Field(default=0, ge=0, le=1, description="Has diabetes (0/1)")
+    Diabetes_None: int = Field(default=1, ge=0, le=1, description="No diabetes (0/1)")
+    Diabetes_Type2: int = Field(default=0, ge=0, le=1, description="Type 2 diabetes (0/1)")
+    Cerebral_infarction_None: int = Field(default=1, ge=0, le=1, description="No cerebral infarction (0/1)")
+    Cerebral_infarction_infarction: int = Field(default=0, ge=0, le=1, description="Has cerebral infarction (0/1)")
+    Cerebrovascular_None: int = Field(default=1, ge=0, le=1, description="No cerebrovascular disease (0/1)")
+    Cerebrovascular_disease: int = Field(default=0, ge=0, le=1, description="Has cerebrovascular disease (0/1)")
+    Cerebrovascular_insuff: int = Field(default=0, ge=0, le=1, description="Cerebral blood insufficiency (0/1)")
+    
+    # Fixed-point iteration settings
+    initial_systolic_mmHg: float = Field(default=Config.JOINT_BP_INITIAL_SYSTOLIC, description="Starting SBP guess (mmHg)")
+    initial_diastolic_mmHg: float = Field(default=Config.JOINT_BP_INITIAL_DIASTOLIC, description="Starting DBP guess (mmHg)")
+    max_iterations: int = Field(default=Config.JOINT_BP_MAX_ITERATIONS, ge=1, le=100, description="Iteration cap")
+    tolerance_mmHg: float = Field(default=Config.JOINT_BP_TOLERANCE_MMHG, ge=0, description="Stop when both estimates move less than this (mmHg)")
+    
+    class Config:
+        json_schema_extra = {
+            "example_raw": {
+                "is_raw": True,
+                "Sex": 0,
+                "Age": 45,
+                "Height": 152,
+                "Weight": 63,
+                "Heart_Rate": 97,
+                "BMI": 27.27,
+                "Diabetes_Diabetes": 0,
+                "Diabetes_None": 1,
+                "Diabetes_Type2": 0,
+                "Cerebral_infarction_None": 1,
+                "Cerebral_infarction_infarction": 0,
+                "Cerebrovascular_None": 1,
+                "Cerebrovascular_disease": 0,
+                "Cerebrovascular_insuff": 0
             }
         }
 
 
+class KNNJointBatchPredictionRequest(BaseModel):
+    """Batch request schema for joint Systolic/Diastolic BP estimation"""
+    items: List[KNNJointPredictionRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=Config.MAX_BATCH_SIZE,
+        description="Rows to estimate (each row keeps its own settings)"
+    )
+
+
+class JointBPPredictionResponse(BaseModel):
+    """Response schema for joint Systolic/Diastolic BP estimation"""
+    systolic: BPPredictionResponse = Field(..., description="Final Systolic BP estimate")
+    diastolic: BPPredictionResponse = Field(..., description="Final Diastolic BP estimate")
+    iterations: int = Field(..., description="Number of SBP/DBP alternations run")
+    converged: bool = Field(..., description="Whether the estimates reached the tolerance")
+
+
+class JointBPBatchPredictionResponse(BaseModel):
+    """Batch response schema for joint Systolic/Diastolic BP estimation (same order as input)"""
+    predictions: List[JointBPPredictionResponse] = Field(..., description="Results in input order")
+    count: int = Field(..., description="Number of estimated rows")
+
+
+class ColumnarJointBPBatchPredictionResponse(BaseModel):
+    """Columnar batch response for joint Systolic/Diastolic BP estimation (?columnar=true)"""
+    systolic: ColumnarBPBatchPredictionResponse = Field(..., description="Final Systolic BP estimates")
+    diastolic: ColumnarBPBatchPredictionResponse = Field(..., description="Final Diastolic BP estimates")
+    iterations: List[int] = Field(..., description="SBP/DBP alternations run per row")
+    converged: List[bool] = Field(..., description="Whether each row reached the tolerance")
+    count: int = Field(..., description="Number of estimated rows")
+
+
+class AssessmentRequest(RandomForestPredictionRequest):
+    """
+    Request schema cho /assess: một bệnh nhân, đủ feature cho cả ba model
+
+    Cùng các field với RandomForestPredictionRequest (đo cả Systolic_BP và Diastolic_BP);
+    KNN Systolic dùng Diastolic_BP, KNN Diastolic dùng Systolic_BP.
+    """
+
+
+class AssessmentBatchRequest(BaseModel):
+    """Request schema cho batch /assess (mỗi dòng giữ cờ is_raw riêng)"""
+    items: List[AssessmentRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=Config.MAX_BATCH_SIZE,
+        description="Danh sách bệnh nhân cần đánh giá"
+    )
+
+
+class AssessmentResponse(BaseModel):
+    """Response schema cho /assess: kết quả của ba model cho cùng một bệnh nhân"""
+    hypertension: PredictionResponse = Field(..., description="Phân lớp tăng huyết áp (Random Forest)")
+    systolic: BPPredictionResponse = Field(..., description="Systolic BP dự đoán từ Diastolic_BP (KNN)")
+    diastolic: BPPredictionResponse = Field(..., description="Diastolic BP dự đoán từ Systolic_BP (KNN)")
+
+
+class AssessmentBatchResponse(BaseModel):
+    """Response schema cho batch /assess (cùng thứ tự với input)"""
+    predictions: List[AssessmentResponse] = Field(..., description="Kết quả theo thứ tự input")
+    count: int = Field(..., description="Số bệnh nhân đã đánh giá")
+
+
+class ColumnarAssessmentBatchResponse(BaseModel):
+    """Response schema cho batch /assess dạng cột (?columnar=true)"""
+    hypertension: ColumnarBatchPredictionResponse = Field(..., description="Phân lớp tăng huyết áp")
+    systolic: ColumnarBPBatchPredictionResponse = Field(..., description="Systolic BP dự đoán")
+    diastolic: ColumnarBPBatchPredictionResponse = Field(..., description="Diastolic BP dự đoán")
+    count: int = Field(..., description="Số bệnh nhân đã đánh giá")
+
+
 class HealthCheckResponse(BaseModel):
     """Response cho health check endpoint"""
     status: str
@@ -269,6 +678,22 @@ class HealthCheckResponse(BaseModel):
     models: dict
 
 
+class ModelReadiness(BaseModel):
+    """Trạng thái load / warm-up của một model"""
+    state: str = Field(..., description="pending, loading, warming, ready hoặc failed")
+    load_ms: Optional[float] = Field(None, description="Thời gian load model (ms)")
+    warmup_ms: Optional[float] = Field(None, description="Thời gian warm-up qua mọi nhánh predict (ms)")
+    self_test_ms: Optional[float] = Field(None, description="Latency median của một predict một dòng (ms)")
+    error: Optional[str] = None
+
+
+class ReadinessResponse(BaseModel):
+    """Response cho readiness probe"""
+    ready: bool
+    warmup_total_ms: Optional[float] = None
+    models: Dict[str, ModelReadiness]
+
+
 class ErrorResponse(BaseModel):
     """Response cho errors"""
     detail: str
@@ -0,0 +1,131 @@
+"""
+Streaming readers - NDJSON / CSV rows from an upload arriving in pieces (gzip optional)
+"""
+import codecs
+import csv
+import json
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class LineTooLong(ValueError):
+    """A line exceeded the configured limit (no newline in sight)"""
+
+
+class InflatedTooLarge(ValueError):
+    """A gzip upload decompressed to more than the configured limit"""
+
+
+class Decoder:
+    """
+    bytes -> text; gzip is detected from Content-Encoding or the magic bytes
+
+    Gzip input is inflated at most `step` bytes at a time (the rest of the
+    compressed piece waits in unconsumed_tail), so a small upload that
+    expands enormously is still handed on in bounded pieces, and inflating
+    stops with InflatedTooLarge after `max_size` bytes in total.
+    """
+
+    def __init__(self, gzip: Optional[bool] = None, max_size: Optional[int] = None, step: int = 64 * 1024):
+        """
+        Args:
+            gzip: True / False, hoặc None = tự nhận biết từ 2 byte đầu
+            max_size: Tổng số byte sau giải nén tối đa (None = không giới hạn)
+            step: Số byte tối đa mỗi lần giải nén
+        """
+        self.gzip = gzip
+        self.max_size = max_size
+        self.step = step
+        self.inflated = 0
+        self._inflate = None
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._head = b""
+
+    def decode(self, data: bytes) -> Iterator[str]:
+        """Text of one upload piece, in pieces of at most `step` bytes for gzip input"""
+        if self.gzip is None:
+            # Wait for two bytes before deciding
+            self._head += data
+            if len(self._head) < 2:
+                return
+            data, self._head = self._head, b""
+            self.gzip = data[:2] == GZIP_MAGIC
+        if not self.gzip:
+            yield self._text.decode(data)
+            return
+        if self._inflate is None:
+            self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while data:
+            piece = self._inflate.decompress(data, self.step)
+            data = self._inflate.unconsumed_tail
+            yield self._text.decode(self._count(piece))
+
+    def flush(self) -> str:
+        data = self._head
+        if self.gzip and self._inflate is not None:
+            # Everything was consumed by decode(); only buffered output is left
+            data = self._count(self._inflate.flush())
+        return self._text.decode(data, final=True)
+
+    def _count(self, piece: bytes) -> bytes:
+        self.inflated += len(piece)
+        if self.max_size is not None and self.inflated > self.max_size:
+            raise InflatedTooLarge(f"Decompressed upload larger than {self.max_size} bytes")
+        return piece
+
+
+class LineSplitter:
+    """Complete lines out of text pieces; only the unfinished last line is kept"""
+
+    def __init__(self, max_line_chars: int):
+        self.max_line_chars = max_line_chars
+        self._buffer = ""
+
+    def feed(self, text: str, final: bool = False) -> List[str]:
+        self._buffer += text
+        lines = self._buffer.split("\n")
+        self._buffer = "" if final else lines.pop()
+        if len(self._buffer) > self.max_line_chars:
+            raise LineTooLong(f"Line longer than {self.max_line_chars} characters")
+        return [line.rstrip("\r") for line in lines if line.strip()]
+
+
+class NDJSONRows:
+    """One JSON object per line -> (row dict, None) or (None, error)"""
+
+    def parse(self, line: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            return None, f"Invalid JSON: {e}"
+        if not isinstance(row, dict):
+            return None, "Each line must be a JSON object"
+        return row, None
+
+
+class CSVRows:
+    """Header line with the field names, then one row per line (no quoted newlines)"""
+
+    def __init__(self):
+        self.header: Optional[List[str]] = None
+
+    def parse(self, line: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None, None
+        if len(values) != len(self.header):
+            return None, f"Expected {len(self.header)} columns, got {len(values)}"
+        # Empty cells are left out so that the schema reports them as missing
+        return {name: value.strip() for name, value in zip(self.header, values) if value.strip()}, None
+
+
+def iter_rows(lines: List[str], parser) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """(row, error) per data line; CSV header lines yield nothing"""
+    for line in lines:
+        row, error = parser.parse(line)
+        if row is not None or error is not None:
+            yield row, error
@@ -0,0 +1,168 @@
+"""
+Binary wire format - little-endian float32 matrices instead of JSON rows
+
+Request body (Content-Type: application/x-bp-matrix):
+
+    header   struct "<4sIHBB": b"BPM1", n_rows (uint32), n_cols (uint16), flags (uint8), 0
+    data     n_rows x n_cols float32, row-major
+    is_raw   n_rows uint8, only with FLAG_ROW_RAW
+
+    flags    FLAG_RAW      every row is RAW
+             FLAG_ROW_RAW  per-row is_raw bytes follow the data (FLAG_RAW is then ignored)
+             FLAG_COMPACT  each one-hot group is one column holding the category code
+
+Columns are the model's request fields in schema order (compact_fields()
+for FLAG_COMPACT: the other fields, then one code per group of
+ONE_HOT_GROUPS, code = position of the field in the group).
+
+Response body: the same header with b"BPR1" and flags 0, then the
+outputs as float32; the column names are in the X-Columns header.
+"""
+import struct
+from typing import List, Optional, Sequence, Tuple, Type, Union
+import numpy as np
+from pydantic import BaseModel
+from utils.features import FeatureLayout, ONE_HOT_GROUPS, rows_message
+from utils.schemas import column_errors
+
+
+MEDIA_TYPE = "application/x-bp-matrix"
+HEADER = struct.Struct("<4sIHBB")
+REQUEST_MAGIC = b"BPM1"
+RESPONSE_MAGIC = b"BPR1"
+
+FLAG_RAW = 1
+FLAG_ROW_RAW = 2
+FLAG_COMPACT = 4
+
+class WireFormatError(ValueError):
+    """Malformed binary body (answered with 400)"""
+
+
+class WireValueError(ValueError):
+    """Well-formed body whose values break the request schema (answered with 422, like JSON)"""
+
+
+def compact_fields(layout: FeatureLayout) -> List[str]:
+    """Column names of a FLAG_COMPACT matrix: non-group fields, then one column per group"""
+    grouped = {int(i) for indices in layout.groups.values() for i in indices}
+    plain = [field for i, field in enumerate(layout.fields) if i not in grouped]
+    return plain + list(layout.groups)
+
+
+def _expand(compact: np.ndarray, layout: FeatureLayout) -> np.ndarray:
+    """FLAG_COMPACT matrix -> full float64 matrix in layout order"""
+    grouped = np.concatenate(list(layout.groups.values())) if layout.groups else np.empty(0, dtype=np.intp)
+    plain = np.setdiff1d(np.arange(layout.n_features), grouped)
+    matrix = np.zeros((compact.shape[0], layout.n_features), dtype=np.float64)
+    matrix[:, plain] = compact[:, :len(plain)]
+
+    rows = np.arange(compact.shape[0])
+    for offset, (group, indices) in enumerate(layout.groups.items()):
+        codes = compact[:, len(plain) + offset]
+        bad = np.flatnonzero((codes != np.floor(codes)) | (codes < 0) | (codes >= len(indices)))
+        if bad.size:
+            raise WireFormatError(
+                f"{group} code must be an integer in 0..{len(indices) - 1} "
+                f"({', '.join(ONE_HOT_GROUPS[group])}): {rows_message(bad)}"
+            )
+        matrix[rows, indices[codes.astype(np.intp)]] = 1.0
+    return matrix
+
+
+def decode_request(
+    body: bytes,
+    layout: FeatureLayout,
+    max_rows: int,
+    row_schema: Optional[Type[BaseModel]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Wrap a binary request body without building per-row objects
+
+    Args:
+        body: Request body
+        layout: FeatureLayout of the target model
+        max_rows: Largest accepted n_rows
+        row_schema: JSON schema of one row; its integer, ge/le and one-hot rules are
+            checked on the whole matrix (utils.schemas.column_errors)
+
+    Returns:
+        (matrix in layout order, is_raw mask). Without FLAG_COMPACT the matrix
+        is a read-only float32 view of `body`
+
+    Raises:
+        WireFormatError: Bad header, size, non-finite values or group codes
+        WireValueError: Values the JSON endpoints would reject
+    """
+    if len(body) < HEADER.size:
+        raise WireFormatError(f"Body shorter than the {HEADER.size}-byte header")
+    magic, n_rows, n_cols, flags, _ = HEADER.unpack_from(body)
+    if magic != REQUEST_MAGIC:
+        raise WireFormatError(f"Bad magic {magic!r}, expected {REQUEST_MAGIC!r}")
+    if n_rows > max_rows:
+        raise WireFormatError(f"{n_rows} rows exceed the limit of {max_rows}")
+
+    compact = bool(flags & FLAG_COMPACT)
+    expected_cols = len(compact_fields(layout)) if compact else layout.n_features
+    if n_cols != expected_cols:
+        raise WireFormatError(f"Expected {expected_cols} columns{' (compact)' if compact else ''}, got {n_cols}")
+
+    row_raw = bool(flags & FLAG_ROW_RAW)
+    data_size = n_rows * n_cols * 4
+    expected_size = HEADER.size + data_size + (n_rows if row_raw else 0)
+    if len(body) != expected_size:
+        raise WireFormatError(f"Expected {expected_size} bytes for {n_rows}x{n_cols}, got {len(body)}")
+
+    data = np.frombuffer(body, dtype="<f4", count=n_rows * n_cols, offset=HEADER.size).reshape(n_rows, n_cols)
+    bad = np.flatnonzero(~np.isfinite(data).all(axis=1))
+    if bad.size:
+        raise WireFormatError(f"Non-finite values: {rows_message(bad)}")
+
+    if row_raw:
+        is_raw = np.frombuffer(body, dtype=np.uint8, count=n_rows, offset=HEADER.size + data_size) != 0
+    else:
+        is_raw = np.full(n_rows, bool(flags & FLAG_RAW))
+    matrix = _expand(data, layout) if compact else data
+    if row_schema is not None:
+        errors = column_errors(matrix.T, layout.fields, row_schema)
+        if errors:
+            raise WireValueError("; ".join(errors))
+    return matrix, is_raw
+
+
+def encode_request(
+    matrix: np.ndarray,
+    is_raw: Union[bool, Sequence[bool]] = False,
+    compact: bool = False
+) -> bytes:
+    """
+    Binary request body (client side: gateways, tests, benchmarks)
+
+    Args:
+        matrix: Rows in schema order (or compact_fields() order with compact=True)
+        is_raw: True / False for all rows, or one flag per row
+        compact: The matrix holds group codes (FLAG_COMPACT)
+    """
+    data = np.ascontiguousarray(matrix, dtype="<f4")
+    flags = FLAG_COMPACT if compact else 0
+    tail = b""
+    if isinstance(is_raw, (bool, np.bool_)):
+        flags |= FLAG_RAW if is_raw else 0
+    else:
+        flags |= FLAG_ROW_RAW
+        tail = np.asarray(is_raw, dtype=np.uint8).tobytes()
+    return HEADER.pack(REQUEST_MAGIC, data.shape[0], data.shape[1], flags, 0) + data.tobytes() + tail
+
+
+def encode_response(outputs: np.ndarray) -> bytes:
+    """Binary response body of an (n_rows, n_outputs) array"""
+    data = np.ascontiguousarray(outputs, dtype="<f4")
+    return HEADER.pack(RESPONSE_MAGIC, data.shape[0], data.shape[1], 0, 0) + data.tobytes()
+
+
+def decode_response(body: bytes) -> np.ndarray:
+    """(n_rows, n_outputs) float32 array of a binary response body"""
+    magic, n_rows, n_cols, _, _ = HEADER.unpack_from(body)
+    if magic != RESPONSE_MAGIC:
+        raise WireFormatError(f"Bad magic {magic!r}, expected {RESPONSE_MAGIC!r}")
+    return np.frombuffer(body, dtype="<f4", count=n_rows * n_cols, offset=HEADER.size).reshape(n_rows, n_cols)
@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from main import app  # noqa: E402
+from config import Config  # noqa: E402
+from utils.metrics import STAGE_SECONDS, ERRORS  # noqa: E402
+from patients import synthetic_rows  # noqa: E402
+
+
+V1 = Config.API_V1_STR
+# response key -> separate endpoint answering the same question
+SEPARATE = {
+    "hypertension": "/random-forest/predict",
+    "systolic": "/knn/predict/systolic",
+    "diastolic": "/knn/predict/diastolic",
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def _rows(n, seed):
+    rows = synthetic_rows("random_forest", n, seed=seed)
+    for i, row in enumerate(rows):
+        row["is_raw"] = i % 2 == 0
+    return rows
+
+
+@pytest.mark.parametrize("concurrent", [True, False])
+def test_single_matches_separate_endpoints(client, monkeypatch, concurrent):
+    monkeypatch.setattr(Config, "ASSESS_CONCURRENT", concurrent)
+    row = _rows(1, seed=6)[0]
+
+    response = client.post(f"{V1}/assess", json=row)
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == set(SEPARATE)
+    for key, path in SEPARATE.items():
+        assert body[key] == client.post(V1 + path, json=row).json()
+
+
+@pytest.mark.parametrize("concurrent", [True, False])
+def test_batch_matches_separate_batches(client, monkeypatch, concurrent):
+    monkeypatch.setattr(Config, "ASSESS_CONCURRENT", concurrent)
+    rows = _rows(20, seed=9)
+
+    body = client.post(f"{V1}/assess/batch", json={"items": rows}).json()
+    assert body["count"] == 20
+    for key, path in SEPARATE.items():
+        expected = client.post(f"{V1}{path}/batch", json={"items": rows}).json()["predictions"]
+        assert [assessment[key] for assessment in body["predictions"]] == expected
+
+    columns = client.post(f"{V1}/assess/batch", params={"columnar": "true"}, json={"items": rows}).json()
+    assert columns["count"] == 20
+    for key, path in SEPARATE.items():
+        expected = client.post(f"{V1}{path}/batch", params={"columnar": "true"}, json={"items": rows}).json()
+        assert columns[key] == expected
+
+
+def test_missing_shared_feature(client):
+    row = _rows(1, seed=2)[0]
+    del row["Systolic_BP"]
+    assert client.post(f"{V1}/assess", json=row).status_code == 422
+
+
+def test_metrics_are_labelled_assess(client):
+    row = _rows(1, seed=7)[0]
+    handled = STAGE_SECONDS.count("handler", "assess", "raw")
+    errors = ERRORS.value("assess", "422")
+
+    assert client.post(f"{V1}/assess", json=row).status_code == 200
+    assert client.post(f"{V1}/assess/batch", json={"items": []}).status_code == 422
+
+    assert STAGE_SECONDS.count("handler", "assess", "raw") == handled + 1
+    assert ERRORS.value("assess", "422") == errors + 1
+    text = client.get("/metrics").text
+    assert 'bp_stage_duration_seconds_count{stage="handler",model="assess",input_type="raw"}' in text
+    assert 'model="other"' not in text
@@ -0,0 +1,80 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from api.batching import MicroBatcher
+from api.dependencies import get_random_forest_model
+
+
+RAW_INPUT = json.loads((Path(__file__).parent.parent / "test_raw_input.json").read_text())
+
+
+def _raw_rows(n):
+    rows = []
+    for i in range(n):
+        row = dict(RAW_INPUT)
+        row["Age"] = 30 + i
+        row["Systolic_BP"] = 100 + 3 * i
+        rows.append(row)
+    return rows
+
+
+def test_concurrent_rows_are_coalesced_and_resolved_in_order():
+    model = get_random_forest_model()
+    calls = []
+
+    def predict_fn(rows, is_raw):
+        calls.append(len(rows))
+        return list(zip(*model.predict_batch(rows, is_raw=is_raw)))
+
+    batcher = MicroBatcher("rf", predict_fn, max_batch_size=16, max_wait_ms=50)
+    rows = _raw_rows(40)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(row, True) for row in rows))
+
+    results = asyncio.run(run())
+
+    assert calls == [16, 16, 8]
+    for row, result in zip(rows, results):
+        assert result == pytest.approx(model.predict(row, is_raw=True))
+
+    stats = batcher.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["batches"] == 3
+    assert stats["rows"] == 40
+    assert stats["max_seen_batch_size"] == 16
+    assert stats["flushes_by_size"] == 2
+    assert stats["flushes_by_timeout"] == 1
+    assert stats["batch_size_histogram"]["le_16"] == 2
+
+
+def test_failing_row_only_fails_its_own_request():
+    def predict_fn(rows, is_raw):
+        if any(row < 0 for row in rows):
+            raise ValueError("negative row")
+        return [row * 2 for row in rows]
+
+    batcher = MicroBatcher("double", predict_fn, max_batch_size=8, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(row) for row in [1, -1, 3]), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert results[0] == 2
+    assert isinstance(results[1], ValueError)
+    assert results[2] == 6
+
+
+def test_stats_endpoint_reports_batchers():
+    client = TestClient(app)
+    assert client.post("/api/v1/random-forest/predict", json=RAW_INPUT).status_code == 200
+
+    body = client.get("/batching/stats").json()
+    assert "random_forest" in body["models"]
+    assert body["models"]["random_forest"]["rows"] >= 1
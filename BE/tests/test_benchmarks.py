@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+import predict as bench  # noqa: E402
+from patients import SCHEMAS, synthetic_rows  # noqa: E402
+
+
+def test_synthetic_rows_are_valid_requests():
+    for model, schema in SCHEMAS.items():
+        rows = synthetic_rows(model, 200, seed=1)
+        assert rows == synthetic_rows(model, 200, seed=1)
+        for row in rows:
+            schema(**row)
+            assert row["Diabetes_None"] + row["Diabetes_Diabetes"] + row["Diabetes_Type2"] == 1
+
+
+def test_compare_flags_regressions():
+    baseline = {"cases": {"model/a/1": {"median_ms": 1.0}, "model/b/1": {"median_ms": 1.0}}}
+    report = {"cases": {"model/a/1": {"median_ms": 1.1}, "model/b/1": {"median_ms": 1.5}, "model/c/1": {"median_ms": 1.0}}}
+    result = {entry["case"]: entry for entry in bench.compare(report, baseline, threshold=0.25)}
+    assert not result["model/a/1"]["regression"]
+    assert result["model/b/1"]["regression"]
+    assert result["model/c/1"]["baseline_ms"] is None
+
+
+def test_quick_run_covers_models_and_endpoints():
+    report = bench.run(model_sizes=(1, 4), endpoint_sizes=(1, 4), min_repeats=1, min_time=0.0)
+    for model in ("random_forest", "knn_systolic", "knn_diastolic"):
+        for kind in ("model", "endpoint"):
+            assert report["cases"][f"{kind}/{model}/4"]["rows"] == 4
+            assert report["cases"][f"{kind}/{model}/1"]["median_ms"] > 0
@@ -0,0 +1,135 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from main import app  # noqa: E402
+from config import Config  # noqa: E402
+from api.routes.binary import BINARY_MODELS  # noqa: E402
+from utils.features import ONE_HOT_GROUPS  # noqa: E402
+from utils.wire import (  # noqa: E402
+    MEDIA_TYPE, HEADER, REQUEST_MAGIC, compact_fields, encode_request, decode_response
+)
+from patients import SCHEMAS, synthetic_rows  # noqa: E402
+
+
+BINARY = f"{Config.API_V1_STR}/binary"
+HEADERS = {"Content-Type": MEDIA_TYPE}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def _fields(name):
+    return [field for field in SCHEMAS[name].model_fields if field != "is_raw"]
+
+
+def _matrix(rows, fields):
+    return np.array([[row[field] for field in fields] for row in rows], dtype=np.float32)
+
+
+def _compact(rows, name):
+    layout = BINARY_MODELS[name][1]().layout
+    columns = []
+    for field in compact_fields(layout):
+        if field in ONE_HOT_GROUPS:
+            group = ONE_HOT_GROUPS[field]
+            columns.append([next(i for i, f in enumerate(group) if row[f] == 1) for row in rows])
+        else:
+            columns.append([row[field] for row in rows])
+    return np.array(columns, dtype=np.float32).T
+
+
+@pytest.mark.parametrize("name", list(BINARY_MODELS))
+def test_columns_follow_schema_order(name):
+    assert BINARY_MODELS[name][1]().layout.fields == _fields(name)
+
+
+def test_random_forest_matches_json_batch(client):
+    rows = synthetic_rows("random_forest", 40, seed=5)
+    # float32 on the wire: compare with the JSON endpoint on the same float32 values
+    matrix = _matrix(rows, _fields("random_forest"))
+    json_rows = [dict(row, **dict(zip(_fields("random_forest"), map(float, values)))) for row, values in zip(rows, matrix)]
+
+    response = client.post(f"{BINARY}/random-forest/predict", content=encode_request(matrix, True), headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MEDIA_TYPE
+    assert response.headers["x-columns"] == "prediction,probability"
+    assert response.headers["x-model-version"] == Config.BASE_MODEL_VERSION
+    outputs = decode_response(response.content)
+
+    expected = client.post(f"{Config.API_V1_STR}/random-forest/predict/batch", json={"items": json_rows}).json()
+    np.testing.assert_array_equal(outputs[:, 0], [p["prediction"] for p in expected["predictions"]])
+    np.testing.assert_allclose(outputs[:, 1], [p["probability"] for p in expected["predictions"]], rtol=1e-6)
+
+
+@pytest.mark.parametrize("name", ["knn_systolic", "knn_diastolic"])
+def test_knn_compact_groups_and_row_flags(client, name):
+    rows = synthetic_rows(name, 30, seed=2)
+    path = BINARY_MODELS[name][0]
+    is_raw = [i % 3 != 0 for i in range(len(rows))]
+    full = _matrix(rows, _fields(name))
+
+    response = client.post(f"{BINARY}{path}", content=encode_request(full, is_raw), headers=HEADERS)
+    compact = client.post(f"{BINARY}{path}", content=encode_request(_compact(rows, name), is_raw, compact=True), headers=HEADERS)
+    assert response.status_code == compact.status_code == 200
+    np.testing.assert_array_equal(decode_response(response.content), decode_response(compact.content))
+
+    model = BINARY_MODELS[name][1]()
+    expected = model.predict_batch(full.astype(np.float64), is_raw=is_raw)
+    outputs = decode_response(response.content)
+    assert outputs.shape == (30, 6)
+    np.testing.assert_allclose(outputs[:, 1], expected["predicted_value_mmHg"], rtol=1e-6)
+
+
+def test_malformed_bodies(client):
+    url = f"{BINARY}/knn/predict/systolic"
+    rows = synthetic_rows("knn_systolic", 12, seed=1)
+    matrix = _matrix(rows, _fields("knn_systolic"))
+    body = encode_request(matrix, True)
+
+    assert client.post(url, content=b"XXXX" + body[4:], headers=HEADERS).status_code == 400
+    assert "bytes" in client.post(url, content=body[:-4], headers=HEADERS).json()["detail"]
+    assert "columns" in client.post(url, content=encode_request(matrix[:, :-1], True), headers=HEADERS).json()["detail"]
+
+    matrix[[3, 7], 1] = np.nan
+    detail = client.post(url, content=encode_request(matrix, True), headers=HEADERS).json()["detail"]
+    assert "rows 3, 7" in detail
+
+    compact = _compact(rows, "knn_systolic")
+    compact[5, -1] = 3  # Cerebrovascular has codes 0..2
+    detail = client.post(url, content=encode_request(compact, True, compact=True), headers=HEADERS).json()["detail"]
+    assert "Cerebrovascular" in detail and "rows 5" in detail
+
+    too_many = HEADER.pack(REQUEST_MAGIC, Config.MAX_BATCH_SIZE + 1, 15, 1, 0)
+    assert "limit" in client.post(url, content=too_many, headers=HEADERS).json()["detail"]
+
+
+def test_values_the_json_schema_rejects_are_422(client):
+    url = f"{BINARY}/knn/predict/diastolic"
+    fields = _fields("knn_diastolic")
+    rows = synthetic_rows("knn_diastolic", 12, seed=3)
+    matrix = _matrix(rows, fields)
+    sex, diabetes = fields.index("Sex"), [fields.index(field) for field in ("Diabetes_Diabetes", "Diabetes_None")]
+    matrix[2, sex] = 0.5
+    matrix[4, sex] = 2
+    matrix[6, diabetes] = 1  # two categories of one group
+    matrix[8, diabetes] = 0  # none
+
+    response = client.post(url, content=encode_request(matrix, True), headers=HEADERS)
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert "Sex must be an integer: rows 2" in detail and "Sex must be <= 1: rows 4" in detail
+    assert "exactly one of Diabetes_Diabetes" in detail and "rows 6, 8" in detail
+
+    # Compact bodies get the same checks on their plain columns
+    compact = _compact(rows, "knn_diastolic")
+    compact[1, compact_fields(BINARY_MODELS["knn_diastolic"][1]().layout).index("Sex")] = -1
+    response = client.post(url, content=encode_request(compact, True, compact=True), headers=HEADERS)
+    assert response.status_code == 422 and "Sex must be >= 0: rows 1" in response.json()["detail"]
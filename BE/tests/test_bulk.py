@@ -0,0 +1,152 @@
+import asyncio
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from main import app  # noqa: E402
+from config import Config  # noqa: E402
+from api.dependencies import get_random_forest_model, get_knn_systolic_model, get_knn_diastolic_model  # noqa: E402
+from api.routes.bulk import score_stream  # noqa: E402
+from utils.streaming import Decoder, InflatedTooLarge  # noqa: E402
+from patients import synthetic_rows  # noqa: E402
+
+
+URL = f"{Config.API_V1_STR}/bulk/score"
+
+
+def _ndjson(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def test_ndjson_matches_batch_predictions(client):
+    rows = synthetic_rows("random_forest", 25)
+    response = client.post(
+        f"{URL}?chunk_size=10", content=_ndjson(rows), headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = _lines(response)
+    results, summary = lines[:-1], lines[-1]["summary"]
+
+    assert [line["row"] for line in results] == list(range(25))
+    predictions, probabilities = get_random_forest_model().predict_batch(rows, is_raw=True)
+    assert [line["random_forest"]["prediction"] for line in results] == predictions
+    assert [line["random_forest"]["probability"] for line in results] == pytest.approx(probabilities)
+    expected = get_knn_systolic_model().predict_batch(rows, is_raw=True)["predicted_value_mmHg"]
+    assert [line["knn_systolic"]["predicted_value_mmHg"] for line in results] == pytest.approx(expected)
+    assert summary["rows"] == 25 and summary["invalid_rows"] == 0
+    assert summary["model_versions"]["random_forest"] == Config.BASE_MODEL_VERSION
+
+
+def test_gzip_csv_with_bad_rows(client):
+    rows = synthetic_rows("random_forest", 3)
+    header = list(rows[0])
+    lines = [",".join(header)] + [",".join(str(row[field]) for field in header) for row in rows]
+    lines.insert(2, "1,2")  # wrong column count
+    body = gzip.compress(("\n".join(lines) + "\n").encode())
+
+    response = client.post(
+        f"{URL}?models=random_forest", content=body,
+        headers={"Content-Type": "text/csv", "Content-Encoding": "gzip"}
+    )
+    results = _lines(response)
+    assert "error" in results[1] and "random_forest" not in results[1]
+    assert [r["random_forest"]["prediction"] for r in (results[0], results[2], results[3])] == (
+        get_random_forest_model().predict_batch(rows, is_raw=True)[0]
+    )
+    assert results[-1]["summary"]["invalid_rows"] == 1
+
+
+def test_validation_errors_are_per_model(client):
+    row = synthetic_rows("knn_systolic", 1)[0]  # no Systolic_BP: fine for knn_systolic only
+    response = client.post(f"{URL}?models=random_forest,knn_systolic&is_raw=true", content=_ndjson([row, {"x": 1}]))
+    first, second, summary = _lines(response)
+    assert "Systolic_BP" in first["random_forest"]["error"]
+    assert "predicted_value_mmHg" in first["knn_systolic"]
+    assert "error" in second["knn_systolic"]
+    assert summary["summary"]["model_errors"] == {"random_forest": 2, "knn_systolic": 1}
+
+
+def test_unknown_model_is_rejected(client):
+    assert client.post(f"{URL}?models=svm", content=b"").status_code == 400
+
+
+def test_results_stream_before_the_upload_ends():
+    rows = synthetic_rows("knn_diastolic", 40)
+    body = _ndjson(rows)
+    pieces = [body[i:i + 97] for i in range(0, len(body), 97)]
+    consumed = []
+
+    async def upload():
+        for piece in pieces:
+            consumed.append(len(piece))
+            yield piece
+
+    async def first_output():
+        stream = score_stream(upload(), ["knn_diastolic"], chunk_size=10)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    first = asyncio.run(first_output())
+    assert len(first.decode().splitlines()) == 10
+    # Only about a quarter of the upload was read when the first chunk came back
+    assert len(consumed) < len(pieces) / 2
+
+
+def test_gzip_is_inflated_in_bounded_steps():
+    bomb = gzip.compress(b"\n" * (8 * 1024 * 1024))  # ~8 KB expanding to 8 MB
+    decoder = Decoder(step=64 * 1024)
+    pieces = [len(text) for text in decoder.decode(bomb)]
+    assert max(pieces) <= 64 * 1024 and sum(pieces) + len(decoder.flush()) == 8 * 1024 * 1024
+
+    with pytest.raises(InflatedTooLarge):
+        for _ in Decoder(max_size=1024 * 1024).decode(bomb):
+            pass
+
+
+def _collect(stream):
+    async def run():
+        return [json.loads(line) for piece in [piece async for piece in stream] for line in piece.decode().splitlines()]
+    return asyncio.run(run())
+
+
+def test_model_failure_is_reported_in_band(monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("model exploded")
+
+    monkeypatch.setattr(get_knn_diastolic_model(), "predict_batch", broken)
+
+    async def upload():
+        yield _ndjson(synthetic_rows("knn_diastolic", 5))
+
+    lines = _collect(score_stream(upload(), ["knn_diastolic"], default_raw=True, chunk_size=10))
+    summary = lines[-1]["summary"]
+    assert len(lines) == 1 and summary["unscored_rows"] == 5
+    assert summary["aborted"] == "Scoring failed: RuntimeError: model exploded"
+
+
+def test_inflate_limit_aborts_in_band(monkeypatch):
+    monkeypatch.setattr(Config, "BULK_MAX_INFLATED_BYTES", 4096)
+    rows = synthetic_rows("knn_systolic", 200)
+
+    async def upload():
+        yield gzip.compress(_ndjson(rows))
+
+    summary = _collect(score_stream(upload(), ["knn_systolic"], default_raw=True))[-1]["summary"]
+    assert summary["aborted"].startswith("InflatedTooLarge")
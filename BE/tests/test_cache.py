@@ -0,0 +1,174 @@
+import time
+
+import numpy as np
+import pytest
+
+from config import Config
+from api.dependencies import get_model_registry
+from models.random_forest_model import RandomForestModel
+from models.knn_model import KNNDiastolicModel
+from utils.cache import PredictionCache, ENTRY_OVERHEAD
+from utils import metrics
+from utils.schemas import RandomForestPredictionRequest, KNNDiastolicPredictionRequest
+
+
+RF_RAW = RandomForestPredictionRequest.model_config["json_schema_extra"]["example_raw"]
+RF_NORMALIZED = RandomForestPredictionRequest.model_config["json_schema_extra"]["example_normalized"]
+KNN_RAW = KNNDiastolicPredictionRequest.model_config["json_schema_extra"]["example_raw"]
+
+
+def _compute_counting(calls):
+    def compute(rows):
+        calls.append(list(rows))
+        return np.column_stack([rows * 10.0, rows + 0.5])
+    return compute
+
+
+def test_duplicates_computed_once_and_hits_reused():
+    cache = PredictionCache("test", max_bytes=1 << 20)
+    matrix = np.array([[1.0, 2.0], [3.0, 4.0], [1.0, 2.0], [-0.0, 0.0]])
+    calls = []
+
+    first = cache.get_or_compute("v1", matrix, np.zeros(4, dtype=bool), _compute_counting(calls))
+    assert calls == [[0, 1, 3]]
+    np.testing.assert_array_equal(first[:, 0], [0.0, 10.0, 0.0, 30.0])
+
+    # Rows 0 and 2 are the same row; -0.0 == 0.0; raw flag and version are part of the key
+    matrix2 = np.array([[0.0, 0.0], [1.0, 2.0], [1.0, 2.0]])
+    second = cache.get_or_compute("v1", matrix2, np.array([False, False, True]), _compute_counting(calls))
+    assert calls[1] == [2]
+    np.testing.assert_array_equal(second[:2], first[[3, 0]])
+    cache.get_or_compute("v2", matrix2[:1], np.zeros(1, dtype=bool), _compute_counting(calls))
+    assert calls[2] == [0]
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["duplicates"]) == (2, 5, 1)
+    assert metrics.CACHE_REQUESTS.value("test", "hit") >= 2
+
+
+def test_memory_cap_evicts_least_recently_used():
+    entry = 3 * 8 + 2 * 8 + ENTRY_OVERHEAD
+    cache = PredictionCache("test_lru", max_bytes=2 * entry)
+    rows = np.arange(6, dtype=float).reshape(3, 2)
+    mask = np.zeros(1, dtype=bool)
+    compute = _compute_counting([])
+
+    cache.get_or_compute("v", rows[:1], mask, compute)
+    cache.get_or_compute("v", rows[1:2], mask, compute)
+    cache.get_or_compute("v", rows[:1], mask, compute)   # row 0 becomes most recent
+    cache.get_or_compute("v", rows[2:3], mask, compute)  # evicts row 1
+    assert len(cache) == 2 and cache.bytes == 2 * entry
+
+    calls = []
+    cache.get_or_compute("v", rows[:1], mask, _compute_counting(calls))
+    cache.get_or_compute("v", rows[1:2], mask, _compute_counting(calls))
+    assert calls == [[0]]
+    assert cache.stats()["evictions"]["size"] == 2
+
+
+def test_entries_expire_and_clear_invalidates():
+    cache = PredictionCache("test_ttl", max_bytes=1 << 20, ttl_s=0.05)
+    row, mask = np.ones((1, 3)), np.zeros(1, dtype=bool)
+    calls = []
+    cache.get_or_compute("v", row, mask, _compute_counting(calls))
+    time.sleep(0.06)
+    cache.get_or_compute("v", row, mask, _compute_counting(calls))
+    assert len(calls) == 2 and cache.stats()["evictions"]["expired"] == 1
+
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0
+    assert cache.stats()["evictions"]["invalidated"] == 1
+
+
+def test_random_forest_results_unchanged():
+    cached = RandomForestModel(Config.RANDOM_FOREST_MODEL_PATH, Config.RANDOM_FOREST_SCALER_PATH)
+    plain = RandomForestModel(Config.RANDOM_FOREST_MODEL_PATH, Config.RANDOM_FOREST_SCALER_PATH)
+    cached.cache = PredictionCache("random_forest", max_bytes=1 << 20)
+    plain.cache = None
+    rows = [RF_RAW, RF_NORMALIZED, RF_RAW, RF_NORMALIZED]
+    mask = [True, False, True, False]
+
+    expected = plain.predict_batch(rows, is_raw=mask)
+    assert cached.predict_batch(rows, is_raw=mask) == expected
+    assert cached.predict_batch(rows, is_raw=mask) == expected
+    assert cached.predict(RF_RAW, is_raw=True) == plain.predict(RF_RAW, is_raw=True)
+    assert cached.cache.stats()["misses"] == 2
+
+
+def test_knn_results_unchanged():
+    cached = KNNDiastolicModel(Config.KNN_DIASTOLIC_MODEL_PATH, Config.KNN_DIASTOLIC_SCALER_PATH)
+    plain = KNNDiastolicModel(Config.KNN_DIASTOLIC_MODEL_PATH, Config.KNN_DIASTOLIC_SCALER_PATH)
+    cached.cache = PredictionCache("knn_diastolic", max_bytes=1 << 20)
+    plain.cache = None
+    rows = [KNN_RAW, dict(KNN_RAW, Age=KNN_RAW["Age"] + 1), KNN_RAW]
+
+    expected = plain.predict_batch(rows, is_raw=True)
+    assert cached.predict_batch(rows, is_raw=True) == expected
+    assert cached.predict(KNN_RAW, is_raw=True) == plain.predict(KNN_RAW, is_raw=True)
+    stats = cached.cache.stats()
+    assert (stats["misses"], stats["duplicates"], stats["hits"]) == (2, 1, 1)
+
+
+def test_swap_invalidates_cache():
+    registry = get_model_registry()
+    model = registry.get("knn_diastolic")
+    if model.cache is None:
+        pytest.skip("prediction cache disabled")
+    model.predict(KNN_RAW, is_raw=True)
+    assert len(model.cache) > 0
+
+    registry.reload("knn_diastolic")
+    assert len(model.cache) == 0
+    assert registry.get("knn_diastolic").cache is model.cache
+
+
+def test_unique_rows_in_first_occurrence_order():
+    from utils.cache import unique_rows
+
+    matrix = np.array([[3.0, 4.0], [1.0, 2.0], [3.0, 4.0], [-0.0, 0.0], [0.0, 0.0], [1.0, 2.0]])
+    raw_mask = np.array([False, False, False, False, False, True])
+    positions, inverse = unique_rows(matrix, raw_mask)
+    np.testing.assert_array_equal(positions, [0, 1, 3, 5])
+    np.testing.assert_array_equal(inverse, [0, 1, 0, 2, 2, 3])
+
+
+def test_unique_rows_hash_collision_falls_back_to_exact():
+    from utils.cache import unique_rows
+
+    # Row hash = bits * w0 + is_raw * w1 (mod 2**64): pick a raw row with the hash of a normalized one
+    weights = np.random.default_rng(1).integers(1, 2 ** 63, size=2, dtype=np.uint64) | np.uint64(1)
+    w0, w1 = int(weights[0]), int(weights[1])
+    inverse_w0 = pow(w0, -1, 2 ** 64)
+    for value in np.linspace(1.0, 100.0, 1000):
+        bits = int(np.float64(value).view(np.uint64))
+        other = np.uint64((bits - w1 * inverse_w0) % 2 ** 64).view(np.float64)
+        if np.isfinite(other):
+            break
+    matrix = np.array([[value], [other]])
+    raw_mask = np.array([False, True])
+    codes = matrix.view(np.uint64) @ weights[:1] + raw_mask * weights[1]
+    assert codes[0] == codes[1]
+
+    positions, inverse = unique_rows(matrix, raw_mask)
+    np.testing.assert_array_equal(positions, [0, 1])
+    np.testing.assert_array_equal(inverse, [0, 1])
+
+
+def test_large_batches_skip_the_cache_but_are_deduplicated(monkeypatch):
+    model = KNNDiastolicModel(Config.KNN_DIASTOLIC_MODEL_PATH, Config.KNN_DIASTOLIC_SCALER_PATH)
+    model.cache = PredictionCache("knn_diastolic", max_bytes=1 << 20)
+    monkeypatch.setattr(Config, "PREDICTION_CACHE_MAX_ROWS", 2)
+    searched = []
+    predict_matrix = model._predict_matrix
+    monkeypatch.setattr(model, "_predict_matrix", lambda matrix, *args: searched.append(len(matrix)) or predict_matrix(matrix, *args))
+    rows = [KNN_RAW, dict(KNN_RAW, Age=KNN_RAW["Age"] + 1), KNN_RAW, KNN_RAW]
+
+    result = model.predict_batch(rows, is_raw=True)
+    assert searched == [2] and len(model.cache) == 0
+    assert model.cache.stats()["misses"] == 0
+    assert result["predicted_value_mmHg"][0] == result["predicted_value_mmHg"][2] == result["predicted_value_mmHg"][3]
+
+    # Same dedup with the cache disabled
+    model.cache = None
+    assert model.predict_batch(rows, is_raw=True) == result
+    assert searched == [2, 2]
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from api.dependencies import get_inference_executor, get_knn_systolic_model
+from api.executor import InferenceExecutor, InferenceOverloaded
+
+
+KNN_INPUTS = json.loads((Path(__file__).parent.parent / "test_knn_input.json").read_text())
+
+
+def test_model_calls_run_off_the_event_loop_thread():
+    executor = InferenceExecutor(kind="thread", workers=2, max_queue=4)
+
+    async def run():
+        return threading.get_ident(), await executor.run(threading.get_ident)
+
+    loop_thread, worker_thread = asyncio.run(run())
+    executor.shutdown()
+
+    assert loop_thread != worker_thread
+    assert executor.stats()["completed"] == 1
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    executor = InferenceExecutor(kind="thread", workers=1, max_queue=1, retry_after=3)
+    release = threading.Event()
+
+    async def run():
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(InferenceOverloaded) as exc_info:
+            await executor.run(release.wait)
+        assert executor.stats()["queue_depth"] == 1
+        release.set()
+        await asyncio.gather(*running)
+        return exc_info.value
+
+    error = asyncio.run(run())
+    executor.shutdown()
+
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "3"}
+    assert executor.stats()["rejected"] == 1
+
+
+def test_endpoint_returns_503_when_overloaded():
+    saturated = InferenceExecutor(kind="thread", workers=1, max_queue=0)
+    saturated._in_flight = saturated.capacity
+    app.dependency_overrides[get_inference_executor] = lambda: saturated
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/api/v1/knn/predict/systolic/batch",
+            json={"items": [KNN_INPUTS["test_systolic_raw"]]}
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(saturated.retry_after)
+
+
+def test_process_pool_matches_in_process_prediction():
+    executor = InferenceExecutor(kind="process", workers=1, warm_up=(get_knn_systolic_model,))
+    row = {k: v for k, v in KNN_INPUTS["test_systolic_raw"].items() if k != "is_raw"}
+
+    async def run():
+        return await executor.run_model(get_knn_systolic_model, "predict", row, is_raw=True)
+
+    try:
+        result = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert result == pytest.approx(get_knn_systolic_model().predict(row, is_raw=True))
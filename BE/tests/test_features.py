@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from utils.features import FeatureLayout
+
+
+COLUMNS = ['Sex', 'Age', 'Diabetes_Type 2 Diabetes', 'Cerebrovascular_disease_None']
+
+
+def test_vectorize_accepts_request_and_training_names():
+    layout = FeatureLayout(COLUMNS, ['Age'])
+    by_field = {'Sex': 1, 'Age': 40.5, 'Diabetes_Type2': 1, 'Cerebrovascular_None': 0}
+    by_column = {'Sex': 1, 'Age': 40.5, 'Diabetes_Type 2 Diabetes': 1, 'Cerebrovascular_disease_None': 0}
+
+    expected = np.array([[1.0, 40.5, 1.0, 0.0], [1.0, 40.5, 1.0, 0.0]])
+    np.testing.assert_array_equal(layout.vectorize([by_field, by_column]), expected)
+    np.testing.assert_array_equal(layout.vectorize(by_field), expected[:1])
+
+
+def test_missing_features_default_to_zero_unless_strict():
+    row = {'Sex': 0, 'Age': 30}
+
+    np.testing.assert_array_equal(FeatureLayout(COLUMNS, ['Age'], strict=False).vectorize(row), [[0, 30, 0, 0]])
+    with pytest.raises(ValueError):
+        FeatureLayout(COLUMNS, ['Age']).vectorize(row)
+
+
+def test_scale_rows_only_touches_raw_rows():
+    class Scaler:
+        mean_ = np.array([10.0])
+        scale_ = np.array([2.0])
+
+    layout = FeatureLayout(COLUMNS, ['Age'])
+    layout.bind_scaler(Scaler())
+    matrix = layout.vectorize([{'Sex': 0, 'Age': 14, 'Diabetes_Type2': 0, 'Cerebrovascular_None': 1}] * 2)
+
+    layout.scale_rows(matrix, [True, False])
+
+    np.testing.assert_array_equal(matrix[:, 1], [2.0, 14.0])
@@ -0,0 +1,149 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from api.dependencies import get_knn_systolic_model
+
+
+KNN_INPUTS = json.loads((Path(__file__).parent.parent / "test_knn_input.json").read_text())
+
+# Responses of the original per-row implementation for test_knn_input.json
+EXPECTED_SYSTOLIC = {
+    "predicted_normalized": 0.3738219459188276,
+    "prediction_std_normalized": 1.08377923841676,
+    "predicted_value_mmHg": 135.56286599928382,
+    "prediction_std_mmHg": 22.085013805245044,
+    "confidence_interval_lower": 92.27623894100353,
+    "confidence_interval_upper": 178.8494930575641,
+}
+EXPECTED_DIASTOLIC = {
+    "predicted_normalized": 1.604488479936729,
+    "prediction_std_normalized": 1.1063071549688808,
+    "predicted_value_mmHg": 89.67711221173843,
+    "prediction_std_mmHg": 12.292403379211693,
+    "confidence_interval_lower": 65.58400158848352,
+    "confidence_interval_upper": 113.77022283499335,
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def _rows(base, bp_field, n):
+    rows = []
+    for i in range(n):
+        row = dict(base)
+        row["Age"] = 30 + i
+        row[bp_field] = 60 + 4 * i
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize("case, endpoint, expected", [
+    ("test_systolic_raw", "systolic", EXPECTED_SYSTOLIC),
+    ("test_systolic_normalized", "systolic", EXPECTED_SYSTOLIC),
+    ("test_diastolic_raw", "diastolic", EXPECTED_DIASTOLIC),
+    ("test_diastolic_normalized", "diastolic", EXPECTED_DIASTOLIC),
+])
+def test_single_prediction_matches_reference(client, case, endpoint, expected):
+    response = client.post(f"/api/v1/knn/predict/{endpoint}", json=KNN_INPUTS[case])
+    assert response.status_code == 200
+    body = response.json()
+    for key, value in expected.items():
+        assert body[key] == pytest.approx(value, rel=1e-9)
+    assert body["model_type"] == f"knn_{endpoint}"
+
+
+@pytest.mark.parametrize("case, endpoint, bp_field", [
+    ("test_systolic_raw", "systolic", "Diastolic_BP"),
+    ("test_diastolic_raw", "diastolic", "Systolic_BP"),
+])
+def test_batch_matches_single_predictions(client, case, endpoint, bp_field):
+    rows = _rows(KNN_INPUTS[case], bp_field, 25)
+    rows[3] = KNN_INPUTS[case.replace("raw", "normalized")]
+
+    response = client.post(f"/api/v1/knn/predict/{endpoint}/batch", json={"items": rows})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == len(rows)
+
+    for row, result in zip(rows, body["predictions"]):
+        single = client.post(f"/api/v1/knn/predict/{endpoint}", json=row).json()
+        assert result == pytest.approx(single)
+
+
+def _joint_row(case):
+    row = dict(KNN_INPUTS[case])
+    row.pop("Diastolic_BP")
+    return row
+
+
+def test_joint_estimation_matches_client_side_alternation(client):
+    row = _joint_row("test_systolic_raw")
+    systolic, diastolic = 120.0, 80.0
+    for _ in range(3):
+        sbp = client.post("/api/v1/knn/predict/systolic", json=dict(row, Diastolic_BP=diastolic)).json()
+        systolic = sbp["predicted_value_mmHg"]
+        dbp = client.post("/api/v1/knn/predict/diastolic", json=dict(row, Systolic_BP=systolic)).json()
+        diastolic = dbp["predicted_value_mmHg"]
+
+    response = client.post(
+        "/api/v1/knn/predict/joint",
+        json=dict(row, max_iterations=3, tolerance_mmHg=0.0)
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["iterations"] == 3
+    assert body["systolic"] == pytest.approx(sbp)
+    assert body["diastolic"] == pytest.approx(dbp)
+
+
+def test_joint_estimation_converges_and_stops_early(client):
+    body = client.post("/api/v1/knn/predict/joint", json=_joint_row("test_systolic_raw")).json()
+    assert body["converged"]
+    assert body["iterations"] < 10
+
+
+def test_joint_batch_matches_single_rows(client):
+    rows = [_joint_row("test_systolic_raw"), _joint_row("test_systolic_normalized")]
+    rows.append(dict(rows[0], Age=70, max_iterations=2))
+
+    response = client.post("/api/v1/knn/predict/joint/batch", json={"items": rows})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == len(rows)
+
+    for row, result in zip(rows, body["predictions"]):
+        single = client.post("/api/v1/knn/predict/joint", json=row).json()
+        assert result["iterations"] == single["iterations"]
+        assert result["systolic"] == pytest.approx(single["systolic"])
+        assert result["diastolic"] == pytest.approx(single["diastolic"])
+
+    # Raw and normalized versions of the same patient land on the same estimate
+    raw, normalized = body["predictions"][:2]
+    assert normalized["systolic"]["predicted_value_mmHg"] == pytest.approx(raw["systolic"]["predicted_value_mmHg"])
+    assert body["predictions"][2]["iterations"] <= 2
+
+
+def test_raw_rows_skip_scaling_and_match_scaled_path():
+    model = get_knn_systolic_model()
+    rows = _rows({k: v for k, v in KNN_INPUTS["test_systolic_raw"].items() if k != "is_raw"}, "Diastolic_BP", 50)
+    raw = model.layout.vectorize(rows)
+    normalized = model.preprocess(raw.copy(), is_raw=True)
+
+    assert model.raw_engine is not None
+    expected = model.engine.kneighbors(normalized)
+    distances, indices = model.raw_engine.kneighbors(raw)
+    np.testing.assert_array_equal(indices, expected[1])
+    np.testing.assert_allclose(distances, expected[0], rtol=1e-9, atol=1e-9)
+
+    result = model.predict_batch(raw, is_raw=True)
+    mixed = model.predict_batch(np.vstack([raw[:25], normalized[25:]]), is_raw=[True] * 25 + [False] * 25)
+    for key, values in result.items():
+        assert mixed[key] == pytest.approx(values, abs=1e-9)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import KNeighborsRegressor
+
+from models.knn_engine import BruteForceKNN
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(175, 15))
+    y = rng.normal(size=175)
+    queries = np.vstack([rng.normal(size=(500, 15)), X[:20], 100 * rng.normal(size=(5, 15))])
+    return X, y, queries
+
+
+@pytest.mark.parametrize("weights", ["uniform", "distance"])
+@pytest.mark.parametrize("metric", ["euclidean", "minkowski", "manhattan"])
+def test_engine_matches_sklearn(data, weights, metric):
+    X, y, queries = data
+    model = KNeighborsRegressor(n_neighbors=11, weights=weights, metric=metric).fit(X, y)
+    engine = BruteForceKNN.from_sklearn(model)
+
+    expected_distances, expected_indices = model.kneighbors(queries)
+    distances, indices = engine.kneighbors(queries, chunk_size=128)
+    prediction, neighbor_values = engine.predict_from_neighbors(distances, indices)
+
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(prediction, model.predict(queries), rtol=1e-12, atol=1e-12)
+    np.testing.assert_array_equal(neighbor_values, y[expected_indices])
+
+
+def test_engine_uses_shortlist_only_for_euclidean(data):
+    X, y, _ = data
+    euclidean = BruteForceKNN.from_sklearn(KNeighborsRegressor(n_neighbors=11).fit(X, y))
+    manhattan = BruteForceKNN.from_sklearn(KNeighborsRegressor(n_neighbors=11, metric="manhattan").fit(X, y))
+
+    assert euclidean.metric == "euclidean"
+    assert euclidean.n_candidates == 22
+    assert manhattan.metric == "manhattan"
+
+
+@pytest.mark.parametrize("weights", ["uniform", "distance"])
+def test_folded_engine_matches_scaled_search(data, weights):
+    X, y, queries = data
+    model = KNeighborsRegressor(n_neighbors=11, weights=weights).fit(X, y)
+    engine = BruteForceKNN.from_sklearn(model)
+
+    cols = np.arange(1, 7)
+    mean = np.array([50.0, 165.0, 60.0, 75.0, 80.0, 22.0])
+    scale = np.array([12.0, 8.0, 10.0, 11.0, 12.0, 3.0])
+    raw_queries = queries.copy()
+    raw_queries[:, cols] = raw_queries[:, cols] * scale + mean
+    folded = engine.fold_scaler(cols, mean, scale)
+
+    expected_distances, expected_indices = model.kneighbors(queries)
+    distances, indices = folded.kneighbors(raw_queries, chunk_size=128)
+    prediction, _ = folded.predict_from_neighbors(distances, indices)
+
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(prediction, model.predict(queries), rtol=1e-9, atol=1e-9)
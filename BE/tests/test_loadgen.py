@@ -0,0 +1,53 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+import loadgen  # noqa: E402
+from main import app  # noqa: E402
+
+
+def _run(**kwargs):
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadgen") as client:
+            return await loadgen.run("http://loadgen", client=client, **kwargs)
+    return asyncio.run(go())
+
+
+def test_open_loop_reports_percentiles_per_endpoint():
+    summary = _run(mode="open", qps=60, duration=0.5)
+    assert set(summary) == {
+        "/api/v1/random-forest/predict", "/api/v1/knn/predict/systolic", "/api/v1/knn/predict/diastolic", "total"
+    }
+    total = summary["total"]
+    assert total["requests"] == 30
+    assert total["error_rate"] == 0.0
+    assert total["p50_ms"] <= total["p99_ms"] <= total["p99.9_ms"]
+
+
+def test_closed_loop_and_errors():
+    summary = _run(mode="closed", concurrency=4, duration=0.3, endpoints=["knn_joint"])
+    assert summary["/api/v1/knn/predict/joint"]["requests"] > 0
+
+
+def test_replay_skips_non_request_lines(tmp_path):
+    log = tmp_path / "traffic.jsonl"
+    rows = [
+        {"request_id": "not-a-request"},
+        {"method": "POST", "path": "/api/v1/random-forest/predict", "body": {}, "ts": 100.0},
+        {"method": "GET", "path": "/health", "ts": 100.1},
+    ]
+    log.write_text("\n".join(json.dumps(row) for row in rows))
+    specs = loadgen.load_replay(str(log))
+    assert [spec.offset for spec in specs] == pytest.approx([0.0, 0.1])
+
+    summary = _run(mode="open", duration=1.0, replay=str(log))
+    assert summary["/api/v1/random-forest/predict"]["statuses"] == {"422": 1}
+    assert summary["/api/v1/random-forest/predict"]["error_rate"] == 1.0
+    assert summary["/health"]["statuses"] == {"200": 1}
@@ -0,0 +1,110 @@
+import io
+import json
+import logging
+import queue
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from main import app  # noqa: E402
+from config import Config  # noqa: E402
+from utils import log  # noqa: E402
+from api.dependencies import get_random_forest_model  # noqa: E402
+from patients import synthetic_rows  # noqa: E402
+
+
+V1 = Config.API_V1_STR
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Log records of the test as parsed JSON lines (DEBUG, every hot-path event kept)"""
+    monkeypatch.setattr(Config, "LOG_DEBUG_SAMPLE_RATE", 1.0)
+    stream = io.StringIO()
+    log.configure(level="DEBUG", fmt="json", stream=stream)
+    records = []
+
+    def read():
+        log.shutdown()  # writes everything still queued
+        records.extend(json.loads(line) for line in stream.getvalue().splitlines())
+        return records
+
+    yield read
+    log.shutdown()
+    log.configure()
+
+
+def test_request_records_carry_the_request_id(client, captured, capsys, monkeypatch):
+    # sklearn path: the scaler runs in the inference thread and logs a hot-path event
+    monkeypatch.setattr(get_random_forest_model(), "compiled", None)
+    rows = synthetic_rows("random_forest", 5, seed=1)
+    for row in rows:
+        row["is_raw"] = True
+
+    response = client.post(f"{V1}/random-forest/predict/batch", json={"items": rows}, headers={"X-Request-ID": "intake-42"})
+    assert response.status_code == 200
+    assert response.headers["x-request-id"] == "intake-42"
+    assert capsys.readouterr().out == ""
+
+    records = [record for record in captured() if record.get("request_id") == "intake-42"]
+    messages = {record["msg"]: record for record in records}
+    # Model record from the inference thread and the request record with its stage timings
+    assert messages["Normalized raw input using scaler"]["rows"] == 5
+    request = messages["Request"]
+    assert request["path"] == f"{V1}/random-forest/predict/batch"
+    assert request["status"] == 200 and request["input_type"] == "raw"
+    assert {"validation_ms", "handler_ms", "serialization_ms", "total_ms"} <= set(request)
+    assert request["level"] == "DEBUG" and request["logger"] == "bp.api.metrics"
+
+
+def test_generated_request_id(client):
+    first = client.get("/health").headers["x-request-id"]
+    second = client.get("/health").headers["x-request-id"]
+    assert len(first) == 16 and first != second
+
+
+def test_failed_requests_are_logged_without_debug(client, monkeypatch):
+    from api.executor import InferenceExecutor
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(InferenceExecutor, "run", broken)
+    stream = io.StringIO()
+    log.configure(level="INFO", fmt="json", stream=stream)
+    try:
+        row = dict(synthetic_rows("knn_systolic", 1, seed=2)[0], is_raw=True)
+        assert client.post(f"{V1}/knn/predict/systolic/batch", json={"items": [row]}).status_code == 500
+        client.post(f"{V1}/knn/predict/systolic/batch", json={"items": []})
+    finally:
+        log.shutdown()
+        log.configure()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record["msg"] for record in records] == ["Request failed"]
+    assert records[0]["status"] == 500 and records[0]["level"] == "WARNING"
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = log.DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("bp.test.dropping")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.warning("record %d", i, extra=log.fields(i=i))
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.dropped == 3
+    first = handler.queue.get_nowait()
+    assert first.getMessage() == "record 0" and first.fields == {"i": 0}
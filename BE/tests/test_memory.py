@@ -0,0 +1,20 @@
+import os
+
+from utils.memory import format_memory_report, process_memory
+
+
+def test_process_memory_reports_shared_and_private_pages():
+    memory = process_memory()
+
+    assert memory["rss_kb"] > 0
+    if "pss_kb" in memory:
+        assert memory["shared_kb"] + memory["private_kb"] == memory["rss_kb"]
+
+
+def test_memory_report_has_one_line_per_process():
+    report = format_memory_report([("parent", os.getpid()), ("self", os.getpid())])
+
+    lines = report.splitlines()
+    assert len(lines) == 4
+    assert lines[1].startswith("parent")
+    assert lines[-1].startswith("total (PSS)")
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from main import app
+from config import Config
+from utils.metrics import Counter, Histogram, StageTimer, STAGE_SECONDS, ERRORS, input_type
+
+
+RAW_INPUT = json.loads((Path(__file__).parent.parent / "test_raw_input.json").read_text())
+KNN_INPUTS = json.loads((Path(__file__).parent.parent / "test_knn_input.json").read_text())
+
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "a")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a",le="1"} 3' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 'test_seconds_sum{stage="a"} 6.05' in lines
+    assert 'test_seconds_count{stage="a"} 4' in lines
+
+
+def test_thread_shards_are_summed():
+    counter = Counter("test_total", "Test", ("model",))
+
+    def work():
+        for _ in range(10_000):
+            counter.inc("rf")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value("rf") == 40_000
+
+
+def test_input_type():
+    assert input_type(True) == "raw"
+    assert input_type(False) == "normalized"
+    assert input_type([True, False]) == "mixed"
+    assert input_type([False, False]) == "normalized"
+
+
+def test_recording_overhead():
+    histogram = Histogram("overhead_seconds", "Test", ("stage", "model", "input_type"))
+    n = 20_000
+    start = time.perf_counter()
+    for _ in range(n):
+        # What one single-row request records: model stages plus the three route stages
+        timer = StageTimer("random_forest", True)
+        timer.lap("vectorize")
+        timer.rows(1)
+        timer.lap("predict_proba")
+        for stage in ("validation", "handler", "serialization"):
+            histogram.observe(0.001, stage, "random_forest", "raw")
+    per_request_us = (time.perf_counter() - start) / n * 1e6
+    assert per_request_us < 10
+
+
+def test_metrics_endpoint_reports_stages():
+    client = TestClient(app)
+    before = STAGE_SECONDS.count("validation", "knn_systolic", "raw")
+    assert client.post(f"{Config.API_V1_STR}/random-forest/predict", json=RAW_INPUT).status_code == 200
+    assert client.post(f"{Config.API_V1_STR}/knn/predict/systolic", json=KNN_INPUTS["test_systolic_raw"]).status_code == 200
+    errors_before = ERRORS.value("random_forest", "422")
+    assert client.post(f"{Config.API_V1_STR}/random-forest/predict", json={}).status_code == 422
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    for stage in ("validation", "vectorize", "predict_proba", "handler", "serialization"):
+        assert f'bp_stage_duration_seconds_count{{stage="{stage}",model="random_forest",input_type="raw"}}' in text
+    assert 'stage="kneighbors",model="knn_systolic",input_type="raw"' in text
+    assert 'bp_batch_size_rows_count{model="knn_systolic"}' in text
+    assert STAGE_SECONDS.count("validation", "knn_systolic", "raw") == before + 1
+    assert ERRORS.value("random_forest", "422") == errors_before + 1
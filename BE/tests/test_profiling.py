@@ -0,0 +1,141 @@
+import json
+import pstats
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from main import app  # noqa: E402
+from config import Config  # noqa: E402
+from utils import profiling  # noqa: E402
+from patients import synthetic_rows  # noqa: E402
+
+
+V1 = Config.API_V1_STR
+ADMIN_HEADERS = {"X-Admin-Token": "test-admin-token"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", ADMIN_HEADERS["X-Admin-Token"])
+    yield tmp_path
+    profiling.request_profiles(0)
+
+
+def _wait_for(directory: Path, pattern: str, count: int, timeout: float = 5.0) -> list:
+    """Profiles are written by a background thread"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        paths = sorted(directory.glob(pattern))
+        if len(paths) >= count:
+            return paths
+        time.sleep(0.02)
+    return sorted(directory.glob(pattern))
+
+
+def test_requests_are_not_profiled_by_default(client, profile_dir, monkeypatch):
+    row = dict(synthetic_rows("knn_systolic", 1, seed=3)[0], is_raw=True)
+    assert client.post(f"{V1}/knn/predict/systolic/batch", json={"items": [row]}).status_code == 200
+    # The header alone (no admin token, or no ADMIN_TOKEN configured) is ignored
+    assert client.post(f"{V1}/knn/predict/systolic/batch", json={"items": [row]}, headers={"X-Profile": "1"}).status_code == 200
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", None)
+    headers = dict(ADMIN_HEADERS, **{"X-Profile": "1"})
+    assert client.post(f"{V1}/knn/predict/systolic/batch", json={"items": [row]}, headers=headers).status_code == 200
+    assert client.get(f"{V1}/admin/profiling").status_code == 403
+    time.sleep(0.1)
+    assert list(profile_dir.iterdir()) == []
+
+
+@pytest.mark.parametrize("name, path, batch_function", [
+    ("random_forest", "/random-forest/predict", "predict_random_forest_rows"),
+    ("knn_systolic", "/knn/predict/systolic", "predict_knn_systolic_rows"),
+])
+def test_profile_header_writes_stats_and_metadata(client, profile_dir, name, path, batch_function):
+    row = dict(synthetic_rows(name, 1, seed=4)[0], is_raw=True)
+    headers = dict(ADMIN_HEADERS, **{"X-Profile": "1", "X-Request-ID": "prof-1"})
+    plain = client.post(f"{V1}{path}", json=row).json()
+    response = client.post(f"{V1}{path}", json=row, headers=headers)
+    assert response.status_code == 200 and response.json() == plain
+
+    # The .json is renamed into place after the .prof
+    [metadata_path] = _wait_for(profile_dir, "*.json", 1)
+    metadata = json.loads(metadata_path.read_text())
+    assert metadata["request_id"] == "prof-1" and metadata["trigger"] == "header"
+    assert metadata["path"] == f"{V1}{path}" and metadata["status"] == 200 and metadata["error"] is None
+    # The micro-batcher is skipped, so the model call ran in an inference thread of this request
+    assert metadata["worker_calls"] == 1 and metadata["top_cumulative"]
+    functions = {function for _, _, function in pstats.Stats(str(metadata_path.with_suffix(".prof"))).stats}
+    assert batch_function in functions
+
+
+def test_unsafe_request_id_is_not_used_as_file_name(client, profile_dir):
+    row = dict(synthetic_rows("knn_diastolic", 1, seed=9)[0], is_raw=True)
+    headers = dict(ADMIN_HEADERS, **{"X-Profile": "1", "X-Request-ID": "../../etc/x y"})
+    assert client.post(f"{V1}/knn/predict/diastolic", json=row, headers=headers).status_code == 200
+
+    [metadata_path] = _wait_for(profile_dir, "*.json", 1)
+    assert metadata_path.parent == profile_dir and "etc" not in metadata_path.name
+    assert json.loads(metadata_path.read_text())["request_id"] == "../../etc/x y"
+
+
+def test_admin_profiles_the_next_requests(client, profile_dir):
+    row = dict(synthetic_rows("knn_diastolic", 1, seed=5)[0], is_raw=True)
+    assert client.post(f"{V1}/admin/profiling/requests", params={"count": 2, "path_prefix": f"{V1}/knn"}, headers=ADMIN_HEADERS).json()["requested"] == 2
+
+    # Not matching the prefix: not profiled, not counted
+    rf_row = dict(synthetic_rows("random_forest", 1, seed=5)[0], is_raw=True)
+    client.post(f"{V1}/random-forest/predict", json=rf_row)
+    for _ in range(3):
+        assert client.post(f"{V1}/knn/predict/diastolic/batch", json={"items": [row]}).status_code == 200
+
+    _wait_for(profile_dir, "*.json", 2)
+    time.sleep(0.1)  # a third profile would show up by now
+    metadata = [json.loads(path.read_text()) for path in profile_dir.glob("*.json")]
+    assert len(metadata) == 2
+    assert all(entry["trigger"] == "admin" and "/knn/" in entry["path"] for entry in metadata)
+    assert client.get(f"{V1}/admin/profiling", headers=ADMIN_HEADERS).json()["requested"] == 0
+
+
+def test_stack_sampler_collapsed_output():
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_worker, name="busy;worker")
+    thread.start()
+    sampler = profiling.StackSampler(interval_s=0.002)
+    sampler.start()
+    time.sleep(0.2)
+    counts = sampler.stop()
+    stop.set()
+    thread.join()
+
+    assert sampler.samples > 0
+    lines = profiling.collapsed(counts).splitlines()
+    assert int(lines[0].rsplit(" ", 1)[1]) >= 1
+    worker = [line for line in lines if line.startswith("busy,worker;")]
+    assert worker and all("busy_worker (test_profiling.py:" in line for line in worker)
+
+
+def test_sampling_window_endpoint(client, profile_dir, monkeypatch):
+    monkeypatch.setattr(Config, "PROFILE_MAX_WINDOW_S", 1.0)
+    assert client.post(f"{V1}/admin/profiling/sample", params={"seconds": 5}, headers=ADMIN_HEADERS).status_code == 400
+
+    result = client.post(f"{V1}/admin/profiling/sample", params={"seconds": 0.2}, headers=ADMIN_HEADERS).json()
+    path = Path(result["path"])
+    assert path.parent == profile_dir and path.suffix == ".collapsed"
+    assert result["samples"] > 0 and path.read_text().count("\n") == result["stacks"]
+    assert not client.get(f"{V1}/admin/profiling", headers=ADMIN_HEADERS).json()["window_running"]
@@ -0,0 +1,205 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from api.dependencies import get_random_forest_model
+from models.compiled_forest import CompiledForest
+from models.random_forest_model import RandomForestModel
+
+
+RAW_INPUT = json.loads((Path(__file__).parent.parent / "test_raw_input.json").read_text())
+
+
+def _raw_rows(n):
+    rows = []
+    for i in range(n):
+        row = dict(RAW_INPUT)
+        row["Age"] = 30 + i
+        row["Systolic_BP"] = 100 + 3 * i
+        row["Diastolic_BP"] = 60 + 2 * i
+        rows.append(row)
+    return rows
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def model():
+    return get_random_forest_model()
+
+
+def test_predict_batch_matches_single_predictions(model):
+    rows = _raw_rows(20)
+    df = pd.DataFrame([{k: v for k, v in r.items() if k != "is_raw"} for r in rows])
+
+    predictions, probabilities = model.predict_batch(df, is_raw=True)
+
+    for i in range(len(rows)):
+        prediction, probability = model.predict(df.iloc[[i]], is_raw=True)
+        assert predictions[i] == prediction
+        assert probabilities[i] == pytest.approx(probability)
+
+
+def test_predict_batch_mixed_raw_and_normalized(model):
+    rows = _raw_rows(4)
+    normalized = model.preprocess(rows, is_raw=True)
+
+    mixed = model.layout.vectorize(rows)
+    mixed[2:] = normalized[2:]
+    expected_predictions, expected_probabilities = model.predict_batch(rows, is_raw=True)
+
+    predictions, probabilities = model.predict_batch(mixed, is_raw=[True, True, False, False])
+    assert predictions == expected_predictions
+    assert probabilities == pytest.approx(expected_probabilities)
+
+
+def test_preprocess_matches_scaler_and_training_columns(model):
+    df = pd.DataFrame([{k: v for k, v in r.items() if k != "is_raw"} for r in _raw_rows(5)])
+
+    matrix = model.preprocess(df, is_raw=True)
+
+    expected = df.rename(columns={
+        "Diabetes_Type2": "Diabetes_Type 2 Diabetes",
+        "Cerebral_infarction_infarction": "Cerebral_infarction_cerebral infarction",
+        "Cerebrovascular_None": "Cerebrovascular_disease_None",
+        "Cerebrovascular_disease": "Cerebrovascular_disease_cerebrovascular disease",
+        "Cerebrovascular_insuff": "Cerebrovascular_disease_insufficiency of cerebral blood supply",
+    })[model.layout.columns].astype(float)
+    expected[model.features_to_scale] = model.scaler.transform(expected[model.features_to_scale])
+
+    assert matrix.dtype == np.float64
+    np.testing.assert_array_equal(matrix, expected.to_numpy())
+    np.testing.assert_array_equal(model.layout.vectorize(_raw_rows(5)), df.to_numpy(dtype=float))
+
+
+def test_batch_endpoint_preserves_order(client):
+    rows = _raw_rows(30)
+    response = client.post("/api/v1/random-forest/predict/batch", json={"items": rows})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == len(rows)
+
+    for row, result in zip(rows, body["predictions"]):
+        single = client.post("/api/v1/random-forest/predict", json=row).json()
+        assert result == single
+
+
+def test_batch_endpoint_rejects_empty_batch(client):
+    response = client.post("/api/v1/random-forest/predict/batch", json={"items": []})
+    assert response.status_code == 422
+
+
+def test_compiled_forest_reproduces_sklearn_predict_proba(model):
+    compiled = CompiledForest.from_sklearn(model.model)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3000, 16))
+    X[:, 0] = rng.integers(0, 2, len(X))
+    X[:, 8:] = rng.integers(0, 2, (len(X), 8))
+
+    # Put inputs exactly on (and one float32 step above) split thresholds
+    internal = np.flatnonzero(compiled.left != np.arange(len(compiled.left)))[:len(X)]
+    X[np.arange(len(internal)), compiled.feature[internal]] = compiled.threshold[internal]
+    X = np.vstack([X, np.nextafter(X.astype(np.float32), np.float32(np.inf))])
+
+    expected = model.model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compiled.predict(X), model.model.predict(X))
+
+
+def _random_raw_matrix(model, n, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n, model.layout.n_features))
+    X[:, 0] = rng.integers(0, 2, n)
+    cols = model.layout.scaled_idx
+    X[:, cols] = (model.layout.mean + rng.normal(size=(n, len(cols))) * model.layout.scale).round(1)
+    X[:, 8:] = rng.integers(0, 2, (n, 8))
+    return X
+
+
+def test_folded_forest_matches_scaler_then_predict(model):
+    compiled = CompiledForest.from_sklearn(model.model)
+    folded = compiled.fold_scaler(model.layout.scaled_idx, model.layout.mean, model.layout.scale)
+    X = _random_raw_matrix(model, 3000)
+
+    # Raw inputs exactly on the folded thresholds and one float64 step on each side
+    internal = np.flatnonzero(folded.left != np.arange(len(folded.left)))[:len(X)]
+    X[np.arange(len(internal)), folded.feature[internal]] = folded.threshold[internal]
+    X = np.vstack([X, np.nextafter(X, np.inf), np.nextafter(X, -np.inf)])
+
+    expected = model.model.predict_proba(model.preprocess(X.copy(), is_raw=True))
+
+    np.testing.assert_allclose(folded.predict_proba(X), expected, rtol=0, atol=1e-12)
+
+
+def test_compiled_forest_save_load_roundtrip(model, tmp_path):
+    X = _random_raw_matrix(model, 200)
+    model.compiled_raw.save(tmp_path / "raw")
+    loaded = CompiledForest.load(tmp_path / "raw", mmap_mode="r")
+
+    np.testing.assert_array_equal(loaded.predict_proba(X), model.compiled_raw.predict_proba(X))
+
+
+@pytest.mark.parametrize("backend", ["sklearn", "compiled"])
+def test_backends_agree(model, backend):
+    other = RandomForestModel(model.model_path, model.scaler_path, backend=backend)
+    rows = _raw_rows(40)
+
+    predictions, probabilities = other.predict_batch(rows, is_raw=True)
+    expected_predictions, expected_probabilities = model.predict_batch(rows, is_raw=True)
+
+    assert predictions == expected_predictions
+    assert probabilities == pytest.approx(expected_probabilities, abs=1e-12)
+
+
+def test_memory_mapped_bundle_is_used_when_it_matches(model, tmp_path, monkeypatch):
+    from config import Config
+
+    model.compiled.save(tmp_path / "normalized")
+    monkeypatch.setattr(Config, "COMPILED_FOREST_DIR", str(tmp_path))
+    mapped = RandomForestModel(model.model_path, model.scaler_path, backend="compiled")
+
+    assert isinstance(mapped.compiled.value, np.memmap)
+    rows = _raw_rows(20)
+    assert mapped.predict_batch(rows, is_raw=True) == model.predict_batch(rows, is_raw=True)
+
+    # A bundle of another forest is ignored
+    truncated = CompiledForest(
+        feature=model.compiled.feature, threshold=model.compiled.threshold, left=model.compiled.left,
+        right=model.compiled.right, value=model.compiled.value, roots=model.compiled.roots[:10],
+        classes=model.compiled.classes, max_depth=model.compiled.max_depth, n_features=model.compiled.n_features
+    )
+    truncated.save(tmp_path / "normalized")
+    rebuilt = RandomForestModel(model.model_path, model.scaler_path, backend="compiled")
+    assert not isinstance(rebuilt.compiled.value, np.memmap)
+    assert rebuilt.compiled.n_trees == len(model.model.estimators_)
+
+
+def test_raw_bundle_is_used_only_for_the_same_forest_and_scaler(model, tmp_path, monkeypatch):
+    from config import Config
+
+    model.compiled.save(tmp_path / "normalized")
+    model.compiled_raw.save(tmp_path / "raw")
+    monkeypatch.setattr(Config, "COMPILED_FOREST_DIR", str(tmp_path))
+    mapped = RandomForestModel(model.model_path, model.scaler_path, backend="compiled")
+
+    assert isinstance(mapped.compiled_raw.value, np.memmap)
+    rows = _raw_rows(20)
+    assert mapped.predict_batch(rows, is_raw=True) == model.predict_batch(rows, is_raw=True)
+
+    # Folded with another scaler: folded again at load
+    scale = model.layout.scale.copy()
+    scale[0] *= 2
+    model.compiled.fold_scaler(model.layout.scaled_idx, model.layout.mean, scale).save(tmp_path / "raw")
+    refolded = RandomForestModel(model.model_path, model.scaler_path, backend="compiled")
+    assert not isinstance(refolded.compiled_raw.value, np.memmap)
+    assert refolded.predict_batch(rows, is_raw=True) == model.predict_batch(rows, is_raw=True)
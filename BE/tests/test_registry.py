@@ -0,0 +1,186 @@
+import os
+import shutil
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from config import Config
+from api.dependencies import get_model_registry
+from api.warmup import warm_knn
+from models.knn_model import KNNSystolicModel
+from models.registry import ModelRegistry, ModelSpec, ACTIVE, STANDBY, RETIRED, FAILED, version_key
+from utils.schemas import KNNSystolicPredictionRequest
+
+
+MODEL_FILE = os.path.basename(Config.KNN_SYSTOLIC_MODEL_PATH)
+SCALER_FILE = os.path.basename(Config.KNN_SYSTOLIC_SCALER_PATH)
+RAW_ROW = KNNSystolicPredictionRequest.model_config["json_schema_extra"]["example_raw"]
+
+
+def _add_version(directory, version, age_s=60.0):
+    target = directory / "versions" / version
+    target.mkdir(parents=True)
+    for name in (MODEL_FILE, SCALER_FILE):
+        shutil.copy(os.path.join(os.path.dirname(Config.KNN_SYSTOLIC_MODEL_PATH), name), target / name)
+        # Older than MODEL_WATCH_SETTLE_S, i.e. completely copied
+        stamp = time.time() - age_s
+        os.utime(target / name, (stamp, stamp))
+
+
+@pytest.fixture
+def registry(tmp_path):
+    for name in (MODEL_FILE, SCALER_FILE):
+        shutil.copy(os.path.join(os.path.dirname(Config.KNN_SYSTOLIC_MODEL_PATH), name), tmp_path / name)
+    spec = ModelSpec(
+        "knn_systolic", str(tmp_path), MODEL_FILE, SCALER_FILE,
+        factory=lambda model_path, scaler_path, _: KNNSystolicModel(model_path=model_path, scaler_path=scaler_path),
+        warm=warm_knn(KNNSystolicPredictionRequest)
+    )
+    registry = ModelRegistry({"knn_systolic": spec}, keep_versions=2)
+    yield registry
+    registry.stop_watching()
+
+
+def test_version_order():
+    versions = ["v10", "v2", Config.BASE_MODEL_VERSION, "v1"]
+    assert sorted(versions, key=version_key) == [Config.BASE_MODEL_VERSION, "v1", "v2", "v10"]
+
+
+def test_initial_load_picks_newest_version(registry, tmp_path):
+    _add_version(tmp_path, "v1")
+    model = registry.get("knn_systolic")
+    assert model.version == "v1"
+    assert registry.get("knn_systolic") is model
+
+
+def test_activate_keeps_old_version_for_in_flight_requests(registry, tmp_path):
+    old = registry.get("knn_systolic")
+    _add_version(tmp_path, "v2")
+
+    record = registry.activate("knn_systolic", "v2")
+    new = registry.get("knn_systolic")
+    assert new is not old and new.version == "v2"
+    assert record.state == ACTIVE and record.load_ms > 0 and record.warmup_ms > 0
+    # A request that looked the old model up before the swap still completes on it
+    assert old.predict(KNNSystolicPredictionRequest(**RAW_ROW), is_raw=True) == new.predict(
+        KNNSystolicPredictionRequest(**RAW_ROW), is_raw=True
+    )
+
+    status = registry.status()["knn_systolic"]
+    assert status["active_version"] == "v2"
+    assert status["rollback_versions"] == [Config.BASE_MODEL_VERSION]
+    assert status["versions"][Config.BASE_MODEL_VERSION]["state"] == STANDBY
+
+
+def test_rollback_and_history_limit(registry, tmp_path):
+    base = registry.get("knn_systolic")
+    for version in ("v1", "v2"):
+        _add_version(tmp_path, version)
+        registry.activate("knn_systolic", version)
+
+    # keep_versions=2: only the previous version stays loaded
+    assert registry.status()["knn_systolic"]["versions"][Config.BASE_MODEL_VERSION]["state"] == RETIRED
+
+    previous = registry.rollback("knn_systolic")
+    assert previous.version == "v1" and registry.get("knn_systolic").version == "v1"
+    with pytest.raises(ValueError):
+        registry.rollback("knn_systolic")
+    assert base.version == Config.BASE_MODEL_VERSION
+
+
+def test_reload_does_not_add_a_rollback_target(registry, tmp_path):
+    registry.get("knn_systolic")
+    _add_version(tmp_path, "v1")
+    registry.activate("knn_systolic", "v1")
+    old = registry.get("knn_systolic")
+
+    registry.reload("knn_systolic")
+    assert registry.get("knn_systolic") is not old
+    assert registry.status()["knn_systolic"]["rollback_versions"] == [Config.BASE_MODEL_VERSION]
+    assert registry.rollback("knn_systolic").version == Config.BASE_MODEL_VERSION
+
+
+def test_failed_version_keeps_active(registry, tmp_path):
+    registry.get("knn_systolic")
+    broken = tmp_path / "versions" / "v3"
+    broken.mkdir(parents=True)
+    (broken / MODEL_FILE).write_bytes(b"not a model")
+    stamp = time.time() - 60
+    os.utime(broken / MODEL_FILE, (stamp, stamp))
+
+    assert registry.poll() == {}
+    assert registry.get("knn_systolic").version == Config.BASE_MODEL_VERSION
+    assert registry.status()["knn_systolic"]["versions"]["v3"]["state"] == FAILED
+
+
+def test_watcher_swaps_in_new_version(registry, tmp_path):
+    registry.get("knn_systolic")
+    swapped = threading.Event()
+    registry.add_listener(lambda name, record: swapped.set())
+    registry.start_watching(interval_s=0.05)
+
+    # Still being written: ignored until it settles
+    _add_version(tmp_path, "v1", age_s=0.0)
+    time.sleep(0.2)
+    assert registry.active_version("knn_systolic") == Config.BASE_MODEL_VERSION
+
+    _add_version(tmp_path, "v2")
+    assert swapped.wait(10)
+    assert registry.active_version("knn_systolic") == "v2"
+
+
+ADMIN_HEADERS = {"X-Admin-Token": "test-admin-token"}
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", ADMIN_HEADERS["X-Admin-Token"])
+
+
+def test_admin_endpoints_fail_closed(monkeypatch):
+    client = TestClient(app)
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", None)
+    # No token configured: disabled even for callers that send one
+    assert client.get(f"{Config.API_V1_STR}/admin/models", headers=ADMIN_HEADERS).status_code == 403
+    assert client.post(f"{Config.API_V1_STR}/admin/models/poll").status_code == 403
+
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "another-token")
+    assert client.get(f"{Config.API_V1_STR}/admin/models", headers=ADMIN_HEADERS).status_code == 403
+    assert client.get(f"{Config.API_V1_STR}/admin/models", headers={"X-Admin-Token": "another-token"}).status_code == 200
+
+
+def test_responses_carry_model_version(admin_token):
+    client = TestClient(app, headers=ADMIN_HEADERS)
+    registry = get_model_registry()
+
+    response = client.post(f"{Config.API_V1_STR}/knn/predict/systolic", json=RAW_ROW)
+    assert response.status_code == 200
+    assert response.json()["model_version"] == registry.active_version("knn_systolic")
+
+    status = client.get(f"{Config.API_V1_STR}/admin/models").json()
+    assert status["knn_systolic"]["active_version"] == registry.active_version("knn_systolic")
+    assert client.post(f"{Config.API_V1_STR}/admin/models/unknown/rollback").status_code == 404
+
+
+def test_admin_activate_and_rollback(registry, tmp_path, admin_token):
+    registry.get("knn_systolic")
+    _add_version(tmp_path, "v2")
+    app.dependency_overrides[get_model_registry] = lambda: registry
+    try:
+        client = TestClient(app, headers=ADMIN_HEADERS)
+        base = f"{Config.API_V1_STR}/admin/models/knn_systolic"
+
+        response = client.post(f"{base}/activate/v2")
+        assert response.status_code == 200
+        assert response.json()["version"] == "v2" and response.json()["rss_delta_kb"] is not None
+        assert client.post(f"{base}/activate/v9").status_code == 404
+
+        response = client.post(f"{base}/rollback")
+        assert response.status_code == 200
+        assert response.json()["version"] == Config.BASE_MODEL_VERSION
+        assert client.post(f"{base}/rollback").status_code == 400
+    finally:
+        app.dependency_overrides.clear()
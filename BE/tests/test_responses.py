@@ -0,0 +1,99 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from main import app  # noqa: E402
+from config import Config  # noqa: E402
+from api import responses  # noqa: E402
+from patients import synthetic_rows  # noqa: E402
+
+
+V1 = Config.API_V1_STR
+# (path, model name of patients.synthetic_rows, batch)
+ENDPOINTS = [
+    ("/random-forest/predict", "random_forest", False),
+    ("/random-forest/predict/batch", "random_forest", True),
+    ("/knn/predict/systolic", "knn_systolic", False),
+    ("/knn/predict/systolic/batch", "knn_systolic", True),
+    ("/knn/predict/diastolic", "knn_diastolic", False),
+    ("/knn/predict/diastolic/batch", "knn_diastolic", True),
+    ("/knn/predict/joint", "knn_joint", False),
+    ("/knn/predict/joint/batch", "knn_joint", True),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def _payload(name, batch):
+    rows = synthetic_rows(name, 7, seed=11)
+    for i, row in enumerate(rows):
+        row["is_raw"] = i % 2 == 0 or name == "knn_joint"
+    return {"items": rows} if batch else rows[0]
+
+
+@pytest.mark.parametrize("path,name,batch", ENDPOINTS)
+def test_fast_responses_match_standard(client, monkeypatch, path, name, batch):
+    payload = _payload(name, batch)
+    standard = client.post(V1 + path, json=payload)
+    monkeypatch.setattr(Config, "FAST_RESPONSES", True)
+    fast = client.post(V1 + path, json=payload)
+
+    assert standard.status_code == fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    # Same values, same key order, and ints stay ints / floats stay floats
+    typed = lambda body: json.loads(body, parse_int=lambda s: ("int", s), object_pairs_hook=list)  # noqa: E731
+    assert typed(fast.content) == typed(standard.content)
+
+
+@pytest.mark.parametrize("fast", [False, True])
+@pytest.mark.parametrize("path,name", [(p, n) for p, n, batch in ENDPOINTS if batch])
+def test_columnar_batch_is_the_transposed_rows(client, monkeypatch, fast, path, name):
+    monkeypatch.setattr(Config, "FAST_RESPONSES", fast)
+    payload = _payload(name, True)
+    rows = client.post(V1 + path, json=payload).json()
+    columns = client.post(V1 + path, params={"columnar": "true"}, json=payload).json()
+
+    assert columns["count"] == rows["count"] == 7
+    if name == "knn_joint":
+        assert columns["iterations"] == [p["iterations"] for p in rows["predictions"]]
+        for side in ("systolic", "diastolic"):
+            assert columns[side]["predicted_value_mmHg"] == [p[side]["predicted_value_mmHg"] for p in rows["predictions"]]
+        return
+    for field, values in columns.items():
+        if isinstance(values, list):
+            assert values == [p[field] for p in rows["predictions"]]
+        elif field != "count":
+            assert values == rows["predictions"][0][field]
+
+
+def test_openapi_schema_unchanged(monkeypatch):
+    standard = app.openapi()
+    app.openapi_schema = None
+    monkeypatch.setattr(Config, "FAST_RESPONSES", True)
+    try:
+        assert app.openapi() == standard
+    finally:
+        app.openapi_schema = None
+
+    single = standard["paths"][f"{V1}/random-forest/predict"]["post"]["responses"]["200"]
+    assert single["content"]["application/json"]["schema"]["$ref"].endswith("/PredictionResponse")
+    batch = standard["paths"][f"{V1}/knn/predict/systolic/batch"]["post"]["responses"]["200"]
+    refs = [s["$ref"] for s in batch["content"]["application/json"]["schema"]["anyOf"]]
+    assert [ref.rsplit("/", 1)[1] for ref in refs] == ["BPBatchPredictionResponse", "ColumnarBPBatchPredictionResponse"]
+
+
+def test_standard_encoder_fallback(monkeypatch):
+    content = {"label": "Bình thường (Normal)", "probability": 0.1 + 0.2, "values": [1, 2.5e-07, 135.6]}
+    monkeypatch.setattr(responses, "orjson", None)
+    expected = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    assert responses.dumps(content) == expected
+    with pytest.raises(ValueError):
+        responses.dumps({"value": float("nan")})
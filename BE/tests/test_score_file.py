@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BE_DIR))
+sys.path.insert(0, str(BE_DIR / "benchmarks"))
+
+from score_file import check_columns, score_file  # noqa: E402
+from api.dependencies import get_random_forest_model, get_knn_diastolic_model  # noqa: E402
+from patients import synthetic_rows  # noqa: E402
+
+
+@pytest.fixture
+def patients_csv(tmp_path):
+    frame = pd.DataFrame(synthetic_rows("random_forest", 230, seed=3))
+    frame.loc[7, "Age"] = None
+    path = tmp_path / "patients.csv"
+    frame.to_csv(path, index=False)
+    return path, frame
+
+
+def test_in_process_matches_models(patients_csv, tmp_path):
+    path, frame = patients_csv
+    output = tmp_path / "scored.csv"
+    report = score_file(
+        str(path), str(output), ["random_forest", "knn_diastolic"], workers=0, chunk_size=50, progress=False
+    )
+    assert report["rows"] == 230 and report["chunks"] == 5
+    assert report["versions"] == {"random_forest": "base", "knn_diastolic": "base"}
+
+    scored = pd.read_csv(output)
+    assert len(scored) == 230
+    assert scored["Age"].equals(frame["Age"])
+
+    valid = frame.drop(index=7)
+    predictions, probabilities = get_random_forest_model().predict_batch(valid, is_raw=valid["is_raw"].to_numpy())
+    np.testing.assert_array_equal(scored["rf_prediction"].drop(index=7).to_numpy(), predictions)
+    np.testing.assert_allclose(scored["rf_probability"].drop(index=7).to_numpy(), probabilities)
+    diastolic = get_knn_diastolic_model().predict_batch(valid, is_raw=valid["is_raw"].to_numpy())
+    np.testing.assert_allclose(scored["diastolic_mmHg"].drop(index=7).to_numpy(), diastolic["predicted_value_mmHg"])
+
+    assert scored.loc[7, "rf_error"] == "missing value"
+    assert np.isnan(scored.loc[7, "rf_prediction"]) and np.isnan(scored.loc[7, "diastolic_mmHg"])
+    assert scored["rf_error"].drop(index=7).isna().all()
+
+
+def test_process_pool_keeps_input_order(patients_csv, tmp_path):
+    path, _ = patients_csv
+    serial, parallel = tmp_path / "serial.csv", tmp_path / "parallel.csv"
+    score_file(str(path), str(serial), ["knn_diastolic"], workers=0, chunk_size=20, results_only=True, progress=False)
+    report = score_file(
+        str(path), str(parallel), ["knn_diastolic"], workers=2, chunk_size=20, results_only=True, progress=False
+    )
+    assert report["chunks"] == 12
+    pd.testing.assert_frame_equal(pd.read_csv(serial), pd.read_csv(parallel))
+    assert list(pd.read_csv(parallel).columns) == [
+        "diastolic_mmHg", "diastolic_std_mmHg", "diastolic_ci_lower", "diastolic_ci_upper", "diastolic_error"
+    ]
+
+
+def test_missing_column_fails_early(patients_csv, tmp_path):
+    path, frame = patients_csv
+    frame.drop(columns=["Heart_Rate"]).to_csv(tmp_path / "partial.csv", index=False)
+    check_columns(str(path), ["random_forest", "knn_systolic"])
+    with pytest.raises(SystemExit, match="Heart_Rate"):
+        check_columns(str(tmp_path / "partial.csv"), ["knn_systolic"])
+
+
+def test_rows_the_api_rejects_are_reported_not_scored(tmp_path):
+    frame = pd.DataFrame(synthetic_rows("random_forest", 40, seed=8))
+    frame = frame.astype({"Age": object, "Sex": float})
+    frame.loc[3, "Sex"] = 2
+    frame.loc[4, "Sex"] = 0.5
+    frame.loc[5, ["Diabetes_Diabetes", "Diabetes_None", "Diabetes_Type2"]] = [1, 1, 0]
+    frame.loc[6, "Age"] = "forty"
+    path, output = tmp_path / "patients.csv", tmp_path / "scored.csv"
+    frame.to_csv(path, index=False)
+
+    report = score_file(str(path), str(output), ["random_forest"], workers=0, chunk_size=16, progress=False)
+    assert report["rows"] == 40
+
+    scored = pd.read_csv(output)
+    errors = scored["rf_error"]
+    assert "Sex must be <= 1" in errors[3]
+    assert "Sex must be an integer" in errors[4]
+    assert "exactly one of Diabetes_Diabetes, Diabetes_None, Diabetes_Type2 must be 1" in errors[5]
+    assert errors[6] == "not a number"
+    assert scored.loc[3:6, "rf_prediction"].isna().all()
+
+    valid = frame.drop(index=[3, 4, 5, 6]).astype({"Age": float})
+    predictions, _ = get_random_forest_model().predict_batch(valid, is_raw=valid["is_raw"].to_numpy())
+    np.testing.assert_array_equal(scored["rf_prediction"].drop(index=[3, 4, 5, 6]).to_numpy(), predictions)
+    assert errors.drop(index=[3, 4, 5, 6]).isna().all()
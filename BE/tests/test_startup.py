@@ -0,0 +1,13 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+SRC_DIR = Path(__file__).parent.parent / "src"
+
+
+def test_importing_the_app_does_not_load_the_ml_stack():
+    code = "import sys, main; print(','.join(m for m in ('pandas', 'sklearn', 'joblib') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == ""
@@ -0,0 +1,88 @@
+from fastapi.testclient import TestClient
+
+from main import app
+from api.dependencies import get_warmup_manager, get_knn_systolic_model
+from api.warmup import ModelWarmup, WarmupManager, warm_knn, FAILED, PENDING, READY
+from utils.schemas import KNNSystolicPredictionRequest
+
+
+def test_startup_warms_every_model_and_reports_ready():
+    with TestClient(app) as client:
+        assert get_warmup_manager().wait(timeout=60)
+        response = client.get("/ready")
+        health = client.get("/health").json()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ready"] is True
+    assert set(body["models"]) == {"random_forest", "knn_systolic", "knn_diastolic"}
+    for status in body["models"].values():
+        assert status["state"] == READY
+        assert status["load_ms"] >= 0
+        assert status["warmup_ms"] > 0
+        assert status["self_test_ms"] > 0
+    assert all(value.startswith("ready - ") for value in health["models"].values())
+
+
+def test_failed_model_keeps_the_worker_unready():
+    def broken_getter():
+        raise FileNotFoundError("model.joblib")
+
+    manager = WarmupManager([
+        ModelWarmup("knn_systolic", get_knn_systolic_model, warm_knn(KNNSystolicPredictionRequest)),
+        ModelWarmup("broken", broken_getter, warm_knn(KNNSystolicPredictionRequest)),
+    ], self_test_runs=2)
+    assert manager.status()["models"]["broken"]["state"] == PENDING
+
+    manager.start()
+    assert manager.wait(timeout=60) is False
+
+    status = manager.status()
+    assert status["ready"] is False
+    assert status["models"]["knn_systolic"]["state"] == READY
+    assert status["models"]["broken"]["state"] == FAILED
+    assert "FileNotFoundError" in status["models"]["broken"]["error"]
+
+
+def test_warm_up_and_self_test_bypass_the_prediction_cache():
+    from api.warmup import warm_random_forest
+    from api.dependencies import get_random_forest_model
+
+    for model, warm in (
+        (get_knn_systolic_model(), warm_knn(KNNSystolicPredictionRequest)),
+        (get_random_forest_model(), warm_random_forest),
+    ):
+        assert model.cache is not None
+        before = model.cache.stats()
+        self_test = warm(model)
+        self_test()
+        after = model.cache.stats()
+        # No lookups at all: every warm-up row and the self-test ran the model itself
+        assert (after["hits"], after["misses"], after["duplicates"]) == (before["hits"], before["misses"], before["duplicates"])
+
+
+def test_without_warm_up_loaded_models_are_ready():
+    loaded = set()
+    manager = WarmupManager([
+        ModelWarmup("knn_systolic", get_knn_systolic_model, warm_knn(KNNSystolicPredictionRequest)),
+    ], loaded=lambda name: name in loaded)
+    assert manager.status()["ready"] is False
+
+    # Loaded by a request, warm-up never started (Config.WARMUP_ON_STARTUP = False)
+    loaded.add("knn_systolic")
+    status = manager.status()
+    assert status["ready"] is True
+    assert status["models"]["knn_systolic"]["state"] == READY and status["models"]["knn_systolic"]["warmup_ms"] is None
+
+
+def test_warm_up_starts_every_executor_worker():
+    from api.executor import InferenceExecutor
+
+    executor = InferenceExecutor(kind="thread", workers=3)
+    manager = WarmupManager([
+        ModelWarmup("knn_systolic", get_knn_systolic_model, warm_knn(KNNSystolicPredictionRequest)),
+    ], executor=executor, self_test_runs=1)
+    manager.start()
+    assert manager.wait(timeout=60)
+    assert len(executor.pool._threads) == 3
+    executor.shutdown()
@@ -39,40 +39,22 @@ document.getElementById("form").addEventListener("submit", async (e) => {
         };
 
         // The KNN models require the other BP as an input. To avoid asking the user to provide
-        // Systolic/Diastolic we perform an iterative estimate: initialize with population means
-        // then alternate predictions until values converge (few iterations).
-        let systolic = 120.0; // initial guess (mmHg)
-        let diastolic = 80.0; // initial guess (mmHg)
+        // Systolic/Diastolic the server alternates both models from population guesses until
+        // the estimates converge, all in a single request.
+        const jointData = Object.assign({}, baseData, {
+            initial_systolic_mmHg: 120.0,
+            initial_diastolic_mmHg: 80.0
+        });
+        const res = await fetch("http://localhost:8000/api/v1/knn/predict/joint", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify(jointData),
+        });
 
-        let systolicResult = null;
-        let diastolicResult = null;
-
-        const iterations = 3;
-        for (let i = 0; i < iterations; i++) {
-            // Predict systolic using current diastolic
-            const systolicData = Object.assign({}, baseData, { Diastolic_BP: diastolic });
-            const sRes = await fetch("http://localhost:8000/api/v1/knn/predict/systolic", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify(systolicData),
-            });
-
-            if (!sRes.ok) throw new Error(`Systolic endpoint error: ${sRes.status}`);
-            systolicResult = await sRes.json();
-            systolic = Number(systolicResult.predicted_value_mmHg);
-
-            // Predict diastolic using updated systolic
-            const diastolicData = Object.assign({}, baseData, { Systolic_BP: systolic });
-            const dRes = await fetch("http://localhost:8000/api/v1/knn/predict/diastolic", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify(diastolicData),
-            });
-
-            if (!dRes.ok) throw new Error(`Diastolic endpoint error: ${dRes.status}`);
-            diastolicResult = await dRes.json();
-            diastolic = Number(diastolicResult.predicted_value_mmHg);
-        }
+        if (!res.ok) throw new Error(`Blood pressure endpoint error: ${res.status}`);
+        const jointResult = await res.json();
+        const systolicResult = jointResult.systolic;
+        const diastolicResult = jointResult.diastolic;
 
         // Format and display results
         const formatResult = (result) => {